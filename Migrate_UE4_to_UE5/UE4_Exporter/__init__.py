@@ -1,6 +1,9 @@
 import importlib
 
 # reload
+from . import export_manifest
+importlib.reload(export_manifest)
+
 from . import main
 importlib.reload(main)
 
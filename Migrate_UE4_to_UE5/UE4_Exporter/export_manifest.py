@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+
+import intermediate_pack
+
+# version of the manifest file, old manifests are discarded and all assets are exported again
+export_manifest_version = 1
+
+
+def get_file_hash(filepath):
+    file_hash = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+class ExportManifest:
+    """
+    usage)
+        manifest = ExportManifest(migrate_tool.export_manifest_filepath)
+        if not manifest.is_up_to_date(relative_filepath, source_filepath, export_filepath):
+            if utility.copy_file(source_filepath, export_filepath):
+                manifest.update(relative_filepath, source_filepath, export_filepath)
+        manifest.save()
+
+    Records the size, mtime and content hash of the source .uasset/.umap and the hash of the exported file, per exported file.
+    An asset is up to date if the source has the same size and mtime, or the same content when only the mtime changed,
+    and the exported file was not changed or removed since the export.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.entries = {}
+        # source states seen by is_up_to_date, recorded by update after the export
+        self.pending_sources = {}
+        self.num_exported = 0
+        self.num_skipped = 0
+        self.is_modified = False
+        self.load()
+
+    def load(self):
+        try:
+            if os.path.exists(self.filepath):
+                with open(self.filepath, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if export_manifest_version == manifest.get('version'):
+                    self.entries = manifest.get('entries', {})
+                    logging.info(f'load export manifest: {self.filepath} entries({len(self.entries)})')
+                else:
+                    logging.info(f'export manifest version is changed: {self.filepath}')
+        except:
+            logging.error(f'failed to load export manifest: {self.filepath}')
+            self.entries = {}
+
+    def save(self):
+        if not self.is_modified:
+            return True
+        temp_filepath = self.filepath + '.tmp'
+        try:
+            dirname = os.path.split(self.filepath)[0]
+            if not os.path.exists(dirname):
+                os.makedirs(dirname)
+            with open(temp_filepath, 'w', encoding='utf-8') as f:
+                json.dump({'version': export_manifest_version, 'entries': self.entries}, f, indent=1, sort_keys=True)
+            os.replace(temp_filepath, self.filepath)
+            self.is_modified = False
+            logging.info(f'save export manifest: {self.filepath} entries({len(self.entries)})')
+            return True
+        except:
+            logging.error(f'failed to save export manifest: {self.filepath}')
+        return False
+
+    def get_source_state(self, source_filepath, entry):
+        """returns (size, mtime_ns, hash), the file is hashed only if the size and mtime differ from the entry"""
+        stat_result = os.stat(source_filepath)
+        if entry is not None and stat_result.st_size == entry['source_size'] and stat_result.st_mtime_ns == entry['source_mtime_ns']:
+            return (stat_result.st_size, stat_result.st_mtime_ns, entry['source_hash'])
+        return (stat_result.st_size, stat_result.st_mtime_ns, get_file_hash(source_filepath))
+
+    def is_up_to_date(self, key, source_filepath, export_filepath, options=''):
+        """key: relative filepath of the exported file, options: export options which change the exported file"""
+        try:
+            if not os.path.exists(source_filepath):
+                return False
+            entry = self.entries.get(key)
+            source_state = self.get_source_state(source_filepath, entry)
+            self.pending_sources[key] = source_state
+            if entry is None or options != entry.get('options', '') or source_state[2] != entry['source_hash']:
+                return False
+
+            # the exported file was changed or removed after the export, it is a loose file or in the intermediate pack
+            if not intermediate_pack.file_exists(export_filepath):
+                return False
+            (output_size, output_mtime) = intermediate_pack.get_file_stat(export_filepath)
+            if output_size != entry['output_size'] or output_mtime != entry['output_mtime_ns']:
+                return False
+
+            # touched source, same content
+            if source_state[1] != entry['source_mtime_ns']:
+                entry['source_mtime_ns'] = source_state[1]
+                self.is_modified = True
+            self.num_skipped += 1
+            return True
+        except:
+            logging.error(f'failed to check export manifest: {key}')
+        return False
+
+    def update(self, key, source_filepath, export_filepath, options=''):
+        try:
+            source_state = self.pending_sources.pop(key, None)
+            if source_state is None:
+                source_state = self.get_source_state(source_filepath, None)
+            (output_size, output_mtime) = intermediate_pack.get_file_stat(export_filepath)
+            (pack, pack_entry) = intermediate_pack.find_packed_file(export_filepath)
+            self.entries[key] = {
+                'source_size': source_state[0],
+                'source_mtime_ns': source_state[1],
+                'source_hash': source_state[2],
+                'output_size': output_size,
+                'output_mtime_ns': output_mtime,
+                'output_hash': pack_entry.hash if pack is not None else get_file_hash(export_filepath),
+                'options': options
+            }
+            self.num_exported += 1
+            self.is_modified = True
+            return True
+        except:
+            logging.error(f'failed to update export manifest: {key}')
+        return False
+
+    def remove(self, key):
+        self.pending_sources.pop(key, None)
+        if self.entries.pop(key, None) is not None:
+            self.is_modified = True
+
+    def get_stats_text(self):
+        return f'exported({self.num_exported}), skipped({self.num_skipped})'
+
+    def reset_stats(self):
+        self.num_exported = 0
+        self.num_skipped = 0
@@ -1,8 +1,13 @@
 import logging
 import os
 import json
+import stat
+import exported_filelist
+import intermediate_pack
 import utility
 
+from . import export_manifest
+
 import unreal
 
 
@@ -15,111 +20,170 @@ def export_project_info(migrate_tool):
     utility.write_to_file(filepath=migrate_tool.src_project_info_filepath, content=json.dumps(src_project_info, indent=4))
 
 
-def export_asset_file_list(migrate_tool, class_name, ext, ignore_folders):    
+def export_asset_file_list(migrate_tool, class_name, ext, kind, manifest=None):
+    """writes the exported files of the class with the size, mtime and hash of the exported file, after the export,
+    and the package dependencies of the asset by which the importer orders the import"""
     assets = migrate_tool.get_assets_by_class(class_name)
     logging.info(f'>>> Begin export_asset_file_list: {class_name}({len(assets)})')
     if assets is not None:
         total_num = len(assets)
-        file_list = []
+        asset_records = sorted((asset_record for asset_record in assets if asset_record.package_name.startswith('/Game/')), key=lambda asset_record: asset_record.relative_base_filepath)
+        export_filepath = migrate_tool.get_export_filepath(class_name)
         task_name = f'export_asset_file_list: {class_name}'
-        with unreal.ScopedSlowTask(total_num, task_name) as slow_task:
+        with exported_filelist.ExportedFileListWriter(export_filepath, class_name, migrate_tool.get_compression(class_name)) as writer, unreal.ScopedSlowTask(total_num, task_name) as slow_task:
             slow_task.make_dialog(True)
-            for (i, asset_data) in enumerate(assets):
+            for asset_record in asset_records:
                 slow_task.enter_progress_frame(1)
-                package_name = str(asset_data.package_name)
-                if package_name.startswith('/Game/'):
-                    relative_filepath = package_name.replace("/Game/", "Content/", 1) + ext
-                    if utility.check_ignore_folders(relative_filepath, ignore_folders):
-                        logging.info(f'ignored: {relative_filepath}')
-                    else:
-                        logging.info(f'export: {relative_filepath}')
-                        file_list.append(relative_filepath)        # write to file
-        file_list.sort()
-        export_data = "\n".join(file_list)
-        export_filepath = migrate_tool.get_export_filepath(class_name)
-        utility.write_to_file(filepath=export_filepath, content=export_data)
+                relative_filepath = asset_record.get_relative_filepath(ext)
+                logging.info(f'export: {relative_filepath}')
+                (size, mtime_ns) = (None, None)
+                filepath = os.path.join(migrate_tool.intermediate_dircetory, relative_filepath)
+                if intermediate_pack.file_exists(filepath):
+                    (size, mtime_ns) = intermediate_pack.get_file_stat(filepath)
+                # the hash is known by the manifest, the exported files are not hashed again
+                manifest_entry = manifest.entries.get(relative_filepath) if manifest is not None else None
+                file_hash = manifest_entry['output_hash'] if manifest_entry is not None and manifest_entry['output_size'] == size else ''
+                dependencies = migrate_tool.get_package_dependencies(asset_record.package_name)
+                writer.write(exported_filelist.ExportedFileEntry(relative_filepath, kind, size, mtime_ns, file_hash, dependencies))
+        migrate_tool.invalidate_exported_filelist(class_name)
     logging.info(f'>>> End export_asset_file_list: {class_name}')
 
 
-def export_assets(migrate_tool, class_name, ext, ignore_folders, overwrite=True):
+def pack_exported_file(migrate_tool, relative_filepath, filepath, export_filepath):
+    """appends the file to the intermediate pack, a loose file at the export path is removed, it would hide the packed file"""
+    try:
+        migrate_tool.intermediate_pack.add_file(relative_filepath, filepath)
+        if os.path.exists(export_filepath):
+            os.chmod(export_filepath, stat.S_IWRITE)
+            os.remove(export_filepath)
+        logging.info(f'pack_exported_file: {filepath} to {relative_filepath}')
+        return True
+    except:
+        logging.error(f'failed to pack_exported_file: {filepath} to {relative_filepath}')
+    return False
+
+
+def export_assets(migrate_tool, class_name, ext, overwrite=True, manifest=None):
     assets = migrate_tool.get_assets_by_class(class_name)
     logging.info(f'>>> Begin export_assets: {class_name}({len(assets)})')
     if assets is not None:        
         total_num = len(assets)
         task_name = f'export_assets: {class_name} {ext}'
-        with unreal.ScopedSlowTask(total_num, task_name) as slow_task:
+        if manifest is not None:
+            manifest.reset_stats()
+        copy_engine = utility.FileCopyEngine(workers=migrate_tool.get_config_value('copy_workers'), transfer_mode=migrate_tool.get_config_value('transfer_mode'))
+        copied_relative_filepaths = []
+        with copy_engine, unreal.ScopedSlowTask(total_num, task_name) as slow_task:
             slow_task.make_dialog(True)
-            for (i, asset_data) in enumerate(assets):
+            for (i, asset_record) in enumerate(assets):
                 slow_task.enter_progress_frame(1)
-                asset = asset_data.get_asset()
-                if asset_data.is_valid() and asset is not None:
-                    relative_filepath = str(asset_data.package_name)
-                    if relative_filepath.startswith('/Game/'):                        
-                        relative_filepath = relative_filepath.replace("/Game/", "Content/", 1) + ext
-                    
-                    source_filepath = os.path.join(migrate_tool.project_dircetory, relative_filepath)
-                    export_filepath = os.path.join(migrate_tool.intermediate_dircetory, relative_filepath)
-
-                    if utility.check_ignore_folders(relative_filepath, ignore_folders):
-                        logging.info(f'ignored: {relative_filepath}')
-                        continue
+                relative_filepath = asset_record.get_relative_filepath(ext)
+                source_filepath = os.path.join(migrate_tool.project_dircetory, relative_filepath)
+                export_filepath = os.path.join(migrate_tool.intermediate_dircetory, relative_filepath)
 
+                # check the manifest before loading the asset, unchanged assets are not loaded
+                if manifest is not None:
+                    if manifest.is_up_to_date(relative_filepath, source_filepath, export_filepath):
+                        continue
+                else:
                     # check overwrite
-                    is_file_exists = os.path.exists(export_filepath)
+                    is_file_exists = intermediate_pack.file_exists(export_filepath)
                     if not overwrite and is_file_exists:
                         logging.info(f'not overwrite: {export_filepath}')
                         continue
 
-                    utility.copy_file(source_filepath, export_filepath)
+                if asset_record.get_asset() is None:
+                    continue
+
+                if migrate_tool.intermediate_pack is not None:
+                    if pack_exported_file(migrate_tool, relative_filepath, source_filepath, export_filepath) and manifest is not None:
+                        manifest.update(relative_filepath, source_filepath, export_filepath)
+                    continue
+
+                # copied by the worker threads while the next assets are checked
+                copy_engine.submit(source_filepath, export_filepath)
+                copied_relative_filepaths.append(relative_filepath)
+
+            for (relative_filepath, (source_filepath, export_filepath, success)) in zip(copied_relative_filepaths, copy_engine.get_results()):
+                if success and manifest is not None:
+                    manifest.update(relative_filepath, source_filepath, export_filepath)
+        logging.info(f'copy: {class_name} {copy_engine.get_stats_text()}')
+        if manifest is not None:
+            logging.info(f'export manifest: {class_name} {manifest.get_stats_text()}')
+            manifest.save()
     logging.info(f'>>> End export_assets: {class_name}')
 
 
-def export_assets_to_unreal_text(migrate_tool, class_name, ext, ignore_folders, overwrite=True):    
+def export_assets_to_unreal_text(migrate_tool, class_name, ext, overwrite=True, normalize_encoding=False, manifest=None):    
     assets = migrate_tool.get_assets_by_class(class_name)
     logging.info(f'>>> Begin export_assets_to_unreal_text: {class_name}({len(assets)})')
     if assets is not None:        
         total_num = len(assets)
         task_name = f'export_assets_to_unreal_text: {class_name}'
+        source_ext = utility.get_asset_ext(class_name)
+        compression = migrate_tool.get_compression(class_name)
+        options = f'normalize_encoding={normalize_encoding},compression={compression}'
+        if manifest is not None:
+            manifest.reset_stats()
         with unreal.ScopedSlowTask(total_num, task_name) as slow_task:
             slow_task.make_dialog(True)
-            for (i, asset_data) in enumerate(assets):
+            for (i, asset_record) in enumerate(assets):
                 slow_task.enter_progress_frame(1)       
-                asset = asset_data.get_asset()
-                if asset_data.is_valid() and asset is not None:
-                    relative_filepath = str(asset_data.package_name)
-                    if relative_filepath.startswith('/Game/'):
-                        relative_filepath = relative_filepath.replace("/Game/", "Content/", 1) + ext
-                    
-                    if utility.check_ignore_folders(relative_filepath, ignore_folders):
-                        logging.info(f'ignored: {relative_filepath}')
-                        continue
-
-                    export_filepath = os.path.join(migrate_tool.intermediate_dircetory, relative_filepath)
+                relative_filepath = asset_record.get_relative_filepath(ext)
+                source_filepath = os.path.join(migrate_tool.project_dircetory, asset_record.get_relative_filepath(source_ext))
+                export_filepath = os.path.join(migrate_tool.intermediate_dircetory, relative_filepath)
 
+                # check the manifest before loading the asset, stale .T3D files are exported again
+                if manifest is not None:
+                    if manifest.is_up_to_date(relative_filepath, source_filepath, export_filepath, options):
+                        continue
+                else:
                     # check overwrite
-                    is_file_exists = os.path.exists(export_filepath)
+                    is_file_exists = intermediate_pack.file_exists(export_filepath)
                     if not overwrite and is_file_exists:
                         logging.info(f'not overwrite: {export_filepath}')
                         continue
 
-                    utility.export_to_unreal_text(export_filepath, asset)
-    logging.info(f'>>> Begin export_assets_to_unreal_text: {class_name}')
+                asset = asset_record.get_asset()
+                if asset is None:
+                    continue
+
+                if not utility.export_to_unreal_text(export_filepath, asset, normalize_encoding=normalize_encoding, compression=compression):
+                    continue
+
+                # the exporter writes a loose file, it is moved into the pack
+                if migrate_tool.intermediate_pack is not None and not pack_exported_file(migrate_tool, relative_filepath, export_filepath, export_filepath):
+                    continue
+
+                if manifest is not None:
+                    manifest.update(relative_filepath, source_filepath, export_filepath, options)
+        if manifest is not None:
+            logging.info(f'export manifest: {class_name} {manifest.get_stats_text()}')
+            manifest.save()
+    logging.info(f'>>> End export_assets_to_unreal_text: {class_name}')
 
 
 # Excute Exporter
 def execute(migrate_tool, copy_class_names, unreal_text_class_names, clean_up_class_names, save_class_names, ignore_folders):
     export_project_info(migrate_tool)
 
+    # one registry snapshot of all classes, shared by the file lists and the exports
+    migrate_tool.build_asset_index(list(copy_class_names) + list(unreal_text_class_names), ignore_folders)
+
+    # unchanged assets are skipped by the export manifest
+    manifest = None
+    if migrate_tool.get_config_value('use_export_manifest'):
+        manifest = export_manifest.ExportManifest(migrate_tool.export_manifest_filepath)
+
     # Export assets
     for class_name in copy_class_names:
-        ext = ".uasset"
-        if class_name == 'World':
-            ext = '.umap'
-        export_asset_file_list(migrate_tool, class_name, ext, ignore_folders)
-        export_assets(migrate_tool, class_name, ext, ignore_folders)
+        ext = utility.get_asset_ext(class_name)
+        export_assets(migrate_tool, class_name, ext, manifest=manifest)
+        export_asset_file_list(migrate_tool, class_name, ext, 'copy', manifest=manifest)
     
     # Export .uasset to text
+    normalize_encoding = migrate_tool.get_config_value('normalize_unreal_text_encoding')
     for class_name in unreal_text_class_names:
         ext = ".T3D"
-        export_asset_file_list(migrate_tool, class_name, ext, ignore_folders)
-        export_assets_to_unreal_text(migrate_tool, class_name, ext, ignore_folders, overwrite=False)
+        export_assets_to_unreal_text(migrate_tool, class_name, ext, overwrite=False, normalize_encoding=normalize_encoding, manifest=manifest)
+        export_asset_file_list(migrate_tool, class_name, ext, 'unreal_text', manifest=manifest)
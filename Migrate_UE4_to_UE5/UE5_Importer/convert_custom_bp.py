@@ -59,78 +59,75 @@ def CustomBP_to_Blueprint(migrate_tool, subsystem, blueprint_library, package_na
         m_part_info = re_split_package_name.match(part_info)
         part_type = ''
         part_name = ''
-        children = []
+        source_components = []
         if m_part_info:
             part_type, part_name = m_part_info.groups()        
-            children = uobject.get_children_by_attribute('Name', part_name)
+            source_components = uobject.select(f'> [Name="{part_name}"][SourceComponent] > [Name="SourceComponent"]')
 
-        for child in children:
-            sub_object_name = child.get_value('Name', '')
+        # make subobject component
+        for source_component in source_components:
+            sub_object_name = source_component.parent.get_value('Name', '')
 
             # ignore mesh for distance field shadow
             if ignore_distance_field_shadow_mesh and sub_object_name.endswith('_DFS'):
                 continue
 
-            # make subobject component
-            if child.has_value('SourceComponent'):
-                source_components = child.get_children_by_attribute('Name', 'SourceComponent')
-                for source_component in source_components:
-                    new_class = None
+            new_class = None
+            if 'CustomBPStaticMeshPart' == part_type:
+                new_class = unreal.StaticMeshComponent
+            elif 'CustomBPSkeletalMeshPart' == part_type:
+                new_class = unreal.SkeletalMeshComponent
+            elif 'CustomBPParticlePart' == part_type:
+                new_class = unreal.ParticleSystemComponent
+            elif 'CustomBPDecalPart' == part_type:
+                new_class = unreal.DecalComponent
+            elif 'CustomBPPointLightPart' == part_type:
+                new_class = unreal.PointLightComponent
+            else:
+                unknown_classes.append(part_type)
+
+            # create sub object component
+            if new_class:
+                # add component
+                params = unreal.AddNewSubobjectParams(parent_handle=default_scene_root_handle, new_class=new_class, blueprint_context=blueprint)
+                sub_handle, fail_reason = subsystem.add_new_subobject(params)
+                if not fail_reason.is_empty():
+                    logging.error(f"ERROR: from sub_object_subsystem.add_new_subobject: {fail_reason}")
+                    continue
+
+                sub_data = blueprint_library.get_data(sub_handle)
+                sub_object = blueprint_library.get_object(sub_data)
+                if sub_object is None:
+                    continue
+                        
+                # set common properties
+                if sub_object_name:
+                    subsystem.rename_subobject(sub_handle, sub_object_name)
+                set_editor_property(source_component, 'bVisible', sub_object, 'visible', None, False)
+                set_editor_property(source_component, 'bHiddenInGame', sub_object, 'hidden_in_game', None, False)
+                set_editor_property(source_component, 'RelativeLocation', sub_object, 'RelativeLocation', convert_string_to_vector, True)
+                set_editor_property(source_component, 'RelativeRotation', sub_object, 'RelativeRotation', convert_string_to_rotation, True)
+                set_editor_property(source_component, 'RelativeScale3D', sub_object, 'RelativeScale3D', convert_string_to_vector, True)
+
+                # set specifiy data
+                try:
                     if 'CustomBPStaticMeshPart' == part_type:
-                        new_class = unreal.StaticMeshComponent
+                        set_asset_to_component(sub_object, source_component, 'StaticMesh')
+                        set_override_materials(sub_object, source_component)
                     elif 'CustomBPSkeletalMeshPart' == part_type:
-                        new_class = unreal.SkeletalMeshComponent
+                        set_asset_to_component(sub_object, source_component, 'SkeletalMesh')
+                        set_override_materials(sub_object, source_component)
+                        set_animation_data(sub_object, source_component)
                     elif 'CustomBPParticlePart' == part_type:
-                        new_class = unreal.ParticleSystemComponent
+                        set_asset_to_component(sub_object, source_component, 'Template')
                     elif 'CustomBPDecalPart' == part_type:
-                        new_class = unreal.DecalComponent
+                        set_asset_to_component(sub_object, source_component, 'DecalMaterial')
                     elif 'CustomBPPointLightPart' == part_type:
-                        new_class = unreal.PointLightComponent
+                        set_point_light_properties(sub_object, source_component)
                     else:
-                        unknown_classes.append(part_type)
-
-                    # create sub object component
-                    if new_class:
-                        # add component
-                        params = unreal.AddNewSubobjectParams(parent_handle=default_scene_root_handle, new_class=new_class, blueprint_context=blueprint)
-                        sub_handle, fail_reason = subsystem.add_new_subobject(params)
-                        if not fail_reason.is_empty():
-                            logging.error(f"ERROR: from sub_object_subsystem.add_new_subobject: {fail_reason}")
-                            continue
-
-                        sub_data = blueprint_library.get_data(sub_handle)
-                        sub_object = blueprint_library.get_object(sub_data)
-                        if sub_object is None:
-                            continue
-                        
-                        # set common properties
-                        if sub_object_name:
-                            subsystem.rename_subobject(sub_handle, sub_object_name)
-                        set_editor_property(source_component, 'bVisible', sub_object, 'visible', None, False)
-                        set_editor_property(source_component, 'bHiddenInGame', sub_object, 'hidden_in_game', None, False)
-                        set_editor_property(source_component, 'RelativeLocation', sub_object, 'RelativeLocation', unreal.StringLibrary.conv_string_to_vector, True)
-                        set_editor_property(source_component, 'RelativeRotation', sub_object, 'RelativeRotation', convert_string_to_rotation, True)
-                        set_editor_property(source_component, 'RelativeScale3D', sub_object, 'RelativeScale3D', unreal.StringLibrary.conv_string_to_vector, True)
-
-                        # set specifiy data
-                        try:
-                            if 'CustomBPStaticMeshPart' == part_type:
-                                set_asset_to_component(sub_object, source_component, 'StaticMesh')
-                                set_override_materials(sub_object, source_component)
-                            elif 'CustomBPSkeletalMeshPart' == part_type:
-                                set_asset_to_component(sub_object, source_component, 'SkeletalMesh')
-                                set_override_materials(sub_object, source_component)
-                                set_animation_data(sub_object, source_component)
-                            elif 'CustomBPParticlePart' == part_type:
-                                set_asset_to_component(sub_object, source_component, 'Template')
-                            elif 'CustomBPDecalPart' == part_type:
-                                set_asset_to_component(sub_object, source_component, 'DecalMaterial')
-                            elif 'CustomBPPointLightPart' == part_type:
-                                set_point_light_properties(sub_object, source_component)
-                            else:
-                                logging.error(f'Unknown CustomBPPartType({part_name}): {part_type}')
-                        except:
-                            logging.error(f'{package_name}:{traceback.format_exc()}')
+                        logging.error(f'Unknown CustomBPPartType({part_name}): {part_type}')
+                except:
+                    logging.error(f'{package_name}:{traceback.format_exc()}')
     if unknown_classes:
         unknown_classes = set(unknown_classes)
         logging.error(f"unknown_classes: {unknown_classes}")
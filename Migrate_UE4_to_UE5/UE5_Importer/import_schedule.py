@@ -0,0 +1,68 @@
+import logging
+from collections import defaultdict, namedtuple
+
+import utility
+
+# kind) 'copy': copy the exported .uasset/.umap, 'unreal_text': convert the exported .T3D
+ImportTask = namedtuple('ImportTask', ['class_name', 'kind', 'relative_filepath', 'package_name', 'dependencies'])
+
+
+def gather_import_tasks(migrate_tool, copy_class_names, unreal_text_class_names, ignore_folders):
+    """returns [ImportTask] of the exported file lists in the order of the classes, copies first"""
+    tasks = []
+    ignore_matcher = migrate_tool.get_ignore_matcher(ignore_folders)
+    for (kind, class_names) in (('copy', copy_class_names), ('unreal_text', unreal_text_class_names)):
+        for class_name in class_names:
+            filelist = migrate_tool.get_exported_filelist(class_name)
+            (relative_filepaths, ignored_filepaths) = ignore_matcher.partition(filelist)
+            for relative_filepath in ignored_filepaths:
+                logging.info(f'ignored: {relative_filepath}')
+            for relative_filepath in relative_filepaths:
+                entry = filelist.get(relative_filepath)
+                package_name = utility.relative_filepath_to_asset_path(relative_filepath)
+                tasks.append(ImportTask(class_name, kind, relative_filepath, package_name, entry.dependencies))
+    return tasks
+
+
+def build_import_waves(tasks):
+    """
+    usage)
+        for wave in build_import_waves(tasks): ...
+
+    Sorts the tasks topologically by the package dependencies, a task is in the wave after the last wave of its dependencies.
+    The tasks of a wave do not depend on each other and keep the order of tasks.
+    Dependencies which are not imported are ignored, the tasks of a dependency cycle are imported in the last wave.
+    """
+    package_tasks = defaultdict(list)
+    for (i, task) in enumerate(tasks):
+        package_tasks[task.package_name].append(i)
+
+    dependents = [[] for task in tasks]
+    num_dependencies = [0] * len(tasks)
+    for (i, task) in enumerate(tasks):
+        for dependency in set(task.dependencies):
+            if dependency == task.package_name:
+                continue
+            for j in package_tasks.get(dependency, ()):
+                dependents[j].append(i)
+                num_dependencies[i] += 1
+
+    waves = []
+    num_scheduled = 0
+    wave = [i for i in range(len(tasks)) if 0 == num_dependencies[i]]
+    while wave:
+        waves.append([tasks[i] for i in wave])
+        num_scheduled += len(wave)
+        next_wave = []
+        for i in wave:
+            for j in dependents[i]:
+                num_dependencies[j] -= 1
+                if 0 == num_dependencies[j]:
+                    next_wave.append(j)
+        wave = sorted(next_wave)
+
+    if num_scheduled < len(tasks):
+        cyclic_tasks = [tasks[i] for i in range(len(tasks)) if 0 < num_dependencies[i]]
+        logging.error(f'dependency cycle: {", ".join(task.package_name for task in cyclic_tasks)}')
+        waves.append(cyclic_tasks)
+    return waves
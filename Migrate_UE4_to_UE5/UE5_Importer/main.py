@@ -5,6 +5,7 @@ import shutil
 import stat
 import utility
 
+import intermediate_pack
 import parsing_unreal_text
 import widgets
 
@@ -24,6 +25,9 @@ importlib.reload(convert_custom_material)
 from . import world_partition_builder
 importlib.reload(world_partition_builder)
 
+from . import import_schedule
+importlib.reload(import_schedule)
+
 import unreal
 
 
@@ -51,94 +55,132 @@ def import_project_info(migrate_tool):
     return src_project_info
 
 
-def import_assets(migrate_tool, class_name, ignore_folders, available_source_control, overwrite=True):
-    logging.info(f">>> Begin copy_assets: {class_name}")
-    filepath_list = migrate_tool.get_exported_filelist(class_name)
-    total_num = len(filepath_list)
-    task_name = f'copy_assets: {class_name}'
-    with unreal.ScopedSlowTask(total_num, task_name) as slow_task:
-        slow_task.make_dialog(True)
-        for (i, relative_filepath) in enumerate(filepath_list):
-            slow_task.enter_progress_frame(1)
-            if utility.check_ignore_folders(relative_filepath, ignore_folders):
-                logging.info(f'ignored: {relative_filepath}')
-                continue
-
-            src_filepath = os.path.join(migrate_tool.intermediate_dircetory, relative_filepath)
-            if os.path.exists(src_filepath):
-                dst_filepath = os.path.join(migrate_tool.project_dircetory, relative_filepath)
-                
-                # check overwrite
-                if not overwrite and os.path.exists(dst_filepath):
-                    logging.info(f'not overwrite: {dst_filepath}')
-                    continue
-                    
-                utility.copy_file(src_filepath, dst_filepath, available_source_control)
-            else:
-                logging.info(f'not found source: {src_filepath}')
-    logging.info(f">>> End copy_assets: {class_name}")
-
-
-def import_assets_from_unreal_text(migrate_tool, class_name, ignore_folders, available_source_control, overwrite=True):    
-    logging.info(f">>> Begin import_assets_from_unreal_text: {class_name}")
-    blueprint_library = unreal.SubobjectDataBlueprintFunctionLibrary()
-    subsystem = unreal.get_engine_subsystem(unreal.SubobjectDataSubsystem)
-    asset_tools = unreal.AssetToolsHelpers.get_asset_tools()
-    filepath_list = migrate_tool.get_exported_filelist(class_name)
-    total_num = len(filepath_list)
-    task_name = f"import_assets_from_unreal_text : {class_name}"
-    with unreal.ScopedSlowTask(total_num, task_name) as slow_task:
+def submit_copy_asset(migrate_tool, copy_engine, relative_filepath, overwrite=True):
+    """submits the copy of the exported file to the project, returns False if it is not copied"""
+    src_filepath = os.path.join(migrate_tool.intermediate_dircetory, relative_filepath)
+    if intermediate_pack.file_exists(src_filepath):
+        dst_filepath = os.path.join(migrate_tool.project_dircetory, relative_filepath)
+        
+        # check overwrite
+        if not overwrite and os.path.exists(dst_filepath):
+            logging.info(f'not overwrite: {dst_filepath}')
+            return False
+            
+        copy_engine.submit(src_filepath, dst_filepath)
+        return True
+    logging.info(f'not found source: {src_filepath}')
+    return False
+
+
+def get_unreal_text_filepath(migrate_tool, relative_filepath):
+    relative_base_filename = os.path.splitext(relative_filepath)[0]
+    return os.path.join(migrate_tool.intermediate_dircetory, relative_base_filename + '.T3D')
+
+
+def convert_unreal_text_asset(migrate_tool, asset_tools, subsystem, blueprint_library, class_name, relative_filepath, uobject=None, parse_executor=None):
+    """converts the exported .T3D to the asset, the file is parsed here unless the parsed uobject is given
+    parse_executor: shared process pool, the worlds of a world partition are parsed by it"""
+    relative_base_filename = os.path.splitext(relative_filepath)[0]
+    relative_filepath = relative_base_filename + '.T3D'
+    intermediate_filepath = get_unreal_text_filepath(migrate_tool, relative_filepath)
+    if not intermediate_pack.file_exists(intermediate_filepath):
+        logging.info(f'not found intermediate file: {intermediate_filepath}')
+        return
+
+    package_name = utility.relative_filepath_to_asset_path(relative_filepath)
+
+    # world is parsed in streaming mode, actors are spawned without holding the whole tree
+    if 'World' == class_name:
+        create_or_load_world(asset_tools, package_name)
+        world_partition_builder.spawn_actors_from_unreal_text_file(migrate_tool, subsystem, blueprint_library, intermediate_filepath, clear_level=True)
+        success = unreal.EditorLevelLibrary.save_current_level()
+        logging.info(f'Save Level {package_name}: {success}')
+        return
+
+    # prepare to converting                
+    if uobject is None:
+        uobject = parsing_unreal_text.parser_unreal_text_file(intermediate_filepath, cache=migrate_tool.unreal_text_cache)
+    uasset = None
+
+    # covert unreal text to asset
+    if uobject:                
+        if 'CustomUnrealMaterial' == class_name:
+            uasset = create_or_load_asset(asset_tools, package_name, unreal.MaterialInstanceConstant, unreal.MaterialInstanceConstantFactoryNew())
+            convert_custom_material.CustomUnrealMaterial_to_MaterialInstanceConstant(migrate_tool, package_name, uobject, uasset)
+        elif 'LevelSequence' == class_name:
+            uasset = create_or_load_asset(asset_tools, package_name, unreal.LevelSequence, unreal.LevelSequenceFactoryNew())
+            convert_level_sequence.build_level_sequence(migrate_tool, package_name, uobject, uasset)
+        elif 'CustomBP' == class_name:
+            blueprint_factory = unreal.BlueprintFactory()
+            blueprint_factory.set_editor_property("ParentClass", unreal.Actor)
+            uasset = create_or_load_asset(asset_tools, package_name, None, blueprint_factory)
+            convert_custom_bp.CustomBP_to_Blueprint(migrate_tool, subsystem, blueprint_library, package_name, uobject, uasset)
+        elif 'WorldWorkspace' == class_name:
+            level_package_name = uobject.get_value('PersistentLevelPackageName')
+            create_or_load_world(asset_tools, level_package_name)
+            world_partition_builder.convert_world_partition(migrate_tool, subsystem, blueprint_library, uobject, clear_level=False, parse_executor=parse_executor)
+            success = unreal.EditorLevelLibrary.save_current_level()
+            logging.info(f'Save Level {level_package_name}: {level_package_name}')
+        else:
+            logging.info(f'not implemented convert method for {class_name}: {package_name}')
+
+    # save asset
+    if uasset is not None:
+        unreal.EditorAssetLibrary.save_loaded_asset(uasset)
+
+
+# the worlds are parsed by the converters themselves, in streaming mode or in their own worker processes
+streamed_unreal_text_class_names = ('World', 'WorldWorkspace')
+
+
+def import_wave(migrate_tool, wave_index, wave, available_source_control, overwrite=True, parse_executor=None):
+    """
+    Imports the tasks of a wave, they do not depend on each other.
+    The files are copied by threads and the .T3D files are parsed by processes in parallel,
+    the unreal calls are made on this thread after the assets of the previous waves exist.
+    parse_executor: process pool of parsing_unreal_text.create_parse_executor shared by the waves
+    """
+    copy_tasks = [task for task in wave if 'copy' == task.kind]
+    unreal_text_tasks = [task for task in wave if 'unreal_text' == task.kind]
+    logging.info(f'>>> Begin import_wave({wave_index}): copy({len(copy_tasks)}), unreal_text({len(unreal_text_tasks)})')
+    with unreal.ScopedSlowTask(len(wave), f'import_wave({wave_index})') as slow_task:
         slow_task.make_dialog(True)
-        for (i, relative_filepath) in enumerate(filepath_list):
-            slow_task.enter_progress_frame(1)
-            relative_base_filename = os.path.splitext(relative_filepath)[0]
-            relative_filepath = relative_base_filename + '.T3D'
-
-            if utility.check_ignore_folders(relative_filepath, ignore_folders):
-                logging.info(f'ignored: {relative_filepath}')
-                continue
-
-            intermediate_filepath = os.path.join(migrate_tool.intermediate_dircetory, relative_filepath)
-            if os.path.exists(intermediate_filepath):
-                package_name = utility.relative_filepath_to_asset_path(relative_filepath)
-
-                # prepare to converting                
-                uobject = parsing_unreal_text.parser_unreal_text_file(intermediate_filepath)
-                uasset = None
-
-                # covert unreal text to asset
-                if uobject:                
-                    if 'CustomUnrealMaterial' == class_name:
-                        uasset = create_or_load_asset(asset_tools, package_name, unreal.MaterialInstanceConstant, unreal.MaterialInstanceConstantFactoryNew())
-                        convert_custom_material.CustomUnrealMaterial_to_MaterialInstanceConstant(migrate_tool, package_name, uobject, uasset)
-                    elif 'LevelSequence' == class_name:
-                        uasset = create_or_load_asset(asset_tools, package_name, unreal.LevelSequence, unreal.LevelSequenceFactoryNew())
-                        convert_level_sequence.build_level_sequence(migrate_tool, package_name, uobject, uasset)
-                    elif 'CustomBP' == class_name:
-                        blueprint_factory = unreal.BlueprintFactory()
-                        blueprint_factory.set_editor_property("ParentClass", unreal.Actor)
-                        uasset = create_or_load_asset(asset_tools, package_name, None, blueprint_factory)
-                        convert_custom_bp.CustomBP_to_Blueprint(migrate_tool, subsystem, blueprint_library, package_name, uobject, uasset)
-                    elif 'WorldWorkspace' == class_name:
-                        level_package_name = uobject.get_value('PersistentLevelPackageName')
-                        create_or_load_world(asset_tools, level_package_name)
-                        world_partition_builder.convert_world_partition(migrate_tool, subsystem, blueprint_library, uobject, clear_level=False)
-                        success = unreal.EditorLevelLibrary.save_current_level()
-                        logging.info(f'Save Level {level_package_name}: {level_package_name}')
-                    elif 'World' == class_name:
-                        create_or_load_world(asset_tools, package_name)
-                        world_partition_builder.spawn_actors_on_current_world(migrate_tool, subsystem, blueprint_library, uobject, clear_level=True)
-                        success = unreal.EditorLevelLibrary.save_current_level()
-                        logging.info(f'Save Level {package_name}: {success}')
-                    else:
-                        logging.info(f'not implemented convert method for {class_name}: {package_name}')
-
-                # save asset
-                if uasset is not None:
-                    unreal.EditorAssetLibrary.save_loaded_asset(uasset)
-            else:
-                logging.info(f'not found intermediate file: {intermediate_filepath}')
-    logging.info(f">>> End import_assets_from_unreal_text: {class_name}")
+
+        # copy
+        if copy_tasks:
+            copy_engine = utility.FileCopyEngine(workers=migrate_tool.get_config_value('copy_workers'), transfer_mode=migrate_tool.get_config_value('transfer_mode'), use_source_control=available_source_control)
+            with copy_engine:
+                for task in copy_tasks:
+                    submit_copy_asset(migrate_tool, copy_engine, task.relative_filepath, overwrite)
+                copied_filepaths = [dst_filepath for (src_filepath, dst_filepath, success) in copy_engine.get_results() if success]
+                slow_task.enter_progress_frame(len(copy_tasks))
+            logging.info(f'copy: import_wave({wave_index}) {copy_engine.get_stats_text()}')
+
+            # the next waves check the copied assets by the asset registry
+            if copied_filepaths:
+                migrate_tool.asset_registry.scan_files_synchronous(copied_filepaths, force_rescan=True)
+
+        # convert, parsed ahead in worker processes
+        if unreal_text_tasks:
+            blueprint_library = unreal.SubobjectDataBlueprintFunctionLibrary()
+            subsystem = unreal.get_engine_subsystem(unreal.SubobjectDataSubsystem)
+            asset_tools = unreal.AssetToolsHelpers.get_asset_tools()
+            parsed_tasks = [task for task in unreal_text_tasks if task.class_name not in streamed_unreal_text_class_names and intermediate_pack.file_exists(get_unreal_text_filepath(migrate_tool, task.relative_filepath))]
+            parsed_uobjects = parsing_unreal_text.parse_many(
+                [get_unreal_text_filepath(migrate_tool, task.relative_filepath) for task in parsed_tasks],
+                workers=migrate_tool.get_config_value('unreal_text_parse_workers'),
+                cache=migrate_tool.unreal_text_cache,
+                executor=parse_executor
+            )
+            for (task, (filepath, uobject)) in zip(parsed_tasks, parsed_uobjects):
+                slow_task.enter_progress_frame(1)
+                convert_unreal_text_asset(migrate_tool, asset_tools, subsystem, blueprint_library, task.class_name, task.relative_filepath, uobject)
+            parsed_task_set = set(parsed_tasks)
+            for task in unreal_text_tasks:
+                if task not in parsed_task_set:
+                    slow_task.enter_progress_frame(1)
+                    convert_unreal_text_asset(migrate_tool, asset_tools, subsystem, blueprint_library, task.class_name, task.relative_filepath, parse_executor=parse_executor)
+    logging.info(f'>>> End import_wave({wave_index})')
 
 
 def clean_up_assets(migrate_tool, class_name):
@@ -164,11 +206,12 @@ def save_assets(migrate_tool, class_name, only_if_is_dirty=False):
     num_tasks = len(assets)
     with unreal.ScopedSlowTask(num_tasks, class_name) as slow_task:
         slow_task.make_dialog(True)
-        for (i, asset_data) in enumerate(assets):
+        for (i, asset_record) in enumerate(assets):
             slow_task.enter_progress_frame(1)
-            asset = asset_data.get_asset()
-            asset_path_name = asset.get_path_name()            
+            asset_path_name = asset_record.object_path
             if asset_path_name.startswith('/Game/'):
+                # hardlinked files of import_wave are copied before they are saved
+                utility.break_hardlink(os.path.join(migrate_tool.project_dircetory, asset_record.get_relative_filepath(utility.get_asset_ext(class_name))))
                 logging.info(f'Save: {asset_path_name}')
                 unreal.EditorAssetLibrary.load_asset(asset_path_name)
                 unreal.EditorAssetLibrary.save_asset(asset_path_name, only_if_is_dirty=only_if_is_dirty)
@@ -183,19 +226,26 @@ def execute(migrate_tool, copy_class_names, unreal_text_class_names, clean_up_cl
     src_project_info = import_project_info(migrate_tool) 
     src_project_dircetory = src_project_info.get('project_directory')
     
-    # copy files list for each class
-    for class_name in copy_class_names:
-        import_assets(migrate_tool, class_name, ignore_folders, available_source_control, overwrite=True)
-
-    # convert UnrealText(.T3D) files to .uasset
-    for class_name in unreal_text_class_names:
-        import_assets_from_unreal_text(migrate_tool, class_name, ignore_folders, available_source_control, overwrite=True)
+    # copy files and convert UnrealText(.T3D) files to .uasset in waves, the dependencies of an asset are imported in the previous waves
+    tasks = import_schedule.gather_import_tasks(migrate_tool, copy_class_names, unreal_text_class_names, ignore_folders)
+    waves = import_schedule.build_import_waves(tasks)
+    logging.info(f'>>> import waves({len(waves)}), tasks({len(tasks)})')
+    # the parse worker processes are started once for all waves
+    parse_executor = parsing_unreal_text.create_parse_executor(migrate_tool.get_config_value('unreal_text_parse_workers'))
+    try:
+        for (wave_index, wave) in enumerate(waves):
+            import_wave(migrate_tool, wave_index, wave, available_source_control, overwrite=True, parse_executor=parse_executor)
+    finally:
+        if parse_executor is not None:
+            parse_executor.shutdown()
 
     # save class assets
     for class_name in clean_up_class_names:
         clean_up_assets(migrate_tool, class_name)
 
-    # save class assets
+    # save class assets, the registry is changed by the import, so the snapshot is taken here
+    migrate_tool.invalidate_asset_index()
+    migrate_tool.build_asset_index(save_class_names, ignore_folders)
     for class_name in save_class_names:
         save_assets(migrate_tool, class_name, only_if_is_dirty=False)
 
@@ -3,13 +3,18 @@ import os
 
 import utility
 import parsing_unreal_text
+import actor_transforms
 
 from .convert_custom_bp_actor_data import create_custom_bp_actor_data, CustomBP_ActorData_to_Blueprint
 
 import unreal
 
 
-def spawn_actor_custom_bp_or_actor(subsystem, blueprint_library, actor_label, actor_uobject, asset_type_name, folder_name):
+def get_component_transform(component_uboject):
+    return (component_uboject.get_value('RelativeLocation', ''), component_uboject.get_value('RelativeRotation', ''), component_uboject.get_value('RelativeScale3D', utility.default_scale))
+
+
+def spawn_actor_custom_bp_or_actor(subsystem, blueprint_library, actor_label, actor_uobject, asset_type_name, folder_name, transform=None):
     if actor_uobject.has_value(asset_type_name):
         asset_name = actor_uobject.get_value(asset_type_name)
         asset_path = utility.package_name_to_asset_path(asset_name)
@@ -29,9 +34,10 @@ def spawn_actor_custom_bp_or_actor(subsystem, blueprint_library, actor_label, ac
                 for component_uboject in actor_uobject.get_children_by_attribute('Name', 'BaseComponent'):
                     if component_uboject.has_value('RelativeLocation') or component_uboject.has_value('RelativeRotation') or component_uboject.has_value('RelativeScale3D'):
                         #logging.info(f'spawn_common_actor: {asset_type_name} {actor_label}')
-                        location_and_is_valid = unreal.StringLibrary.conv_string_to_vector(component_uboject.get_value('RelativeLocation', ''))
-                        rotation_and_is_valid = utility.convert_string_to_rotation(component_uboject.get_value('RelativeRotation', ''))
-                        scale_and_is_valid = unreal.StringLibrary.conv_string_to_vector(component_uboject.get_value('RelativeScale3D', 'X=1.000 Y=1.000 Z=1.000'))
+                        (location, rotation, scale) = transform if transform is not None else get_component_transform(component_uboject)
+                        location_and_is_valid = utility.convert_string_to_vector(location)
+                        rotation_and_is_valid = utility.convert_string_to_rotation(rotation)
+                        scale_and_is_valid = utility.convert_string_to_vector(scale)
                         
                         actor = unreal.EditorLevelLibrary.spawn_actor_from_object(asset, location_and_is_valid[0], rotation_and_is_valid[0], False)
                         if scale_and_is_valid[1]:
@@ -43,7 +49,7 @@ def spawn_actor_custom_bp_or_actor(subsystem, blueprint_library, actor_label, ac
                             actor.set_folder_path(folder_name)
                         break
 
-def spawn_common_actor(actor_label, actor_uobject, asset_type_name, folder_name):
+def spawn_common_actor(actor_label, actor_uobject, asset_type_name, folder_name, transform=None):
     component_ubojects = actor_uobject.get_children_has_value(asset_type_name)
     if component_ubojects:
         component_uboject = component_ubojects[0]
@@ -54,9 +60,10 @@ def spawn_common_actor(actor_label, actor_uobject, asset_type_name, folder_name)
             # spawn actor
             if asset is not None:
                 #logging.info(f'spawn_common_actor: {asset_type_name} {actor_label}')
-                location_and_is_valid = unreal.StringLibrary.conv_string_to_vector(component_uboject.get_value('RelativeLocation', ''))
-                rotation_and_is_valid = utility.convert_string_to_rotation(component_uboject.get_value('RelativeRotation', ''))
-                scale_and_is_valid = unreal.StringLibrary.conv_string_to_vector(component_uboject.get_value('RelativeScale3D', 'X=1.000 Y=1.000 Z=1.000'))
+                (location, rotation, scale) = transform if transform is not None else get_component_transform(component_uboject)
+                location_and_is_valid = utility.convert_string_to_vector(location)
+                rotation_and_is_valid = utility.convert_string_to_rotation(rotation)
+                scale_and_is_valid = utility.convert_string_to_vector(scale)
 
                 actor = unreal.EditorLevelLibrary.spawn_actor_from_object(asset, location_and_is_valid[0], rotation_and_is_valid[0], False)
 
@@ -75,54 +82,162 @@ def spawn_common_actor(actor_label, actor_uobject, asset_type_name, folder_name)
                     actor.set_folder_path(folder_name)
 
 
+# actor classes spawned by spawn_actors_by_class_map
+spawn_actor_class_names = [
+    '/Script/Engine.StaticMeshActor',
+    '/Script/Engine.SkeletalMeshActor',
+    '/Script/Engine.DecalActor',
+    '/Script/Engine.Emitter',
+    '/Script/CustomScene.CustomBPActor',
+    '/Script/CustomScene.CustomBP_Actor'
+]
+
+
+def log_actor_class_counts(actor_class_counts):
+    class_names = list(actor_class_counts.keys())
+    class_names.sort()
+    for class_name in class_names:
+        logging.info(f'    {class_name}({actor_class_counts[class_name]})')
+
+
+def gather_actor_class_map(root_uobject):
+    all_actor_uobjects = root_uobject.select('Actor')
+    actor_class_map = {}
+    for uobject in all_actor_uobjects:
+        actor_class = uobject.get_attribute('Class', '')
+        if actor_class not in actor_class_map:
+            actor_class_map[actor_class] = []
+        actor_class_map[actor_class].append(uobject)
+    return actor_class_map
+
+
+def gather_actor_class_map_from_file(world_filepath, cache=None):
+    """
+    parse a world .T3D, keeps only the actors which can be spawned, returns (root_uobject, actor_class_map)
+    without a cache, only the blocks of the spawnable actors are parsed using the block index,
+    with a cache, a missing entry is written by one streaming parse and the other actors are dropped in on_end_object
+    """
+    actor_class_map = {}
+    actor_class_counts = {}
+
+    def on_end_object(uobject):
+        if 'Actor' == uobject.type:
+            actor_class = uobject.get_attribute('Class', '')
+            actor_class_counts[actor_class] = actor_class_counts.get(actor_class, 0) + 1
+            if actor_class in spawn_actor_class_names:
+                if actor_class not in actor_class_map:
+                    actor_class_map[actor_class] = []
+                actor_class_map[actor_class].append(uobject)
+            # detach the actor from the tree, the class map holds the actors to spawn
+            return True
+        return False
+
+    if cache is None:
+        # without a cache, only the blocks of the spawnable actors are parsed
+        block_index = parsing_unreal_text.load_unreal_text_block_index(world_filepath)
+        root_uobject = parsing_unreal_text.parser_unreal_text_blocks(world_filepath, class_names=spawn_actor_class_names, block_index=block_index)
+        if root_uobject:
+            for uobject in root_uobject.get_children_by_type('Actor'):
+                on_end_object(uobject)
+            log_actor_class_counts(block_index.get_class_counts())
+        return (root_uobject, actor_class_map)
+
+    root_uobject = parsing_unreal_text.parser_unreal_text_file(world_filepath, on_end_object=on_end_object, cache=cache)
+    if root_uobject:
+        log_actor_class_counts(actor_class_counts)
+    return (root_uobject, actor_class_map)
+
+
+def get_spawn_actor_indices(transforms, region_box=None, region_sphere=None, cell_size=0.0):
+    """
+    returns the indices of the actors to spawn, in cell order if cell_size is given.
+    region_box: [min_x, min_y, min_z, max_x, max_y, max_z], region_sphere: [x, y, z, radius]
+    actors without a valid transform are spawned only without a region, after the others.
+    """
+    if not region_box and not region_sphere and not cell_size:
+        return list(range(len(transforms)))
+    grid = actor_transforms.UnrealActorGrid(transforms, cell_size or 25600.0)
+    if region_box:
+        indices = grid.query_box(region_box[:3], region_box[3:])
+        if region_sphere:
+            indices = sorted(set(indices).intersection(grid.query_sphere(region_sphere[:3], region_sphere[3])))
+    elif region_sphere:
+        indices = grid.query_sphere(region_sphere[:3], region_sphere[3])
+    else:
+        indices = list(grid.indices)
+    if cell_size:
+        indices = grid.get_cell_ordered_indices(indices)
+    if not region_box and not region_sphere:
+        indices += [i for i in range(len(transforms)) if not transforms.is_valid(i)]
+    return indices
+
+
+def get_spawn_settings(migrate_tool):
+    """returns the keyword arguments of spawn_actors_by_class_map from the config"""
+    return {
+        'region_box': migrate_tool.get_config_value('spawn_region_box'),
+        'region_sphere': migrate_tool.get_config_value('spawn_region_sphere'),
+        'cell_size': migrate_tool.get_config_value('spawn_cell_size') if migrate_tool.get_config_value('spawn_in_cell_order') else 0.0
+    }
+
+
+def spawn_actors_by_class_map(subsystem, blueprint_library, actor_class_map, clear_level=False, folder_name='', region_box=None, region_sphere=None, cell_size=0.0):
+    actor_subsystem = unreal.get_editor_subsystem(unreal.EditorActorSubsystem)
+    if clear_level:
+        level_actors = unreal.EditorLevelLibrary.get_all_level_actors()
+        actor_subsystem.destroy_actors(level_actors)
+
+    def execute_taks(task_name, uobjects, task_func, **kargs):
+        # transforms are decoded once for all actors, the spawners read them instead of the component values
+        transforms = actor_transforms.extract_actor_transforms(uobjects, asset_keys=(kargs['asset_type_name'],))
+        indices = get_spawn_actor_indices(transforms, region_box, region_sphere, cell_size)
+        if uobjects:
+            logging.info(f'{task_name} {len(indices)}/{len(uobjects)} actors, bounds: {transforms.get_bounds()}')
+        num_frames = len(indices)
+        with unreal.ScopedSlowTask(num_frames, task_name) as slow_task:
+            slow_task.make_dialog(True)
+            for i in indices:
+                actor_uobject = uobjects[i]
+                actor_label = actor_uobject.get_value('ActorLabel', actor_uobject.get_attribute('Name', ''))
+                transform = (transforms.get_location(i), transforms.get_rotation(i), transforms.get_scale(i)) if transforms.is_valid(i) else None
+                slow_task.enter_progress_frame(1)
+                task_func(actor_label=actor_label, actor_uobject=actor_uobject, transform=transform, **kargs)
+
+    custom_bp_actor_uobjects = actor_class_map.get('/Script/CustomScene.CustomBP_Actor', [])
+    custom_bp_uobjects = actor_class_map.get('/Script/CustomScene.CustomBPActor', [])
+    emitter_uobjects = actor_class_map.get('/Script/Engine.Emitter', [])
+    skeletal_mesh_uobjects = actor_class_map.get('/Script/Engine.SkeletalMeshActor', [])
+    static_mesh_uobjects = actor_class_map.get('/Script/Engine.StaticMeshActor', [])
+    decal_uobjects = actor_class_map.get('/Script/Engine.DecalActor', [])
+
+    execute_taks('adding StaticMeshes...', static_mesh_uobjects, spawn_common_actor, asset_type_name='StaticMesh', folder_name=folder_name)
+    execute_taks('adding SkeletalMesh...', skeletal_mesh_uobjects, spawn_common_actor, asset_type_name='SkeletalMesh', folder_name=folder_name)
+    execute_taks('adding DecalMaterial...', decal_uobjects, spawn_common_actor, asset_type_name='DecalMaterial', folder_name=folder_name)
+    execute_taks('adding Emitter...', emitter_uobjects, spawn_common_actor, asset_type_name='Template', folder_name=folder_name)
+    execute_taks('adding CustomBPs...', custom_bp_uobjects, spawn_actor_custom_bp_or_actor, subsystem=subsystem, blueprint_library=blueprint_library, asset_type_name='CustomBP', folder_name=folder_name)
+    execute_taks('adding CustomBP_Actors...', custom_bp_actor_uobjects, spawn_actor_custom_bp_or_actor, subsystem=subsystem, blueprint_library=blueprint_library, asset_type_name='CustomBP_Actor', folder_name=folder_name)
+
+
 def spawn_actors_on_current_world(migrate_tool, subsystem, blueprint_library, root_uobject, clear_level=False, folder_name=''):
     logging.info(f'>>> Begin spawn_actors_on_current_world: {root_uobject.get_attribute("Name", "")}')
-    actor_subsystem = unreal.get_editor_subsystem(unreal.EditorActorSubsystem)
     if root_uobject:
-        if clear_level:
-            level_actors = unreal.EditorLevelLibrary.get_all_level_actors()
-            actor_subsystem.destroy_actors(level_actors)
-        
         # gather class uobject
-        all_actor_uobjects = root_uobject.get_children_by_type('Actor', recursive=True)
-        actor_class_map = {}
-        for uobject in all_actor_uobjects:
-            actor_class = uobject.get_attribute('Class', '')
-            if actor_class not in actor_class_map:
-                actor_class_map[actor_class] = []
-            actor_class_map[actor_class].append(uobject)
-        
-        # log
-        class_names = list(actor_class_map.keys())
-        class_names.sort()
-        for class_name in class_names:
-            logging.info(f'    {class_name}({len(actor_class_map[class_name])})')
-
-        def execute_taks(task_name, uobjects, task_func, **kargs):
-            num_frames = len(uobjects)
-            with unreal.ScopedSlowTask(num_frames, task_name) as slow_task:
-                slow_task.make_dialog(True)
-                for actor_uobject in uobjects:
-                    actor_label = actor_uobject.get_value('ActorLabel', actor_uobject.get_attribute('Name', ''))
-                    slow_task.enter_progress_frame(1)
-                    task_func(actor_label=actor_label, actor_uobject=actor_uobject, **kargs)
-
-        custom_bp_actor_uobjects = actor_class_map.get('/Script/CustomScene.CustomBP_Actor', [])
-        custom_bp_uobjects = actor_class_map.get('/Script/CustomScene.CustomBPActor', [])
-        emitter_uobjects = actor_class_map.get('/Script/Engine.Emitter', [])
-        skeletal_mesh_uobjects = actor_class_map.get('/Script/Engine.SkeletalMeshActor', [])
-        static_mesh_uobjects = actor_class_map.get('/Script/Engine.StaticMeshActor', [])
-        decal_uobjects = actor_class_map.get('/Script/Engine.DecalActor', [])
-        
-        execute_taks('adding StaticMeshes...', static_mesh_uobjects, spawn_common_actor, asset_type_name='StaticMesh', folder_name=folder_name)
-        execute_taks('adding SkeletalMesh...', skeletal_mesh_uobjects, spawn_common_actor, asset_type_name='SkeletalMesh', folder_name=folder_name)
-        execute_taks('adding DecalMaterial...', decal_uobjects, spawn_common_actor, asset_type_name='DecalMaterial', folder_name=folder_name)
-        execute_taks('adding Emitter...', emitter_uobjects, spawn_common_actor, asset_type_name='Template', folder_name=folder_name)
-        execute_taks('adding CustomBPs...', custom_bp_uobjects, spawn_actor_custom_bp_or_actor, subsystem=subsystem, blueprint_library=blueprint_library, asset_type_name='CustomBP', folder_name=folder_name)
-        execute_taks('adding CustomBP_Actors...', custom_bp_actor_uobjects, spawn_actor_custom_bp_or_actor, subsystem=subsystem, blueprint_library=blueprint_library, asset_type_name='CustomBP_Actor', folder_name=folder_name)
+        actor_class_map = gather_actor_class_map(root_uobject)
+        log_actor_class_counts({class_name: len(uobjects) for (class_name, uobjects) in actor_class_map.items()})
+        spawn_actors_by_class_map(subsystem, blueprint_library, actor_class_map, clear_level, folder_name, **get_spawn_settings(migrate_tool))
     logging.info(f'>>> End spawn_actors_on_current_world: {root_uobject.get_attribute("Name", "")}')
 
 
+def spawn_actors_from_unreal_text_file(migrate_tool, subsystem, blueprint_library, world_filepath, clear_level=False, folder_name=''):
+    """streaming version of spawn_actors_on_current_world, the whole world tree is never held in memory"""
+    logging.info(f'>>> Begin spawn_actors_from_unreal_text_file: {world_filepath}')
+    (root_uobject, actor_class_map) = gather_actor_class_map_from_file(world_filepath, migrate_tool.unreal_text_cache)
+    if root_uobject:
+        spawn_actors_by_class_map(subsystem, blueprint_library, actor_class_map, clear_level, folder_name, **get_spawn_settings(migrate_tool))
+    logging.info(f'>>> End spawn_actors_from_unreal_text_file: {world_filepath}')
+    return root_uobject
+
+
 def gather_world_filepaths(migrate_tool, subsystem, blueprint_library, clear_level, filter_world_filepaths, category_object, parent_category_name, world_filepath_map):
     category_name = category_object.get_value("CategoryName", "")
     if parent_category_name:
@@ -135,8 +250,7 @@ def gather_world_filepaths(migrate_tool, subsystem, blueprint_library, clear_lev
     world_filepaths = []
     for category_level_object_name in category_level_object_names:
         category_level_asest_path = utility.package_name_to_asset_path(category_level_object_name)
-        category_level_objects = category_object.get_children_by_attribute('Name', category_level_asest_path)
-        for category_level_object in category_level_objects:
+        for category_level_object in category_object.select(f'> [Name="{category_level_asest_path}"][LevelPackageName]'):
             level_asset_path = category_level_object.get_value('LevelPackageName')
             if level_asset_path:
                 # filter - exported world filepaths
@@ -153,7 +267,8 @@ def gather_world_filepaths(migrate_tool, subsystem, blueprint_library, clear_lev
             gather_world_filepaths(migrate_tool, subsystem, blueprint_library, clear_level, filter_world_filepaths, subcategory_object, category_name, world_filepath_map)
 
 
-def convert_world_partition(migrate_tool, subsystem, blueprint_library, root_uobject, clear_level=False):
+def convert_world_partition(migrate_tool, subsystem, blueprint_library, root_uobject, clear_level=False, parse_executor=None):
+    """parse_executor: process pool of parsing_unreal_text.create_parse_executor, a pool is started for the worlds if it is None"""
     logging.info(f'convert_world_partition: {root_uobject.get_attribute("Name", "")}')
 
     # gather level infos
@@ -161,9 +276,7 @@ def convert_world_partition(migrate_tool, subsystem, blueprint_library, root_uob
     for level_asset_name in root_uobject.get_value('LevelInfos'):
         asset_path = utility.package_name_to_asset_path(level_asset_name)
         if asset_path:
-            for child in root_uobject.get_children_by_attribute('Name', asset_path):
-                if child.has_value('LevelPackageName'):
-                    level_infos.append(child)
+            level_infos.extend(root_uobject.select(f'> [Name="{asset_path}"][LevelPackageName]'))
     
     # gather world filepaths
     filter_world_filepaths = migrate_tool.get_exported_filelist('World')
@@ -173,16 +286,29 @@ def convert_world_partition(migrate_tool, subsystem, blueprint_library, root_uob
     for root_category in root_categories:
         gather_world_filepaths(migrate_tool, subsystem, blueprint_library, clear_level, filter_world_filepaths, root_category, category_name, world_filepath_map)
 
+    # parse worlds in worker processes, the main thread only spawns actors
+    world_category_names = []
+    world_filepaths = []
+    for (category_name, category_world_filepaths) in world_filepath_map.items():
+        for world_filepath in category_world_filepaths:
+            world_category_names.append(category_name)
+            world_filepaths.append(world_filepath)
+    world_uobjects = parsing_unreal_text.parse_many(
+        world_filepaths,
+        workers=migrate_tool.get_config_value('unreal_text_parse_workers'),
+        cache=migrate_tool.unreal_text_cache,
+        actor_class_names=spawn_actor_class_names,
+        executor=parse_executor
+    )
+
     # spawn_actors_on_current_world
     task_name = 'spawn_actors_on_current_world'
-    task_num = sum([len(files) for files in world_filepath_map.values()])
+    task_num = len(world_filepaths)
     with unreal.ScopedSlowTask(task_num, task_name) as slow_task:
         slow_task.make_dialog(True)
-        for (category_name, world_filepaths) in world_filepath_map.items():
-            for world_filepath in world_filepaths:
-                slow_task.enter_progress_frame(1)
-                world_uobject = parsing_unreal_text.parser_unreal_text_file(world_filepath)
-                if world_uobject:
-                    name = os.path.split(world_uobject.get_attribute('Name'))[1]
-                    level_categoty = '/'.join([category_name, name])
-                    spawn_actors_on_current_world(migrate_tool, subsystem, blueprint_library, world_uobject, clear_level, level_categoty)
\ No newline at end of file
+        for (category_name, (world_filepath, world_uobject)) in zip(world_category_names, world_uobjects):
+            slow_task.enter_progress_frame(1)
+            if world_uobject:
+                name = os.path.split(world_uobject.get_attribute('Name'))[1]
+                level_categoty = '/'.join([category_name, name])
+                spawn_actors_on_current_world(migrate_tool, subsystem, blueprint_library, world_uobject, clear_level, level_categoty)
\ No newline at end of file
@@ -0,0 +1,264 @@
+import math
+from array import array
+
+from parsing_unreal_text import UnrealRotator, UnrealVector, empty_mapping, empty_sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# asset properties of the spawned actor classes, see world_partition_builder.spawn_actors_by_class_map
+actor_transform_asset_keys = ('StaticMesh', 'SkeletalMesh', 'DecalMaterial', 'Template', 'CustomBP', 'CustomBP_Actor')
+
+# fields of an actor transform record, is_valid is 0 if a transform value could not be decoded
+actor_transform_fields = [
+    ('actor_index', 'i4', 'l'),
+    ('class_id', 'i4', 'l'),
+    ('asset_id', 'i4', 'l'),
+    ('is_valid', 'u1', 'B'),
+    ('location_x', 'f8', 'd'), ('location_y', 'f8', 'd'), ('location_z', 'f8', 'd'),
+    ('rotation_pitch', 'f8', 'd'), ('rotation_yaw', 'f8', 'd'), ('rotation_roll', 'f8', 'd'),
+    ('scale_x', 'f8', 'd'), ('scale_y', 'f8', 'd'), ('scale_z', 'f8', 'd'),
+]
+
+
+class UnrealActorTransforms:
+    """
+    usage) transforms = extract_actor_transforms(root.select('Actor'))
+           transforms.records['location_x'][i], transforms.get_location(i), transforms.get_bounds()
+    records is a numpy structured array, or a dict of array columns if numpy is not installed,
+    both are indexed by field name first. class_id and asset_id index class_names and asset_names, asset_id is -1 without asset.
+    """
+    def __init__(self, rows, class_names, asset_names):
+        self.class_names = class_names
+        self.asset_names = asset_names
+        self.num_records = len(rows)
+        if numpy is not None:
+            self.records = numpy.array(rows, dtype=[(name, dtype) for (name, dtype, typecode) in actor_transform_fields])
+        else:
+            columns = list(zip(*rows)) if rows else [()] * len(actor_transform_fields)
+            self.records = {name: array(typecode, column) for ((name, dtype, typecode), column) in zip(actor_transform_fields, columns)}
+
+    def __len__(self):
+        return self.num_records
+
+    def get_location(self, index):
+        records = self.records
+        return UnrealVector(float(records['location_x'][index]), float(records['location_y'][index]), float(records['location_z'][index]))
+
+    def get_rotation(self, index):
+        records = self.records
+        return UnrealRotator(float(records['rotation_pitch'][index]), float(records['rotation_yaw'][index]), float(records['rotation_roll'][index]))
+
+    def get_scale(self, index):
+        records = self.records
+        return UnrealVector(float(records['scale_x'][index]), float(records['scale_y'][index]), float(records['scale_z'][index]))
+
+    def get_class_name(self, index):
+        return self.class_names[self.records['class_id'][index]]
+
+    def get_asset_name(self, index):
+        asset_id = self.records['asset_id'][index]
+        return self.asset_names[asset_id] if 0 <= asset_id else None
+
+    def is_valid(self, index):
+        return bool(self.records['is_valid'][index])
+
+    def get_bounds(self):
+        """returns (min location, max location) of the valid records, or None"""
+        records = self.records
+        if numpy is not None:
+            valid_records = records[records['is_valid'] != 0]
+            if 0 == len(valid_records):
+                return None
+            minimum = [float(valid_records[name].min()) for name in ('location_x', 'location_y', 'location_z')]
+            maximum = [float(valid_records[name].max()) for name in ('location_x', 'location_y', 'location_z')]
+        else:
+            indices = [i for (i, is_valid) in enumerate(records['is_valid']) if is_valid]
+            if not indices:
+                return None
+            minimum = [min(records[name][i] for i in indices) for name in ('location_x', 'location_y', 'location_z')]
+            maximum = [max(records[name][i] for i in indices) for name in ('location_x', 'location_y', 'location_z')]
+        return (UnrealVector(*minimum), UnrealVector(*maximum))
+
+
+def find_actor_transform_component(actor_uobject, asset_keys):
+    """returns (component_uobject, asset_name) like the spawners, the component with the asset or the BaseComponent of a CustomBP actor"""
+    for child in actor_uobject._children or empty_sequence:
+        values = child._values
+        if values:
+            for key in asset_keys:
+                if key in values:
+                    return (child, values[key])
+    asset_name = None
+    values = actor_uobject._values
+    if values:
+        for key in asset_keys:
+            if key in values:
+                asset_name = values[key]
+                break
+    for child in actor_uobject._children or empty_sequence:
+        values = child._values
+        if values and 'BaseComponent' == child.get_attribute('Name') and ('RelativeLocation' in values or 'RelativeRotation' in values or 'RelativeScale3D' in values):
+            return (child, asset_name)
+    return (None, asset_name)
+
+
+def extract_actor_transforms(actor_uobjects, asset_keys=actor_transform_asset_keys) -> UnrealActorTransforms:
+    """
+    Collects the class, asset and the decoded RelativeLocation, RelativeRotation and RelativeScale3D of actors
+    in a single pass, actor_index is the index in actor_uobjects.
+    """
+    class_ids = {}
+    asset_ids = {}
+    rows = []
+    for (actor_index, actor_uobject) in enumerate(actor_uobjects):
+        class_name = actor_uobject.get_attribute('Class', '')
+        class_id = class_ids.get(class_name)
+        if class_id is None:
+            class_id = class_ids[class_name] = len(class_ids)
+        (component_uobject, asset_name) = find_actor_transform_component(actor_uobject, asset_keys)
+        asset_id = -1
+        if asset_name is not None:
+            asset_name = str(asset_name)
+            asset_id = asset_ids.get(asset_name)
+            if asset_id is None:
+                asset_id = asset_ids[asset_name] = len(asset_ids)
+
+        is_valid = component_uobject is not None
+        location = UnrealVector(0.0, 0.0, 0.0)
+        rotation = UnrealRotator(0.0, 0.0, 0.0)
+        scale = UnrealVector(1.0, 1.0, 1.0)
+        if is_valid:
+            values = component_uobject._values or empty_mapping
+            value = values.get('RelativeLocation', location)
+            if type(value) is UnrealVector:
+                location = value
+            else:
+                is_valid = False
+            value = values.get('RelativeRotation', rotation)
+            if type(value) is UnrealRotator:
+                rotation = value
+            else:
+                is_valid = False
+            value = values.get('RelativeScale3D', scale)
+            if type(value) is UnrealVector:
+                scale = value
+            else:
+                is_valid = False
+        rows.append((actor_index, class_id, asset_id, 1 if is_valid else 0) + location + rotation + scale)
+    return UnrealActorTransforms(rows, list(class_ids.keys()), list(asset_ids.keys()))
+
+
+def get_morton_code(x, y):
+    """interleaves the bits of two non-negative integers, cells close in space get close codes"""
+    code = 0
+    bit = 0
+    while x or y:
+        code |= ((x & 1) << (2 * bit)) | ((y & 1) << (2 * bit + 1))
+        x >>= 1
+        y >>= 1
+        bit += 1
+    return code
+
+
+class UnrealActorGrid:
+    """
+    usage) grid = UnrealActorGrid(extract_actor_transforms(actors), cell_size=25600.0)
+           grid.query_box((-10000, -10000, -1e9), (10000, 10000, 1e9)), grid.query_sphere((0, 0, 0), 5000), grid.get_cell_ordered_indices()
+    A uniform grid on the XY plane over the valid records of UnrealActorTransforms, queries return record indices.
+    An actor is a sphere at RelativeLocation with radius actor_radius * max(RelativeScale3D),
+    it is stored in every cell overlapped by the sphere. actor_radius 0 stores only the locations.
+    """
+    def __init__(self, transforms, cell_size=25600.0, actor_radius=0.0):
+        self.transforms = transforms
+        self.cell_size = float(cell_size)
+        self.actor_radius = float(actor_radius)
+        self.cells = {}
+        records = transforms.records
+        self.locations = list(zip(*[[float(value) for value in records[name]] for name in ('location_x', 'location_y', 'location_z')]))
+        self.radii = [0.0] * len(transforms)
+        self.indices = []
+        scales = zip(*[[abs(float(value)) for value in records[name]] for name in ('scale_x', 'scale_y', 'scale_z')])
+        for (index, (is_valid, scale)) in enumerate(zip(records['is_valid'], scales)):
+            if not is_valid:
+                continue
+            self.indices.append(index)
+            (x, y, z) = self.locations[index]
+            radius = self.actor_radius * max(scale)
+            self.radii[index] = radius
+            (min_ix, min_iy) = self.get_cell_key(x - radius, y - radius)
+            (max_ix, max_iy) = self.get_cell_key(x + radius, y + radius)
+            for iy in range(min_iy, max_iy + 1):
+                for ix in range(min_ix, max_ix + 1):
+                    cell = self.cells.get((ix, iy))
+                    if cell is None:
+                        cell = self.cells[(ix, iy)] = array('l')
+                    cell.append(index)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def get_cell_key(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def gather_candidates(self, min_x, min_y, max_x, max_y):
+        (min_ix, min_iy) = self.get_cell_key(min_x, min_y)
+        (max_ix, max_iy) = self.get_cell_key(max_x, max_y)
+        candidates = set()
+        if (max_ix - min_ix + 1) * (max_iy - min_iy + 1) <= len(self.cells):
+            for iy in range(min_iy, max_iy + 1):
+                for ix in range(min_ix, max_ix + 1):
+                    cell = self.cells.get((ix, iy))
+                    if cell is not None:
+                        candidates.update(cell)
+        else:
+            # the region is larger than the occupied cells
+            for ((ix, iy), cell) in self.cells.items():
+                if min_ix <= ix <= max_ix and min_iy <= iy <= max_iy:
+                    candidates.update(cell)
+        return candidates
+
+    def query_box(self, minimum, maximum):
+        """returns the sorted record indices of the actors overlapping the box (min_x, min_y, min_z) - (max_x, max_y, max_z)"""
+        result = []
+        for index in self.gather_candidates(minimum[0], minimum[1], maximum[0], maximum[1]):
+            location = self.locations[index]
+            radius = self.radii[index]
+            distance_squared = 0.0
+            for axis in range(3):
+                value = location[axis]
+                if value < minimum[axis]:
+                    distance_squared += (minimum[axis] - value) ** 2
+                elif maximum[axis] < value:
+                    distance_squared += (value - maximum[axis]) ** 2
+            if distance_squared <= radius * radius:
+                result.append(index)
+        result.sort()
+        return result
+
+    def query_sphere(self, center, radius):
+        """returns the sorted record indices of the actors overlapping the sphere"""
+        (cx, cy, cz) = center
+        result = []
+        for index in self.gather_candidates(cx - radius, cy - radius, cx + radius, cy + radius):
+            (x, y, z) = self.locations[index]
+            max_distance = radius + self.radii[index]
+            if (x - cx) ** 2 + (y - cy) ** 2 + (z - cz) ** 2 <= max_distance * max_distance:
+                result.append(index)
+        result.sort()
+        return result
+
+    def get_cell_ordered_indices(self, indices=None):
+        """returns the record indices ordered by the cell of their location along a z-order curve, the grid indices if indices is None"""
+        if indices is None:
+            indices = self.indices
+        if not indices:
+            return []
+        cell_keys = [self.get_cell_key(self.locations[index][0], self.locations[index][1]) for index in indices]
+        min_ix = min(ix for (ix, iy) in cell_keys)
+        min_iy = min(iy for (ix, iy) in cell_keys)
+        codes = [get_morton_code(ix - min_ix, iy - min_iy) for (ix, iy) in cell_keys]
+        return [index for (code, index) in sorted(zip(codes, indices))]
@@ -0,0 +1,303 @@
+"""
+Benchmark of parsing_unreal_text with a synthetic .T3D corpus shaped like the exported assets.
+
+usage)
+    python benchmark_parsing_unreal_text.py --output result.json
+    python benchmark_parsing_unreal_text.py --output result.json --baseline baseline.json --threshold 0.1
+
+Metrics are written to a json file. With a baseline, a metric which is worse than the baseline by more than
+the threshold is reported as a regression and the exit code is 1.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import parsing_unreal_text
+
+
+benchmark_version = 1
+default_world_sizes = [1000, 10000, 100000]
+default_encodings = ['utf-8', 'utf-16']
+
+# metrics with these suffixes are better when smaller, the others are better when larger
+lower_is_better_suffixes = ('_seconds', '_bytes')
+# timings shorter than this are too noisy to compare
+min_compare_seconds = 0.005
+
+world_actor_classes = [
+    ('/Script/Engine.StaticMeshActor', 'StaticMeshComponent', 'StaticMesh', "StaticMesh'\"/Game/Meshes/SM_{0}.SM_{0}\"'"),
+    ('/Script/Engine.SkeletalMeshActor', 'SkeletalMeshComponent', 'SkeletalMesh', "SkeletalMesh'\"/Game/Characters/SK_{0}.SK_{0}\"'"),
+    ('/Script/Engine.DecalActor', 'DecalComponent', 'DecalMaterial', "MaterialInstanceConstant'\"/Game/Decals/MI_Decal_{0}.MI_Decal_{0}\"'"),
+    ('/Script/Engine.PointLight', 'PointLightComponent', 'LightColor', '(B={0},G=200,R=255,A=255)'),
+    ('/Script/CustomScene.CustomSceneActor', 'CustomSceneComponent', 'CustomSceneData', '(Mode=Static,Weight={0})'),
+]
+
+
+def format_vector(rng, scale, keys=('X', 'Y', 'Z')):
+    return '(' + ','.join([f'{key}={rng.uniform(-scale, scale):f}' for key in keys]) + ')'
+
+
+def generate_world_lines(num_actors, seed=0):
+    """yields the lines of a World .T3D with num_actors actors"""
+    rng = random.Random(seed)
+    yield 'Begin Map Name="/Game/Maps/Benchmark"'
+    yield '   Begin Level'
+    for i in range(num_actors):
+        (class_name, component_class, asset_key, asset_format) = world_actor_classes[i % len(world_actor_classes)]
+        actor_type = class_name.rsplit('.', 1)[-1]
+        component_name = f'{component_class}0'
+        yield f"      Begin Actor Class={class_name} Name={actor_type}_{i} Archetype={actor_type}'{class_name.rsplit('.', 1)[0]}.Default__{actor_type}'"
+        yield f"         Begin Object Class=/Script/Engine.{component_class} Name=\"{component_name}\" Archetype={component_class}'/Script/Engine.Default__{actor_type}:{component_name}'"
+        yield '         End Object'
+        yield f'         Begin Object Name="{component_name}"'
+        yield f'            {asset_key}={asset_format.format(i % 97)}'
+        yield f'            RelativeLocation={format_vector(rng, 100000.0)}'
+        yield f'            RelativeRotation={format_vector(rng, 180.0, ("Pitch", "Yaw", "Roll"))}'
+        yield '            RelativeScale3D=(X=1.000000,Y=1.000000,Z=1.000000)'
+        if 0 == i % 3:
+            yield f"            OverrideMaterials(0)=MaterialInstanceConstant'\"/Game/Materials/MI_{i % 31}.MI_{i % 31}\"'"
+            yield f"            OverrideMaterials(1)=MaterialInstanceConstant'\"/Game/Materials/MI_{i % 17}.MI_{i % 17}\"'"
+        yield '            bVisible=True'
+        yield '         End Object'
+        yield f"         {component_class}={component_class}'\"{component_name}\"'"
+        yield f"         RootComponent={component_class}'\"{component_name}\"'"
+        yield f'         ActorLabel="{actor_type} {i}"'
+        yield '      End Actor'
+    yield '   End Level'
+    yield 'End Map'
+
+
+def generate_custom_bp_lines(num_parts, seed=0):
+    """yields the lines of a CustomBP .T3D with nested parts"""
+    rng = random.Random(seed)
+    part_types = ['CustomBPStaticMeshPart', 'CustomBPSkeletalMeshPart', 'CustomBPParticlePart', 'CustomBPDecalPart', 'CustomBPPointLightPart']
+    yield 'Begin Object Class=/Script/CustomBP.CustomBP Name="CustomBP_Benchmark"'
+    for i in range(num_parts):
+        part_type = part_types[i % len(part_types)]
+        yield f'   Begin Object Class=/Script/CustomBP.{part_type} Name="{part_type}_{i}"'
+        yield '      Begin Object Name="SourceComponent"'
+        yield f"         StaticMesh=StaticMesh'\"/Game/Meshes/SM_{i % 53}.SM_{i % 53}\"'"
+        yield f'         RelativeLocation={format_vector(rng, 1000.0)}'
+        yield f'         RelativeRotation={format_vector(rng, 180.0, ("Pitch", "Yaw", "Roll"))}'
+        yield f'         RelativeScale3D={format_vector(rng, 2.0)}'
+        yield '         bVisible=True'
+        yield '         bHiddenInGame=False'
+        yield '      End Object'
+        yield f'      ObjectName="Part {i}"'
+        yield '   End Object'
+    for i in range(num_parts):
+        part_type = part_types[i % len(part_types)]
+        yield f"   Parts({i})={part_type}'\"{part_type}_{i}\"'"
+    yield 'End Object'
+
+
+def generate_material_lines(num_materials, num_parameters=16, seed=0):
+    """yields the lines of a custom material .T3D with ScalarParameterValues and VectorParameterValues arrays"""
+    rng = random.Random(seed)
+    yield 'Begin Object Class=/Script/CustomMaterial.CustomUnrealMaterial Name="CustomMaterial_Benchmark"'
+    for i in range(num_materials):
+        yield f'   Begin Object Class=/Script/Engine.MaterialInstanceConstant Name="MI_Benchmark_{i}"'
+        yield f"      Parent=Material'\"/Game/Materials/M_Master_{i % 5}.M_Master_{i % 5}\"'"
+        for j in range(num_parameters):
+            yield f'      ScalarParameterValues({j})=(ParameterInfo=(Name="Scalar_{j}"),ParameterValue={rng.random():f},ExpressionGUID=6FFB0BA3420EF56546E55186C885A0{j:02X})'
+        for j in range(num_parameters // 2):
+            yield f'      VectorParameterValues({j})=(ParameterInfo=(Name="Vector_{j}"),ParameterValue=(R={rng.random():f},G={rng.random():f},B={rng.random():f},A=1.000000))'
+        yield '      BasePropertyOverrides=(bOverride_BlendMode=True,BlendMode=BLEND_Masked)'
+        yield '   End Object'
+    yield f"   Parent=MaterialInstanceConstant'\"MI_Benchmark_0\"'"
+    yield 'End Object'
+
+
+def write_corpus_file(filepath, lines, encoding):
+    if os.path.exists(filepath):
+        return filepath
+    temp_filepath = filepath + '.tmp'
+    with open(temp_filepath, 'w', encoding=encoding, newline='\r\n') as f:
+        for line in lines:
+            f.write(line)
+            f.write('\n')
+    os.replace(temp_filepath, filepath)
+    return filepath
+
+
+def generate_corpus(corpus_directory, world_sizes, encodings, seed=0):
+    """generates the corpus files once, returns [(name, filepath)]"""
+    os.makedirs(corpus_directory, exist_ok=True)
+    corpus = []
+    for encoding in encodings:
+        for num_actors in world_sizes:
+            name = f'world_{num_actors}_{encoding}'
+            filepath = os.path.join(corpus_directory, f'{name}.T3D')
+            corpus.append((name, write_corpus_file(filepath, generate_world_lines(num_actors, seed), encoding)))
+        name = f'custom_bp_{encoding}'
+        filepath = os.path.join(corpus_directory, f'{name}.T3D')
+        corpus.append((name, write_corpus_file(filepath, generate_custom_bp_lines(1000, seed), encoding)))
+        name = f'material_{encoding}'
+        filepath = os.path.join(corpus_directory, f'{name}.T3D')
+        corpus.append((name, write_corpus_file(filepath, generate_material_lines(1000, seed=seed), encoding)))
+    return corpus
+
+
+def get_max_rss_bytes():
+    if resource is None:
+        return 0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos reports bytes
+    return max_rss if 'darwin' == sys.platform else max_rss * 1024
+
+
+def measure_seconds(function, repeat):
+    """returns (min seconds, last result)"""
+    best_time = None
+    result = None
+    for i in range(repeat):
+        result = None
+        start_time = time.perf_counter()
+        result = function()
+        elapsed_time = time.perf_counter() - start_time
+        if best_time is None or elapsed_time < best_time:
+            best_time = elapsed_time
+    return (best_time, result)
+
+
+def benchmark_parse(name, filepath, repeat, results):
+    file_size = os.path.getsize(filepath)
+    with open(filepath, 'rb') as f:
+        (encoding, bom_length) = parsing_unreal_text.detect_unreal_text_encoding(f.read(4096))
+    num_lines = sum(1 for line in parsing_unreal_text.iter_unreal_text_lines(filepath))
+
+    (parse_seconds, root) = measure_seconds(lambda: parsing_unreal_text.parser_unreal_text_file(filepath), repeat)
+    results[f'{name}.parse_seconds'] = parse_seconds
+    results[f'{name}.parse_lines_per_second'] = num_lines / parse_seconds
+    results[f'{name}.parse_megabytes_per_second'] = file_size / (1024 * 1024) / parse_seconds
+
+    # peak memory of a single parse, tracemalloc slows down parsing so it is measured separately
+    root = None
+    tracemalloc.start()
+    root = parsing_unreal_text.parser_unreal_text_file(filepath)
+    (current_bytes, peak_bytes) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results[f'{name}.parse_peak_bytes'] = peak_bytes
+    results[f'{name}.tree_bytes'] = current_bytes
+    results[f'{name}.max_rss_bytes'] = get_max_rss_bytes()
+    return root
+
+
+def benchmark_queries(name, root, repeat, results):
+    queries = [
+        ('get_children_by_type', lambda: root.get_children_by_type('Actor', recursive=True)),
+        ('get_children_by_attribute', lambda: root.get_children_by_attribute('Class', '/Script/Engine.StaticMeshActor', recursive=True)),
+        ('get_children_has_attribute', lambda: root.get_children_has_attribute('Archetype', recursive=True)),
+        ('get_children_by_value', lambda: root.get_children_by_value('bVisible', True, recursive=True)),
+        ('get_children_has_value', lambda: root.get_children_has_value('RelativeLocation', recursive=True)),
+        ('select', lambda: list(root.select('Actor > Object[RelativeLocation]'))),
+    ]
+    # the first query of a key builds the index, the next queries use it
+    root.invalidate_index()
+    for (query_name, query) in queries:
+        start_time = time.perf_counter()
+        query()
+        results[f'{name}.query.{query_name}.cold_seconds'] = time.perf_counter() - start_time
+        (warm_seconds, result) = measure_seconds(query, repeat)
+        results[f'{name}.query.{query_name}.warm_seconds'] = warm_seconds
+
+
+def benchmark_serialize(name, root, repeat, results):
+    (debug_text_seconds, text) = measure_seconds(lambda: parsing_unreal_text.UnrealObject_to_Text(root).get_text(), repeat)
+    results[f'{name}.UnrealObject_to_Text_seconds'] = debug_text_seconds
+
+    def write_unreal_text():
+        f = io.StringIO()
+        parsing_unreal_text.UnrealTextWriter(f).write(root)
+        return f
+
+    (write_seconds, f) = measure_seconds(write_unreal_text, repeat)
+    results[f'{name}.UnrealTextWriter_seconds'] = write_seconds
+
+
+def run_benchmark(corpus_directory, world_sizes, encodings, repeat=3, seed=0):
+    results = {}
+    corpus = generate_corpus(corpus_directory, world_sizes, encodings, seed)
+    for (name, filepath) in corpus:
+        print(f'benchmark: {name}', flush=True)
+        root = benchmark_parse(name, filepath, repeat, results)
+        if name.startswith('world_'):
+            benchmark_queries(name, root, repeat, results)
+        benchmark_serialize(name, root, repeat, results)
+        root = None
+    return {
+        'version': benchmark_version,
+        'python': sys.version,
+        'platform': platform.platform(),
+        'world_sizes': world_sizes,
+        'encodings': encodings,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare_results(results, baseline_results, threshold):
+    """returns [(metric, baseline_value, value, ratio)] of the metrics which are worse than the baseline by more than threshold"""
+    regressions = []
+    for (metric, baseline_value) in baseline_results.items():
+        value = results.get(metric)
+        if value is None or not baseline_value:
+            continue
+        # cold query timings are too noisy to compare
+        if '.cold_seconds' in metric or '.max_rss_bytes' in metric:
+            continue
+        if metric.endswith('_seconds') and max(value, baseline_value) < min_compare_seconds:
+            continue
+        if metric.endswith(lower_is_better_suffixes):
+            ratio = value / baseline_value
+        else:
+            ratio = baseline_value / value if value else float('inf')
+        if 1.0 + threshold < ratio:
+            regressions.append((metric, baseline_value, value, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark of parsing_unreal_text')
+    parser.add_argument('--output', default='benchmark_parsing_unreal_text.json', help='json file of the results')
+    parser.add_argument('--baseline', default='', help='json file of the baseline results to compare')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed regression ratio, 0.1 is 10%%')
+    parser.add_argument('--corpus-directory', default=os.path.join(tempfile.gettempdir(), 'benchmark_parsing_unreal_text'))
+    parser.add_argument('--sizes', default=','.join([str(size) for size in default_world_sizes]), help='numbers of actors of the worlds, e.g. 1000,10000,1000000')
+    parser.add_argument('--encodings', default=','.join(default_encodings))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    world_sizes = [int(size) for size in args.sizes.split(',') if size]
+    encodings = [encoding for encoding in args.encodings.split(',') if encoding]
+    benchmark = run_benchmark(args.corpus_directory, world_sizes, encodings, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(benchmark, f, indent=4, sort_keys=True)
+    print(f'results: {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_results(benchmark['results'], baseline['results'], args.threshold)
+        for (metric, baseline_value, value, ratio) in regressions:
+            print(f'REGRESSION: {metric}: {baseline_value:.6g} -> {value:.6g} ({ratio:.2f}x)')
+        if regressions:
+            return 1
+        print(f'no regression over {args.threshold:.0%}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
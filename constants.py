@@ -1,12 +1,35 @@
 default_project_config = {'intermediate_dircetory':''}
 
 default_config = {
+    'unreal_text_cache_max_size': 4 * 1024 * 1024 * 1024,
+    'unreal_text_cache_use_content_hash': False,
+    'unreal_text_parse_workers': 4,
+    'normalize_unreal_text_encoding': True,
+    # compression of the exported .T3D files and file lists by class name, '*' for the other classes: '', 'gzip' or 'lzma'
+    'intermediate_compression': {'*': ''},
+    # store the exported files in Intermediate.pack of the intermediate directory instead of loose files
+    'use_intermediate_pack': False,
+    # number of threads copying the files of export_assets and import_wave
+    'copy_workers': 8,
+    # copy, reflink, hardlink or auto(reflink, copy), see utility.transfer_modes
+    # hardlink: read-only sources are linked, not on windows, the imported assets share the files of the source project
+    'transfer_mode': 'auto',
+    # skip the assets which are not changed since the last export, see export_manifest.json of the intermediate directory
+    'use_export_manifest': True,
+    # spawn only the actors in the region, [min_x, min_y, min_z, max_x, max_y, max_z] or [x, y, z, radius], empty spawns all actors
+    'spawn_region_box': [],
+    'spawn_region_sphere': [],
+    # spawn actors cell by cell on the XY plane
+    'spawn_in_cell_order': True,
+    'spawn_cell_size': 25600.0,
     'ignore_folders': [
         'Content/Developers',
         'Content/UltraDynamicSky',
         'Content/FluidFlux',
         'Content/FluidNinjaLive'
     ],
+    # folders, globs ('Content/*/Temp_*') or regexes ('re:...') which are not ignored even if they are in ignore_folders
+    'include_folders': [],
     'all_class_names': [
         'AnimBlueprint',
         'AnimData',
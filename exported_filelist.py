@@ -0,0 +1,146 @@
+import gzip
+import io
+import json
+import logging
+import lzma
+import os
+from collections import namedtuple
+
+from parsing_unreal_text import detect_unreal_text_compression, iter_unreal_text_bytes
+
+# first line: header, the other lines: one json object per exported file
+exported_filelist_version = 1
+
+# kind) 'copy': .uasset/.umap copied as it is, 'unreal_text': .T3D exported by the unreal text exporter
+exported_file_kinds = ('copy', 'unreal_text')
+
+# dependencies) package names of /Game/ which the asset references, e.g. ('/Game/Materials/MI_Rock',)
+ExportedFileEntry = namedtuple('ExportedFileEntry', ['relative_filepath', 'kind', 'size', 'mtime_ns', 'hash', 'dependencies'], defaults=((),))
+
+
+def read_exported_text(filepath):
+    """returns the text of the file, a gzip/lzma compressed file is decompressed"""
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    if detect_unreal_text_compression(data[:8]):
+        data = b''.join(iter_unreal_text_bytes(data))
+    return data.decode('utf-8')
+
+
+class ExportedFileList:
+    """
+    usage)
+        filelist = ExportedFileList('Intermediate/Export/World.jsonl')
+        if 'Content/Maps/Town.T3D' in filelist:
+            entry = filelist.get('Content/Maps/Town.T3D')
+        for relative_filepath in filelist: ...
+
+    Exported files of a class in export order, loaded once and looked up by the relative filepath.
+    The legacy file list of newline-joined relative filepaths (.txt) is loaded as entries without a state.
+    """
+    def __init__(self, filepath, class_name=''):
+        self.filepath = filepath
+        self.class_name = class_name
+        self.entries = {}
+        self.filepaths = []
+        self.load()
+
+    def __len__(self):
+        return len(self.filepaths)
+
+    def __iter__(self):
+        return iter(self.filepaths)
+
+    def __getitem__(self, index):
+        return self.filepaths[index]
+
+    def __contains__(self, relative_filepath):
+        return relative_filepath in self.entries
+
+    def get(self, relative_filepath, default=None):
+        return self.entries.get(relative_filepath, default)
+
+    def add(self, entry):
+        if entry.relative_filepath not in self.entries:
+            self.filepaths.append(entry.relative_filepath)
+        self.entries[entry.relative_filepath] = entry
+
+    def load(self):
+        try:
+            if not os.path.exists(self.filepath):
+                return False
+            lines = read_exported_text(self.filepath).splitlines()
+            if '.txt' == os.path.splitext(self.filepath)[1].lower():
+                for relative_filepath in lines:
+                    if relative_filepath:
+                        self.add(ExportedFileEntry(relative_filepath, '', None, None, ''))
+                return True
+            header = json.loads(lines[0]) if lines else {}
+            if exported_filelist_version != header.get('version'):
+                logging.info(f'exported file list version is changed: {self.filepath}')
+                return False
+            self.class_name = header.get('class_name', self.class_name)
+            for line in lines[1:]:
+                if line:
+                    item = json.loads(line)
+                    self.add(ExportedFileEntry(item['path'], item.get('kind', ''), item.get('size'), item.get('mtime_ns'), item.get('hash', ''), tuple(item.get('dependencies', ()))))
+            return True
+        except:
+            logging.error(f'failed to load exported file list: {self.filepath}')
+            self.entries = {}
+            self.filepaths = []
+        return False
+
+
+class ExportedFileListWriter:
+    """
+    usage)
+        with ExportedFileListWriter('Intermediate/Export/World.jsonl', 'World', compression='gzip') as writer:
+            writer.write(ExportedFileEntry('Content/Maps/Town.T3D', 'unreal_text', 1024, mtime_ns, ''))
+
+    Writes the entries one line at a time to a temporary file, it replaces the file list when all entries are written.
+    """
+    def __init__(self, filepath, class_name, compression=''):
+        self.filepath = filepath
+        self.temp_filepath = filepath + '.tmp'
+        self.class_name = class_name
+        self.compression = compression
+        self.file = None
+        self.num_entries = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(commit=exc_type is None)
+        return False
+
+    def open(self):
+        dirname = os.path.split(self.filepath)[0]
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        if 'gzip' == self.compression:
+            # mtime=0, the same entries give the same file
+            self.file = io.TextIOWrapper(gzip.GzipFile(self.temp_filepath, mode='wb', mtime=0), encoding='utf-8', newline='\n')
+        elif 'lzma' == self.compression:
+            self.file = lzma.open(self.temp_filepath, 'wt', encoding='utf-8', newline='\n')
+        else:
+            self.file = open(self.temp_filepath, 'w', encoding='utf-8', newline='\n')
+        self.file.write(json.dumps({'version': exported_filelist_version, 'class_name': self.class_name}) + '\n')
+
+    def write(self, entry):
+        item = {'path': entry.relative_filepath, 'kind': entry.kind, 'size': entry.size, 'mtime_ns': entry.mtime_ns, 'hash': entry.hash, 'dependencies': list(entry.dependencies)}
+        self.file.write(json.dumps(item) + '\n')
+        self.num_entries += 1
+
+    def close(self, commit=True):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        if commit:
+            os.replace(self.temp_filepath, self.filepath)
+            logging.info(f'write exported file list: {self.filepath} entries({self.num_entries})')
+        elif os.path.exists(self.temp_filepath):
+            os.remove(self.temp_filepath)
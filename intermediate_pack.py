@@ -0,0 +1,369 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+# data file: magic followed by the contents of the files, appended one after another
+# index file: one json line per added or removed file, the last line of a path wins
+intermediate_pack_magic = b'UEPACK01'
+intermediate_pack_version = 1
+
+IntermediatePackEntry = namedtuple('IntermediatePackEntry', ['path', 'offset', 'length', 'hash', 'mtime'])
+
+
+def normalize_pack_path(relative_path):
+    """usage) 'Content\\Maps\\Town.T3D' -> 'Content/Maps/Town.T3D', paths are case insensitive on windows"""
+    relative_path = relative_path.replace('\\', '/').lstrip('/')
+    if relative_path.startswith('./'):
+        relative_path = relative_path[2:]
+    return relative_path.lower() if 'nt' == os.name else relative_path
+
+
+class IntermediatePack:
+    """
+    usage)
+        pack = IntermediatePack('Intermediate/Intermediate.pack')
+        pack.add_file('Content/Maps/Town.T3D', 'Town.T3D')
+        with pack.open_buffer('Content/Maps/Town.T3D') as buffer: ...
+
+    Append-only archive of the intermediate files, one data file and an index of path -> (offset, length, hash, mtime).
+    Files are read at random through mmap, a replaced or removed file stays in the data file until compact.
+    """
+    def __init__(self, filepath, writable=True):
+        self.filepath = filepath
+        self.index_filepath = filepath + '.index'
+        self.writable = writable
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.mapped_file = None
+        self.mapped_size = 0
+        self.data_file = None
+        self.index_file = None
+        self.open()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, relative_path):
+        return normalize_pack_path(relative_path) in self.entries
+
+    def open(self):
+        is_new = not os.path.exists(self.filepath)
+        if is_new:
+            if not self.writable:
+                raise FileNotFoundError(self.filepath)
+            dirname = os.path.split(self.filepath)[0]
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname)
+            with open(self.filepath, 'wb') as f:
+                f.write(intermediate_pack_magic)
+            with open(self.index_filepath, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'version': intermediate_pack_version}) + '\n')
+
+        self.data_file = open(self.filepath, 'a+b' if self.writable else 'rb')
+        self.data_file.seek(0)
+        if intermediate_pack_magic != self.data_file.read(len(intermediate_pack_magic)):
+            self.data_file.close()
+            raise ValueError(f'not an intermediate pack: {self.filepath}')
+        self.load_index()
+        if self.writable:
+            self.index_file = open(self.index_filepath, 'a', encoding='utf-8')
+
+    def load_index(self):
+        data_size = os.fstat(self.data_file.fileno()).st_size
+        self.entries = {}
+        if not os.path.exists(self.index_filepath):
+            return
+        with open(self.index_filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # the last line of an interrupted write
+                    logging.info(f'broken line of pack index: {self.index_filepath}')
+                    continue
+                if 'version' in item:
+                    if intermediate_pack_version != item['version']:
+                        raise ValueError(f'unsupported pack version: {self.index_filepath}')
+                    continue
+                key = normalize_pack_path(item['path'])
+                if item.get('removed'):
+                    self.entries.pop(key, None)
+                elif item['offset'] + item['length'] <= data_size:
+                    self.entries[key] = IntermediatePackEntry(item['path'], item['offset'], item['length'], item['hash'], item['mtime'])
+
+    def close(self):
+        self.mapped_file = None
+        self.mapped_size = 0
+        if self.index_file is not None:
+            self.index_file.close()
+            self.index_file = None
+        if self.data_file is not None:
+            self.data_file.close()
+            self.data_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def get_entry(self, relative_path):
+        return self.entries.get(normalize_pack_path(relative_path))
+
+    def iter_entries(self):
+        return sorted(self.entries.values(), key=lambda entry: entry.offset)
+
+    def get_garbage_size(self):
+        """bytes of the replaced and removed files in the data file"""
+        data_size = os.fstat(self.data_file.fileno()).st_size
+        return data_size - len(intermediate_pack_magic) - sum([entry.length for entry in self.entries.values()])
+
+    def write_index_line(self, item):
+        self.index_file.write(json.dumps(item) + '\n')
+        self.index_file.flush()
+
+    def add_stream(self, relative_path, f, mtime=None):
+        """appends the content of the binary file object f, the index line is written after the data"""
+        if not self.writable:
+            raise PermissionError(f'read only pack: {self.filepath}')
+        content_hash = hashlib.blake2b(digest_size=16)
+        with self.lock:
+            self.data_file.seek(0, os.SEEK_END)
+            offset = self.data_file.tell()
+            length = 0
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                self.data_file.write(chunk)
+                content_hash.update(chunk)
+                length += len(chunk)
+            self.data_file.flush()
+            entry = IntermediatePackEntry(relative_path.replace('\\', '/'), offset, length, content_hash.hexdigest(), mtime if mtime is not None else time.time_ns())
+            self.write_index_line(entry._asdict())
+            self.entries[normalize_pack_path(relative_path)] = entry
+        return entry
+
+    def add_file(self, relative_path, filepath):
+        with open(filepath, 'rb') as f:
+            return self.add_stream(relative_path, f, os.fstat(f.fileno()).st_mtime_ns)
+
+    def add_bytes(self, relative_path, data, mtime=None):
+        return self.add_stream(relative_path, io.BytesIO(data), mtime)
+
+    def remove(self, relative_path):
+        key = normalize_pack_path(relative_path)
+        with self.lock:
+            if key in self.entries:
+                self.write_index_line({'path': self.entries.pop(key).path, 'removed': True})
+                return True
+        return False
+
+    def get_mapped_file(self, end):
+        """maps the data file again if it has grown since it was mapped"""
+        with self.lock:
+            if self.mapped_file is None or self.mapped_size < end:
+                # old mappings are released when the buffers using them are released
+                self.mapped_file = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.mapped_size = len(self.mapped_file)
+            return self.mapped_file
+
+    @contextlib.contextmanager
+    def open_buffer(self, relative_path):
+        """yields a memoryview of the file in the mapped data file, without copying it"""
+        entry = self.get_entry(relative_path)
+        if entry is None:
+            raise FileNotFoundError(relative_path)
+        if 0 == entry.length:
+            yield memoryview(b'')
+            return
+        mapped_file = self.get_mapped_file(entry.offset + entry.length)
+        buffer = memoryview(mapped_file)[entry.offset:entry.offset + entry.length]
+        try:
+            yield buffer
+        finally:
+            buffer.release()
+
+    def read_bytes(self, relative_path):
+        with self.open_buffer(relative_path) as buffer:
+            return buffer.tobytes()
+
+    def extract(self, relative_path, filepath):
+        """writes the file to filepath, a temporary file replaces the old file, returns the number of bytes"""
+        entry = self.get_entry(relative_path)
+        if entry is None:
+            raise FileNotFoundError(relative_path)
+        dirname = os.path.split(filepath)[0]
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        temp_filepath = filepath + '.extract'
+        with self.open_buffer(relative_path) as buffer:
+            with open(temp_filepath, 'wb') as f:
+                f.write(buffer)
+        os.utime(temp_filepath, ns=(entry.mtime, entry.mtime))
+        if 'nt' == os.name and os.path.exists(filepath):
+            os.chmod(filepath, 0o666)
+        os.replace(temp_filepath, filepath)
+        return entry.length
+
+    def compact(self):
+        """rewrites the pack without the replaced and removed files"""
+        temp_filepath = self.filepath + '.compact'
+        for filepath in [temp_filepath, temp_filepath + '.index']:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        entries = self.iter_entries()
+        with IntermediatePack(temp_filepath) as compact_pack:
+            for entry in entries:
+                with self.open_buffer(entry.path) as buffer:
+                    compact_pack.add_bytes(entry.path, buffer, entry.mtime)
+        self.close()
+        os.replace(temp_filepath, self.filepath)
+        os.replace(temp_filepath + '.index', self.index_filepath)
+        self.open()
+        logging.info(f'compact pack: {self.filepath} files({len(self.entries)})')
+
+
+# directory -> IntermediatePack, files under a mounted directory are read from the pack if there is no loose file
+mounted_packs = {}
+
+
+def mount_pack(directory, pack):
+    mounted_packs[os.path.normcase(os.path.abspath(directory))] = pack
+    logging.info(f'mount pack: {pack.filepath} to {directory} files({len(pack)})')
+
+
+def unmount_pack(directory):
+    return mounted_packs.pop(os.path.normcase(os.path.abspath(directory)), None)
+
+
+def get_mount_table():
+    """returns [(directory, pack_filepath)] to mount the same packs in the worker processes"""
+    return [(directory, pack.filepath) for (directory, pack) in mounted_packs.items()]
+
+
+def mount_packs(mount_table):
+    for (directory, pack_filepath) in mount_table:
+        if os.path.normcase(os.path.abspath(directory)) not in mounted_packs:
+            mount_pack(directory, IntermediatePack(pack_filepath, writable=False))
+
+
+def find_mounted_pack(filepath):
+    """returns (pack, relative_path) of the mounted directory of filepath, or (None, '')"""
+    if mounted_packs:
+        path = os.path.normcase(os.path.abspath(filepath))
+        for (directory, pack) in mounted_packs.items():
+            if path.startswith(directory + os.sep):
+                return (pack, path[len(directory) + 1:])
+    return (None, '')
+
+
+def find_packed_file(filepath):
+    """returns (pack, entry) if filepath is not a loose file but is in a mounted pack, or (None, None)"""
+    (pack, relative_path) = find_mounted_pack(filepath)
+    if pack is not None and not os.path.exists(filepath):
+        entry = pack.get_entry(relative_path)
+        if entry is not None:
+            return (pack, entry)
+    return (None, None)
+
+
+def file_exists(filepath):
+    return os.path.exists(filepath) or find_packed_file(filepath)[0] is not None
+
+
+def get_file_stat(filepath):
+    """returns (size, mtime_ns) of a loose or packed file"""
+    (pack, entry) = find_packed_file(filepath)
+    if pack is not None:
+        return (entry.length, entry.mtime)
+    stat_result = os.stat(filepath)
+    return (stat_result.st_size, stat_result.st_mtime_ns)
+
+
+@contextlib.contextmanager
+def open_file_buffer(filepath):
+    """yields a read-only buffer of a loose file(mmap) or a packed file(memoryview)"""
+    (pack, entry) = find_packed_file(filepath)
+    if pack is not None:
+        with pack.open_buffer(entry.path) as buffer:
+            yield buffer
+        return
+    with open(filepath, 'rb') as f:
+        if 0 == os.fstat(f.fileno()).st_size:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            yield mapped_file
+
+
+def pack_directory(directory, pack_filepath, extensions=None):
+    """packs the loose files of the directory, returns the number of files"""
+    if extensions is not None:
+        extensions = tuple([extension.lower() for extension in extensions])
+    num_files = 0
+    with IntermediatePack(pack_filepath) as pack:
+        for (dirpath, dirnames, filenames) in os.walk(directory):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if extensions is not None and not filename.lower().endswith(extensions):
+                    continue
+                filepath = os.path.join(dirpath, filename)
+                if os.path.abspath(filepath) in (os.path.abspath(pack.filepath), os.path.abspath(pack.index_filepath)):
+                    continue
+                relative_path = os.path.relpath(filepath, directory).replace(os.sep, '/')
+                pack.add_file(relative_path, filepath)
+                num_files += 1
+    logging.info(f'pack_directory: {directory} to {pack_filepath} files({num_files})')
+    return num_files
+
+
+def unpack_directory(pack_filepath, directory):
+    """writes the files of the pack as loose files, returns the number of files"""
+    num_files = 0
+    with IntermediatePack(pack_filepath, writable=False) as pack:
+        for entry in pack.iter_entries():
+            pack.extract(entry.path, os.path.join(directory, entry.path))
+            num_files += 1
+    logging.info(f'unpack_directory: {pack_filepath} to {directory} files({num_files})')
+    return num_files
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description='pack and unpack the loose files of an intermediate directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    pack_parser = subparsers.add_parser('pack', help='pack a directory')
+    pack_parser.add_argument('directory')
+    pack_parser.add_argument('pack_filepath')
+    pack_parser.add_argument('--extensions', default='', help='comma separated, e.g. .uasset,.umap,.T3D, empty packs all files')
+    unpack_parser = subparsers.add_parser('unpack', help='unpack to a directory')
+    unpack_parser.add_argument('pack_filepath')
+    unpack_parser.add_argument('directory')
+    list_parser = subparsers.add_parser('list', help='list the files of a pack')
+    list_parser.add_argument('pack_filepath')
+    compact_parser = subparsers.add_parser('compact', help='remove the replaced files from the data file')
+    compact_parser.add_argument('pack_filepath')
+    args = parser.parse_args()
+
+    if 'pack' == args.command:
+        extensions = [extension for extension in args.extensions.split(',') if extension] or None
+        pack_directory(args.directory, args.pack_filepath, extensions)
+    elif 'unpack' == args.command:
+        unpack_directory(args.pack_filepath, args.directory)
+    elif 'list' == args.command:
+        with IntermediatePack(args.pack_filepath, writable=False) as pack:
+            for entry in pack.iter_entries():
+                print(f'{entry.length:>12} {entry.hash} {entry.path}')
+            print(f'files({len(pack)}), garbage({pack.get_garbage_size()} bytes)')
+    elif 'compact' == args.command:
+        with IntermediatePack(args.pack_filepath) as pack:
+            pack.compact()
+    sys.exit(0)
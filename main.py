@@ -1,3 +1,4 @@
+from collections import namedtuple
 import copy
 import datetime
 import json
@@ -24,9 +25,21 @@ if module_path not in sys.path:
 import constants
 importlib.reload(constants)
 
+import intermediate_pack
+importlib.reload(intermediate_pack)
+
 import parsing_unreal_text
 importlib.reload(parsing_unreal_text)
 
+import actor_transforms
+importlib.reload(actor_transforms)
+
+import unreal_text_cache
+importlib.reload(unreal_text_cache)
+
+import exported_filelist
+importlib.reload(exported_filelist)
+
 import utility
 importlib.reload(utility)
 
@@ -50,6 +63,24 @@ class EngineVersion():
         return self.version
 
 
+class AssetRecord(namedtuple('AssetRecord', ['package_name', 'asset_name', 'class_name', 'relative_base_filepath'])):
+    """
+    Lightweight record of an asset of the registry snapshot, the asset is loaded by its object path on demand.
+    usage) '/Game/Maps/Town' -> relative_base_filepath: 'Content/Maps/Town', get_relative_filepath('.umap'): 'Content/Maps/Town.umap'
+    """
+    __slots__ = ()
+
+    @property
+    def object_path(self):
+        return f'{self.package_name}.{self.asset_name}'
+
+    def get_relative_filepath(self, ext):
+        return self.relative_base_filepath + ext
+
+    def get_asset(self):
+        return unreal.EditorAssetLibrary.load_asset(self.object_path)
+
+
 class UE_Migrate_Tool():
     def __init__(self, migrate_module_name, migrate_module):
         self.is_valid = False
@@ -100,11 +131,18 @@ class UE_Migrate_Tool():
         # intermediate sub dircetories
         self.intermediate_export_dircetory = os.path.join(self.intermediate_dircetory, "Export")
         self.log_dircetory = os.path.join(self.intermediate_dircetory, '.log')
+        self.unreal_text_cache_dircetory = os.path.join(self.intermediate_dircetory, '.cache')
+
+        # replaced hardlinks which can not be removed on windows are moved out of the Content folder, on the volume of the project
+        self.unlinked_dircetory = os.path.join(self.project_dircetory, 'Saved', 'UE_Migrate_Tool', 'Unlinked')
+        utility.set_unlinked_dircetory(self.unlinked_dircetory)
 
         # intermediate files
         self.src_project_info_filepath = os.path.join(self.intermediate_dircetory, "project_info.txt")
         self.dirnames_filepath = os.path.join(self.intermediate_dircetory, 'dirnames.txt')
         self.config_filepath = os.path.join(self.intermediate_dircetory, 'config.ini')
+        self.export_manifest_filepath = os.path.join(self.intermediate_dircetory, 'export_manifest.json')
+        self.intermediate_pack_filepath = os.path.join(self.intermediate_dircetory, 'Intermediate.pack')
 
         # prepare directories
         makedir_list = [self.intermediate_dircetory, self.log_dircetory]
@@ -125,6 +163,26 @@ class UE_Migrate_Tool():
         if not self.load_config_file():
             utility.write_to_file(filepath=self.config_filepath, content=json.dumps(constants.default_config, indent=4))
 
+        # the exported files are stored in one pack file instead of loose files,
+        # files of the intermediate directory are read from the pack if there is no loose file
+        self.intermediate_pack = None
+        if self.get_config_value('use_intermediate_pack') or os.path.exists(self.intermediate_pack_filepath):
+            self.intermediate_pack = intermediate_pack.IntermediatePack(self.intermediate_pack_filepath)
+            intermediate_pack.mount_pack(self.intermediate_dircetory, self.intermediate_pack)
+
+        # registry snapshot, class name -> [AssetRecord], built once per run and shared by all phases
+        self.asset_index = {}
+
+        # exported file lists, class name -> ExportedFileList, loaded once per run and shared by all phases
+        self.exported_filelists = {}
+
+        # parsed unreal text cache
+        self.unreal_text_cache = unreal_text_cache.UnrealTextCache(
+            self.unreal_text_cache_dircetory,
+            max_size=self.get_config_value('unreal_text_cache_max_size'),
+            use_content_hash=self.get_config_value('unreal_text_cache_use_content_hash')
+        )
+
         self.build_gui()
 
         # at last
@@ -137,6 +195,14 @@ class UE_Migrate_Tool():
             return True
         return False
 
+    def get_config_value(self, key):
+        return self.config.get(key, constants.default_config.get(key))
+
+    def get_compression(self, class_name):
+        """returns '', 'gzip' or 'lzma' of the intermediate files of the class"""
+        compressions = self.get_config_value('intermediate_compression') or {}
+        return compressions.get(class_name, compressions.get('*', ''))
+
     def build_gui(self):
         frame = ttk.Frame(self.root, padding=10)
         frame.grid()
@@ -169,34 +235,100 @@ class UE_Migrate_Tool():
         utility.write_to_file(filepath=self.project_config_filepath, content=json.dumps(self.project_config, indent=4))
 
     def get_export_filepath(self, class_name):
+        return os.path.join(self.intermediate_export_dircetory, f'{class_name}.jsonl')
+
+    def get_legacy_export_filepath(self, class_name):
         return os.path.join(self.intermediate_export_dircetory, f'{class_name}.txt')
 
     def get_exported_filelist(self, class_name):
-        filepath_list = []
+        """returns ExportedFileList of the class, the newline-joined list of older exports is read if there is no .jsonl"""
+        if class_name in self.exported_filelists:
+            return self.exported_filelists[class_name]
         import_filepath = self.get_export_filepath(class_name)
-        if os.path.exists(import_filepath):            
-            with open(import_filepath, 'r') as f:
-                filepath_list = f.read().split('\n')
-            logging.info(f'>>> Open {import_filepath}: exported assets({len(filepath_list)})')
+        if not os.path.exists(import_filepath) and os.path.exists(self.get_legacy_export_filepath(class_name)):
+            import_filepath = self.get_legacy_export_filepath(class_name)
+        filelist = exported_filelist.ExportedFileList(import_filepath, class_name)
+        if os.path.exists(import_filepath):
+            logging.info(f'>>> Open {import_filepath}: exported assets({len(filelist)})')
         else:
             logging.info(f'>>> Failed to open {import_filepath}')
-        return filepath_list
+        self.exported_filelists[class_name] = filelist
+        return filelist
+
+    def invalidate_exported_filelist(self, class_name):
+        """the file list is written again, the next get_exported_filelist loads it"""
+        self.exported_filelists.pop(class_name, None)
 
     def log(self, text):
         print(text)
         logging.info(text)
 
-    def get_assets_by_class(self, class_name):
+    def query_asset_registry(self, class_names):
+        """returns [(class_name, asset_data)] of all classes by one registry query"""
         # TODO - unreal engine version wrapper
         assets = []
         if self.engine_version.major == 4:
-            assets = self.asset_registry.get_assets_by_class(unreal.StringLibrary.conv_string_to_name(class_name), False)
+            asset_filter = unreal.ARFilter(class_names=[unreal.StringLibrary.conv_string_to_name(class_name) for class_name in class_names], recursive_classes=False)
+            assets = [(str(asset_data.asset_class), asset_data) for asset_data in self.asset_registry.get_assets(asset_filter)]
         elif self.engine_version.major == 5:
-            assets = self.asset_registry.get_assets_by_class(unreal.TopLevelAssetPath('/Script/Engine', class_name))
+            asset_filter = unreal.ARFilter(class_paths=[unreal.TopLevelAssetPath('/Script/Engine', class_name) for class_name in class_names], recursive_classes=False)
+            assets = [(str(asset_data.asset_class_path.asset_name), asset_data) for asset_data in self.asset_registry.get_assets(asset_filter)]
         else:
-            logging.error(f'not implemented - get_assets_by_class for engine version {self.engine_version}')
+            logging.error(f'not implemented - query_asset_registry for engine version {self.engine_version}')
         return assets
 
+    def get_ignore_matcher(self, ignore_folders=None):
+        """returns utility.IgnoreMatcher of ignore_folders and include_folders of the config, compiled once per run"""
+        if ignore_folders is None:
+            ignore_folders = self.get_config_value('ignore_folders')
+        return utility.get_ignore_matcher(tuple(ignore_folders or ()), tuple(self.get_config_value('include_folders') or ()))
+
+    def build_asset_index(self, class_names, ignore_folders=None):
+        """takes one registry snapshot of the classes, the assets in ignore_folders are filtered out here once"""
+        ignore_matcher = self.get_ignore_matcher(ignore_folders)
+        class_names = sorted(set(class_names))
+        for class_name in class_names:
+            self.asset_index[class_name] = []
+        if not class_names:
+            return
+
+        num_ignored = 0
+        for (class_name, asset_data) in self.query_asset_registry(class_names):
+            if class_name not in self.asset_index or not asset_data.is_valid():
+                continue
+            package_name = str(asset_data.package_name)
+            relative_base_filepath = package_name.replace("/Game/", "Content/", 1) if package_name.startswith('/Game/') else package_name
+            if ignore_matcher.is_ignored(relative_base_filepath + utility.get_asset_ext(class_name)):
+                logging.info(f'ignored: {relative_base_filepath}')
+                num_ignored += 1
+                continue
+            self.asset_index[class_name].append(AssetRecord(package_name, str(asset_data.asset_name), class_name, relative_base_filepath))
+
+        for class_name in class_names:
+            self.asset_index[class_name].sort()
+        num_assets = sum([len(self.asset_index[class_name]) for class_name in class_names])
+        self.log(f'>>> build_asset_index: classes({len(class_names)}), assets({num_assets}), ignored({num_ignored})')
+
+    def get_package_dependencies(self, package_name):
+        """returns the package names of /Game/ which the package references, hard and soft references"""
+        try:
+            dependency_options = unreal.AssetRegistryDependencyOptions(include_soft_package_references=True, include_hard_package_references=True, include_searchable_names=False, include_soft_management_references=False, include_hard_management_references=False)
+            dependencies = self.asset_registry.get_dependencies(unreal.StringLibrary.conv_string_to_name(package_name), dependency_options) or []
+            return tuple(sorted(set(str(dependency) for dependency in dependencies if str(dependency).startswith('/Game/') and str(dependency) != package_name)))
+        except:
+            logging.error(f'failed to get_package_dependencies: {package_name}')
+        return ()
+
+    def invalidate_asset_index(self):
+        """the registry is changed, e.g. by importing, the next query takes a new snapshot"""
+        self.asset_index = {}
+
+    def get_assets_by_class(self, class_name):
+        """returns [AssetRecord] of the snapshot, a class which is not indexed yet is indexed on demand"""
+        if class_name not in self.asset_index:
+            self.build_asset_index([class_name])
+        return self.asset_index[class_name]
+
     def execute(self):
         if not self.is_valid:
             self.destroy()
@@ -217,6 +349,12 @@ class UE_Migrate_Tool():
                 ignore_folders=ignore_folders
             )
 
+            if self.intermediate_pack is not None:
+                intermediate_pack.unmount_pack(self.intermediate_dircetory)
+                self.intermediate_pack.close()
+
+            utility.remove_unlinked_files()
+
             if os.path.exists(self.log_filename):
                 webbrowser.open(self.log_filename)
                 
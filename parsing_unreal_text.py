@@ -1,139 +1,770 @@
+import bisect
+import codecs
+import concurrent.futures
+import contextlib
+import functools
+import gc
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import lzma
 import os
 import re
 import sys
+import time
 import logging
-from collections import OrderedDict
+import multiprocessing
+import weakref
+import zlib
+from array import array
+from collections import deque, namedtuple
+from types import MappingProxyType
 
-re_attribute = re.compile('(.+?)=(.+)')
-re_attribute_array = re.compile('(.+?)\(\d+\)=(.+)')
+import intermediate_pack
+
+re_int_literal = re.compile('[-+]?(?:0|[1-9][0-9]*)')
+re_float_literal = re.compile('[-+]?(?:[0-9]+\.[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?|[-+]?[0-9]+[eE][-+]?[0-9]+')
+re_object_reference = re.compile('[A-Za-z_][A-Za-z0-9_]*\'.+\'')
+
+# compressed intermediate files are detected by the magic number, so compressed and plain files can be mixed
+unreal_text_compressions = {
+    'gzip': b'\x1f\x8b',
+    'lzma': b'\xfd7zXZ\x00'
+}
+unreal_text_compression_extensions = ('.gz', '.xz')
+
+unreal_text_boms = [
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be')
+]
+
+
+# shared empty containers read by the queries instead of allocating the lazy containers of UnrealObject
+empty_mapping = MappingProxyType({})
+empty_sequence = ()
+empty_orders = array('q')
+
+# non-recursive queries scan the children directly up to this number of children
+num_scan_children = 16
+
+# process-wide symbol tables of class paths and object references, all parsed trees share one object per distinct string,
+# keys and type names are interned by sys.intern. references are kept apart because they compare equal to plain strings.
+unreal_text_symbols = {}
+unreal_text_reference_symbols = {}
+missing_value = object()
+
+
+def intern_unreal_symbol(value):
+    symbols = unreal_text_reference_symbols if type(value) is UnrealObjectReference else unreal_text_symbols
+    symbol = symbols.get(value)
+    if symbol is None:
+        symbols[value] = value
+        return value
+    return symbol
+
+
+def find_unreal_symbol(value):
+    """returns the shared object of value if it is in the symbol tables, so comparisons with parsed values are by identity"""
+    if type(value) is UnrealObjectReference:
+        return unreal_text_reference_symbols.get(value, value)
+    if type(value) is str:
+        return unreal_text_symbols.get(value, value)
+    return value
+
+
+def clear_unreal_symbols():
+    unreal_text_symbols.clear()
+    unreal_text_reference_symbols.clear()
 
 
 class UnrealObject:
+    # children, attributes, values and extras are allocated lazily,
+    # the parent is a weak reference so the tree does not make reference cycles.
+    __slots__ = ('_parent', '_children', '_attributes', '_values', '_extras', 'type', 'depth', '_unreal_text_filepath', '_id_map', '_index', '_order', '_order_end', '__weakref__')
+
     def __init__(self, parent=None, depth=0):
-        self.__unreal_text_filepath = ''
-        self.parent = parent
-        self.children = []
-        self.attributes = OrderedDict()
-        self.values = OrderedDict()
-        self.extras = []
+        self._parent = weakref.ref(parent) if parent is not None else None
+        self._children = None
+        self._attributes = None
+        self._values = None
+        self._extras = None
+        self._unreal_text_filepath = ''
+        self._id_map = None
+        self._index = None
+        self._order = 0
+        self._order_end = 0
         self.type = 'Object'
         self.depth = depth
         
-        # register global values
-        self.root = parent.root if parent is not None else self
-        self.global_id_map = parent.global_id_map if parent is not None else {}
-        self.global_id_map[id(self)] = self
-        
     def __str__(self):
         text_object = UnrealObject_to_Text(self)
         return text_object.get_text()
 
+    @property
+    def parent(self):
+        return self._parent() if self._parent is not None else None
+
+    @property
+    def root(self):
+        return self.get_root()
+
+    # the public containers are allocated on the first access and are mutable,
+    # call invalidate_index() after changing children, attributes, values or extras directly,
+    # the queries and get_hash() use the index and its subtree hashes until it is dropped
+    @property
+    def children(self):
+        if self._children is None:
+            self._children = []
+        return self._children
+
+    @property
+    def attributes(self):
+        if self._attributes is None:
+            self._attributes = {}
+        return self._attributes
+
+    @property
+    def values(self):
+        if self._values is None:
+            self._values = {}
+        return self._values
+
+    @property
+    def extras(self):
+        if self._extras is None:
+            self._extras = []
+        return self._extras
+
     def get_unreal_text_filepath(self):
-        return self.__unreal_text_filepath
+        return self._unreal_text_filepath
 
     def set_unreal_text_filepath(self, filepath):
-        self.__unreal_text_filepath = filepath
+        self._unreal_text_filepath = filepath
 
     def is_root(self):
-        return self is self.root
+        return self._parent is None
 
     def get_root(self):
-        return self.root
+        uobject = self
+        parent = uobject.parent
+        while parent is not None:
+            uobject = parent
+            parent = uobject.parent
+        return uobject
     
     def get_parent(self):
         return self.parent
 
+    def iter_uobjects(self):
+        """iterates self and all descendants in depth-first order"""
+        stack = [self]
+        while stack:
+            uobject = stack.pop()
+            yield uobject
+            if uobject._children:
+                stack.extend(reversed(uobject._children))
+
     def get_uobject_by_id(self, object_id):
-        return self.global_id_map.get(object_id, None)        
+        # the id map is built on the first request, weak values keep the tree free of cycles
+        root = self.get_root()
+        if root._id_map is None:
+            root._id_map = weakref.WeakValueDictionary()
+            for uobject in root.iter_uobjects():
+                root._id_map[id(uobject)] = uobject
+        return root._id_map.get(object_id, None)
 
     def add_child(self):
         child = UnrealObject(self, self.depth + 1)
-        self.children.append(child)
+        if self._children is None:
+            self._children = []
+        self._children.append(child)
+        root = self.get_root()
+        root._index = None
+        if root._id_map is not None:
+            root._id_map[id(child)] = child
         return child
 
     def get_child(self, index):
-        return self.children[index] if index < len(self.children) else None
+        return self._children[index] if self._children is not None and index < len(self._children) else None
 
     def get_children(self):
         return self.children
     
-    def get_children_by_attribute(self, key, value, recursive=False, result=None):
-        if result is None:
-            result=[]            
-        for child in self.children:
-            if child.has_attribute(key) and value == child.get_attribute(key):
-                result.append(child)        
-            if recursive:
-                child.get_children_by_attribute(key, value, recursive, result)
+    def get_index(self):
+        """returns the UnrealObjectIndex of the tree, it is built on the first query and dropped when the tree is modified"""
+        root = self.get_root()
+        if root._index is None:
+            root._index = UnrealObjectIndex(root)
+        return root._index
+
+    def invalidate_index(self):
+        self.get_root()._index = None
+
+    def get_hash(self, ignore_keys=None) -> str:
+        """returns the structural hash of the subtree, the hashes of the whole tree are computed once and kept with the index"""
+        return self.get_index().get_subtree_hashes(ignore_keys)[self._order].hex()
+
+    def gather_indexed_children(self, orders, recursive, result, predicate=None):
+        uobjects = self.get_index().uobjects
+        begin = bisect.bisect_right(orders, self._order)
+        end = bisect.bisect_left(orders, self._order_end, begin)
+        child_depth = self.depth + 1
+        for order in orders[begin:end]:
+            uobject = uobjects[order]
+            if (recursive or child_depth == uobject.depth) and (predicate is None or predicate(uobject)):
+                result.append(uobject)
         return result
+
+    def gather_children(self, predicate, recursive, result, get_orders, get_candidate_orders=None):
+        if result is None:
+            result=[]
+        # a few direct children are faster to scan than to look up
+        if not recursive and (self._children is None or len(self._children) <= num_scan_children):
+            for child in self._children or empty_sequence:
+                if predicate(child):
+                    result.append(child)
+            return result
+        index = self.get_index()
+        orders = get_orders(index)
+        if orders is None:
+            # unhashable value, check the candidates one by one
+            return self.gather_indexed_children(get_candidate_orders(index), recursive, result, predicate)
+        return self.gather_indexed_children(orders, recursive, result)
+
+    def get_children_by_attribute(self, key, value, recursive=False, result=None):
+        value = find_unreal_symbol(value)
+
+        def predicate(uobject):
+            # interned values are compared by identity first
+            attribute = uobject._attributes.get(key, missing_value) if uobject._attributes is not None else missing_value
+            return attribute is value or (attribute is not missing_value and value == attribute)
+        return self.gather_children(predicate, recursive, result, lambda index: index.get_orders_by_attribute(key, value), lambda index: index.get_orders_has_attribute(key))
     
     def get_children_has_attribute(self, key, recursive=False, result=None):
-        if result is None:
-            result=[]            
-        for child in self.children:
-            if child.has_attribute(key):
-                result.append(child)        
-            if recursive:
-                child.get_children_has_attribute(key, recursive, result)
-        return result
+        predicate = lambda uobject: uobject.has_attribute(key)
+        return self.gather_children(predicate, recursive, result, lambda index: index.get_orders_has_attribute(key))
     
     def get_children_by_value(self, key, value, recursive=False, result=None):
-        if result is None:
-            result=[]
-        for child in self.children:
-            if child.has_value(key) and value == child.get_value(key):
-                result.append(child)
-            if recursive:
-                child.get_children_by_value(key, value, recursive, result)
-        return result
+        value = find_unreal_symbol(value)
+
+        def predicate(uobject):
+            item = uobject._values.get(key, missing_value) if uobject._values is not None else missing_value
+            return item is value or (item is not missing_value and value == item)
+        return self.gather_children(predicate, recursive, result, lambda index: index.get_orders_by_value(key, value), lambda index: index.get_orders_has_value(key))
     
     def get_children_has_value(self, key, recursive=False, result=None):
-        if result is None:
-            result=[]
-        for child in self.children:
-            if child.has_value(key):
-                result.append(child)
-            if recursive:
-                child.get_children_has_value(key, recursive, result)
-        return result
+        predicate = lambda uobject: uobject.has_value(key)
+        return self.gather_children(predicate, recursive, result, lambda index: index.get_orders_has_value(key))
     
+    def select(self, selector, use_index=None):
+        """
+        usage) for component in uobject.select('Actor > Object[Name="BaseComponent"][RelativeLocation]'): ...
+        yields the descendants which match the selector, see compile_selector
+        """
+        if isinstance(selector, str):
+            selector = compile_selector(selector)
+        return selector.select(self, use_index)
+
+    def select_one(self, selector, use_index=None):
+        return next(self.select(selector, use_index), None)
+
     def get_children_by_type(self, type_name, recursive=False, result=None):
-        if result is None:
-            result=[]
-        for child in self.children:
-            if type_name == child.type:
-                result.append(child)
-            if recursive:
-                child.get_children_by_type(type_name, recursive, result)
-        return result
+        predicate = lambda uobject: type_name == uobject.type
+        return self.gather_children(predicate, recursive, result, lambda index: index.get_orders_by_type(type_name))
     
     def set_type(self, type_name):
         if type_name:
             self.type = type_name
+            self.invalidate_index()
     
     def has_attribute(self, key, default_value=None):
-        return key in self.attributes.keys()
+        return self._attributes is not None and key in self._attributes
     
     def get_attribute(self, key, default_value=None):
-        return self.attributes.get(key, default_value)
+        return self._attributes.get(key, default_value) if self._attributes is not None else default_value
 
     def set_attribute(self, key, value):
-        self.attributes[key] = value
+        self.store_attribute(key, value)
+        self.invalidate_index()
+
+    def store_attribute(self, key, value):
+        """set_attribute without invalidating the index, used while parsing"""
+        if self._attributes is None:
+            self._attributes = {}
+        self._attributes[key] = value
 
     def has_value(self, key, default_value=None):
-        return key in self.values.keys()
+        return self._values is not None and key in self._values
 
     def get_value(self, key, default_value=None):
-        return self.values.get(key, default_value)
+        return self._values.get(key, default_value) if self._values is not None else default_value
 
     def set_value(self, key, value):
-        self.values[key] = value
+        self.store_value(key, value)
+        self.invalidate_index()
+
+    def store_value(self, key, value):
+        """set_value without invalidating the index, used while parsing"""
+        if self._values is None:
+            self._values = {}
+        self._values[key] = value
 
     def add_extra_value(self, value):
-        self.extras.append(value)
+        self.store_extra_value(value)
+        self.invalidate_index()
+
+    def store_extra_value(self, value):
+        """add_extra_value without invalidating the index, used while parsing"""
+        if self._extras is None:
+            self._extras = []
+        self._extras.append(value)
 
     def get_extra_value(self, index):
-        return self.extras[index] if index < len(self.extras) else None
+        return self._extras[index] if self._extras is not None and index < len(self._extras) else None
+
+
+class UnrealObjectIndex:
+    """
+    Secondary indexes of an UnrealObject tree.
+    Objects are numbered in depth-first order, so the descendants of an object are the range [_order + 1, _order_end).
+    Each index maps a key to a sorted array of orders, attribute and value indexes are built per key on the first query.
+    """
+    def __init__(self, root):
+        self.uobjects = []
+        self.by_type = {}
+        self.by_attribute = {}
+        self.has_attribute = {}
+        self.by_value = {}
+        self.has_value = {}
+        self.subtree_hashes = {}
+
+        stack = [(root, False)]
+        while stack:
+            (uobject, is_end) = stack.pop()
+            if is_end:
+                uobject._order_end = len(self.uobjects)
+                continue
+            order = len(self.uobjects)
+            uobject._order = order
+            self.uobjects.append(uobject)
+            orders = self.by_type.get(uobject.type)
+            if orders is None:
+                orders = array('q')
+                self.by_type[uobject.type] = orders
+            orders.append(order)
+            stack.append((uobject, True))
+            if uobject._children:
+                stack.extend([(child, False) for child in reversed(uobject._children)])
+
+    def build_key_index(self, key, is_attribute):
+        has_key = array('q')
+        by_key = {}
+        for (order, uobject) in enumerate(self.uobjects):
+            items = uobject._attributes if is_attribute else uobject._values
+            if items is not None and key in items:
+                has_key.append(order)
+                value = items[key]
+                try:
+                    orders = by_key.get(value)
+                except TypeError:
+                    # unhashable value(array) is only found by has_key
+                    continue
+                if orders is None:
+                    orders = array('q')
+                    by_key[value] = orders
+                orders.append(order)
+        if is_attribute:
+            self.has_attribute[key] = has_key
+            self.by_attribute[key] = by_key
+        else:
+            self.has_value[key] = has_key
+            self.by_value[key] = by_key
+
+    def get_orders_by_type(self, type_name):
+        return self.by_type.get(type_name, empty_orders)
+
+    def get_orders_has_attribute(self, key):
+        if key not in self.has_attribute:
+            self.build_key_index(key, is_attribute=True)
+        return self.has_attribute[key]
+
+    def get_orders_by_attribute(self, key, value):
+        """returns None if the value is not hashable"""
+        if key not in self.by_attribute:
+            self.build_key_index(key, is_attribute=True)
+        try:
+            return self.by_attribute[key].get(value, empty_orders)
+        except TypeError:
+            return None
+
+    def get_orders_has_value(self, key):
+        if key not in self.has_value:
+            self.build_key_index(key, is_attribute=False)
+        return self.has_value[key]
+
+    def get_orders_by_value(self, key, value):
+        """returns None if the value is not hashable"""
+        if key not in self.by_value:
+            self.build_key_index(key, is_attribute=False)
+        try:
+            return self.by_value[key].get(value, empty_orders)
+        except TypeError:
+            return None
+
+    def get_subtree_hashes(self, ignore_keys=None):
+        """returns the subtree digests by order, children are numbered after their parent so they are hashed first"""
+        ignore_keys = unreal_text_volatile_keys if ignore_keys is None else frozenset(ignore_keys)
+        hashes = self.subtree_hashes.get(ignore_keys)
+        if hashes is None:
+            uobjects = self.uobjects
+            hashes = [b''] * len(uobjects)
+            for order in range(len(uobjects) - 1, -1, -1):
+                uobject = uobjects[order]
+                child_digests = [hashes[child._order] for child in uobject._children] if uobject._children else empty_sequence
+                hashes[order] = hash_unreal_object_node(uobject, ignore_keys, child_digests)
+            self.subtree_hashes[ignore_keys] = hashes
+        return hashes
+
+
+# keys left out of structural hashes, e.g. the id=... of UnrealObject_to_Text when its text is parsed back
+unreal_text_volatile_keys = frozenset(['id'])
+UnrealObjectChange = namedtuple('UnrealObjectChange', ['kind', 'old', 'new'])
+
+
+def hash_unreal_object_node(uobject, ignore_keys=unreal_text_volatile_keys, child_digests=None):
+    """
+    Returns the digest of type, attributes, values and extras of uobject followed by the digests of its children.
+    Attributes and values are hashed in key order, extras and children in their order.
+    With child_digests=None only the object itself is hashed.
+    """
+    text_list = [uobject.type]
+    for (tag, items) in (('A', uobject._attributes), ('V', uobject._values)):
+        if items:
+            for key in sorted(items):
+                if key not in ignore_keys:
+                    value = items[key]
+                    text_list.append(f'{tag}{key}={type(value).__name__}:{value!r}')
+    if uobject._extras:
+        text_list.extend([f'E{value!r}' for value in uobject._extras])
+    digest = hashlib.blake2b('\0'.join(text_list).encode('utf-8', 'surrogatepass'), digest_size=16)
+    if child_digests is not None:
+        digest.update(len(child_digests).to_bytes(4, 'little'))
+        for child_digest in child_digests:
+            digest.update(child_digest)
+    return digest.digest()
+
+
+def hash_unreal_object(uobject, ignore_keys=None) -> str:
+    """
+    usage) on_end_object=lambda uobject: hashes.append(hash_unreal_object(uobject))
+    Hashes a subtree without building the index of its tree, e.g. while parsing, where the tree is still growing.
+    """
+    ignore_keys = unreal_text_volatile_keys if ignore_keys is None else frozenset(ignore_keys)
+    digests = {}
+    stack = [(uobject, False)]
+    while stack:
+        (current, is_end) = stack.pop()
+        if is_end:
+            child_digests = [digests.pop(id(child)) for child in current._children or empty_sequence]
+            digests[id(current)] = hash_unreal_object_node(current, ignore_keys, child_digests)
+            continue
+        stack.append((current, True))
+        if current._children:
+            stack.extend([(child, False) for child in current._children])
+    return digests[id(uobject)].hex()
+
+
+def group_unreal_objects_by_hash(uobjects, ignore_keys=None):
+    """usage) duplicates = [group for group in group_unreal_objects_by_hash(materials, ['Name']).values() if 1 < len(group)]"""
+    groups = {}
+    for uobject in uobjects:
+        groups.setdefault(uobject.get_hash(ignore_keys), []).append(uobject)
+    return groups
+
+
+def get_unreal_object_match_keys(children):
+    # children are matched by type and Name, repeated keys by their occurrence
+    match_keys = []
+    occurrences = {}
+    for child in children:
+        key = (child.type, child.get_attribute('Name', ''))
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        match_keys.append((key, occurrence))
+    return match_keys
+
+
+def diff_unreal_objects(old_uobject, new_uobject, ignore_keys=None, max_depth=None):
+    """
+    usage) for change in diff_unreal_objects(old_root, new_root, max_depth=1): print(change.kind, (change.new or change.old).get_attribute('Name'))
+    Compares two trees by subtree hashes and returns the changed subtrees as UnrealObjectChange(kind, old, new),
+    kind is 'added', 'removed' or 'changed'. Equal subtrees are skipped without comparing them,
+    a subtree is reported as changed when the object itself differs or at max_depth below the given objects.
+    """
+    old_hashes = old_uobject.get_index().get_subtree_hashes(ignore_keys)
+    new_hashes = new_uobject.get_index().get_subtree_hashes(ignore_keys)
+    node_ignore_keys = unreal_text_volatile_keys if ignore_keys is None else frozenset(ignore_keys)
+    changes = []
+    stack = [(old_uobject, new_uobject)]
+    while stack:
+        (old, new) = stack.pop()
+        if old_hashes[old._order] == new_hashes[new._order]:
+            continue
+        if (max_depth is not None and max_depth <= new.depth - new_uobject.depth) or \
+                hash_unreal_object_node(old, node_ignore_keys) != hash_unreal_object_node(new, node_ignore_keys):
+            changes.append(UnrealObjectChange('changed', old, new))
+            continue
+
+        (old_children, new_children) = (old._children or empty_sequence, new._children or empty_sequence)
+        new_children = dict(zip(get_unreal_object_match_keys(new_children), new_children))
+        pairs = []
+        for (match_key, old_child) in zip(get_unreal_object_match_keys(old_children), old_children):
+            new_child = new_children.pop(match_key, None)
+            if new_child is None:
+                changes.append(UnrealObjectChange('removed', old_child, None))
+            else:
+                pairs.append((old_child, new_child))
+        changes.extend([UnrealObjectChange('added', None, new_child) for new_child in new_children.values()])
+        stack.extend(reversed(pairs))
+    return changes
+
+
+# selector combinators: ' ' descendant, '>' child
+re_selector_name = re.compile('[A-Za-z_][A-Za-z0-9_]*|\*')
+re_selector_key = re.compile('[A-Za-z_][A-Za-z0-9_]*')
+re_selector_operator = re.compile('=|!=|\^=|\$=|\*=')
+
+
+class UnrealSelectorStep(namedtuple('UnrealSelectorStep', ['combinator', 'type_name', 'conditions'])):
+    """one compound selector, conditions are (key, operator, value) and key is matched in the attributes or the values"""
+    def test(self, uobject):
+        if self.type_name is not None and self.type_name != uobject.type:
+            return False
+        for (key, operator, value) in self.conditions:
+            if not test_selector_condition(uobject._attributes, key, operator, value) and not test_selector_condition(uobject._values, key, operator, value):
+                return False
+        return True
+
+
+def test_selector_condition(items, key, operator, value):
+    if items is None or key not in items:
+        return False
+    if operator is None:
+        return True
+    item = items[key]
+    if '=' == operator:
+        return value == item
+    elif '!=' == operator:
+        return value != item
+    # string operators
+    item = str(item)
+    if '^=' == operator:
+        return item.startswith(value)
+    elif '$=' == operator:
+        return item.endswith(value)
+    return value in item
+
+
+class UnrealSelector:
+    """
+    usage) for uobject in compile_selector('Actor[Class="/Script/Engine.StaticMeshActor"] > Object[Name="BaseComponent"][RelativeLocation]').select(root): ...
+    A compiled selector, objects are matched from the last step to the first step through the parents.
+    """
+    def __init__(self, selector_text, steps):
+        self.selector_text = selector_text
+        self.steps = steps
+
+    def __str__(self):
+        return self.selector_text
+
+    def match(self, uobject, scope=None):
+        """returns True if uobject matches the selector, the first step has to be a descendant of scope"""
+        return self.steps[-1].test(uobject) and self.match_ancestors(uobject, len(self.steps) - 1, scope)
+
+    def match_ancestors(self, uobject, step_index, scope):
+        combinator = self.steps[step_index].combinator
+        ancestor = uobject.parent
+        if 0 == step_index:
+            if '>' == combinator:
+                return ancestor is scope
+            if scope is None:
+                return True
+            while ancestor is not None and ancestor is not scope:
+                ancestor = ancestor.parent
+            return ancestor is scope
+        step = self.steps[step_index - 1]
+        while ancestor is not None and ancestor is not scope:
+            if step.test(ancestor) and self.match_ancestors(ancestor, step_index - 1, scope):
+                return True
+            if '>' == combinator:
+                return False
+            ancestor = ancestor.parent
+        return False
+
+    def select(self, scope, use_index=None):
+        """
+        yields the descendants of scope which match the selector in depth-first order.
+        use_index: None uses the index of the tree if it is already built, True builds it.
+        """
+        root = scope.get_root()
+        if use_index or (use_index is None and root._index is not None):
+            return self.select_indexed(scope, scope.get_index())
+        return self.select_scan(scope)
+
+    def select_scan(self, scope):
+        # the children of scope are enough for a single child step
+        if 1 == len(self.steps) and '>' == self.steps[0].combinator:
+            step = self.steps[0]
+            for child in scope._children or empty_sequence:
+                if step.test(child):
+                    yield child
+            return
+        uobjects = scope.iter_uobjects()
+        next(uobjects)
+        for uobject in uobjects:
+            if self.match(uobject, scope):
+                yield uobject
+
+    def select_indexed(self, scope, index):
+        orders = self.get_candidate_orders(index)
+        uobjects = index.uobjects
+        begin = bisect.bisect_right(orders, scope._order)
+        end = bisect.bisect_left(orders, scope._order_end, begin)
+        for i in range(begin, end):
+            uobject = uobjects[orders[i]]
+            if self.match(uobject, scope):
+                yield uobject
+
+    def get_candidate_orders(self, index):
+        """returns the smallest sorted orders which contains all matches of the last step"""
+        step = self.steps[-1]
+        candidates = []
+        if step.type_name is not None:
+            candidates.append(index.get_orders_by_type(step.type_name))
+        for (key, operator, value) in step.conditions:
+            if '=' == operator:
+                attribute_orders = index.get_orders_by_attribute(key, value)
+                value_orders = index.get_orders_by_value(key, value)
+                if attribute_orders is not None and value_orders is not None:
+                    candidates.append(merge_orders(attribute_orders, value_orders))
+                    continue
+            candidates.append(merge_orders(index.get_orders_has_attribute(key), index.get_orders_has_value(key)))
+        if not candidates:
+            return range(len(index.uobjects))
+        return min(candidates, key=len)
+
+
+def merge_orders(orders_a, orders_b):
+    if not orders_a:
+        return orders_b
+    if not orders_b:
+        return orders_a
+    orders = array('q')
+    last_order = -1
+    for order in heapq.merge(orders_a, orders_b):
+        if order != last_order:
+            orders.append(order)
+            last_order = order
+    return orders
+
+
+def parse_selector_value(selector_text, pos):
+    """returns (value, end_pos), a quoted value is a string and the other values are decoded as unreal text literals"""
+    if pos < len(selector_text) and '"' == selector_text[pos]:
+        end = pos + 1
+        while end < len(selector_text) and '"' != selector_text[end]:
+            end += 2 if '\\' == selector_text[end] else 1
+        value_string = selector_text[pos:end + 1]
+        return (decode_unreal_quoted_string(value_string), end + 1)
+    # bare value ends at ']' outside of parentheses and quotes
+    end = pos
+    depth = 0
+    is_quoted = False
+    while end < len(selector_text):
+        c = selector_text[end]
+        if '"' == c:
+            is_quoted = not is_quoted
+        elif not is_quoted:
+            if '(' == c:
+                depth += 1
+            elif ')' == c:
+                depth -= 1
+            elif ']' == c and 0 == depth:
+                break
+        end += 1
+    return (decode_unreal_literal(selector_text[pos:end].strip()), end)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_selector(selector_text) -> UnrealSelector:
+    """
+    usage) compile_selector('Actor[Class="/Script/Engine.StaticMeshActor"] > Object[Name="BaseComponent"][RelativeLocation]')
+        Type or *: object type(Actor, Object, ...), can be omitted
+        [Key]: has the attribute or the value
+        [Key=Value], [Key!=Value]: compares with the decoded value, "..." is a string
+        [Key^=Text], [Key$=Text], [Key*=Text]: starts with, ends with, contains the text
+        A B: B is a descendant of A, A > B: B is a child of A, '> B' at first: B is a child of the scope
+    raises ValueError on a syntax error
+    """
+    steps = []
+    pos = 0
+    length = len(selector_text)
+    combinator = ' '
+    while True:
+        # combinator
+        start = pos
+        while pos < length and selector_text[pos].isspace():
+            pos += 1
+        if pos < length and '>' == selector_text[pos]:
+            combinator = '>'
+            pos += 1
+            while pos < length and selector_text[pos].isspace():
+                pos += 1
+        if length <= pos:
+            if steps and ' ' == combinator:
+                break
+            raise ValueError(f'selector ends without an object: {selector_text}')
+        if steps and start == pos:
+            raise ValueError(f'expected a combinator at {pos}: {selector_text}')
+
+        # type
+        type_name = None
+        m_name = re_selector_name.match(selector_text, pos)
+        if m_name is not None:
+            type_name = None if '*' == m_name.group() else m_name.group()
+            pos = m_name.end()
+
+        # conditions
+        conditions = []
+        while pos < length and '[' == selector_text[pos]:
+            m_key = re_selector_key.match(selector_text, pos + 1)
+            if m_key is None:
+                raise ValueError(f'expected a key at {pos + 1}: {selector_text}')
+            key = m_key.group()
+            pos = m_key.end()
+            operator = None
+            value = None
+            m_operator = re_selector_operator.match(selector_text, pos)
+            if m_operator is not None:
+                operator = m_operator.group()
+                (value, pos) = parse_selector_value(selector_text, m_operator.end())
+                if '=' != operator and '!=' != operator:
+                    value = str(value)
+            if length <= pos or ']' != selector_text[pos]:
+                raise ValueError(f'expected ] at {pos}: {selector_text}')
+            pos += 1
+            conditions.append((key, operator, value))
+
+        if m_name is None and not conditions:
+            raise ValueError(f'expected an object at {pos}: {selector_text}')
+        steps.append(UnrealSelectorStep(combinator, type_name, tuple(conditions)))
+        combinator = ' '
+        if length <= pos:
+            break
+    return UnrealSelector(selector_text, steps)
 
 
 class UnrealObject_to_Text:
@@ -149,11 +780,11 @@ class UnrealObject_to_Text:
             
         gather_text_list = [
             f'{self.get_header_text(uobject, index, depth)}',
-            self.text_adjust_tab(f'Attributes({len(uobject.attributes)}):', depth + 1),
+            self.text_adjust_tab(f'Attributes({len(uobject._attributes or empty_mapping)}):', depth + 1),
             f'{self.get_attributes_text(uobject, depth + 2)}',
-            self.text_adjust_tab(f'Values({len(uobject.values)}):', depth + 1),
+            self.text_adjust_tab(f'Values({len(uobject._values or empty_mapping)}):', depth + 1),
             f'{self.get_values_text(uobject, depth + 2)}',
-            self.text_adjust_tab(f'Extras({len(uobject.extras)}):', depth + 1),
+            self.text_adjust_tab(f'Extras({len(uobject._extras or empty_sequence)}):', depth + 1),
             f'{self.get_extras_text(uobject, depth + 2)}'            
         ]
         
@@ -161,7 +792,7 @@ class UnrealObject_to_Text:
         text = '\n'.join(gather_text_list)
         text_list.append(text)
         
-        for (child_index, child) in enumerate(uobject.children):
+        for (child_index, child) in enumerate(uobject._children or empty_sequence):
             self.gather_text(child, child_index, depth + 1, text_list)
 
         end_text = self.text_adjust_tab(f'End {uobject.type}', depth)
@@ -195,17 +826,17 @@ class UnrealObject_to_Text:
             f'id={id(uobject)}',
             f'index={index}',
             f'depth={uobject.depth}',
-            f'children={len(uobject.children)}'
+            f'children={len(uobject._children or empty_sequence)}'
         ]
         return self.text_adjust_tab_and_space(text_list, depth)
         
     def get_attributes_text(self, uobject, depth=0):
-        text_list = [f'{key}={value}' for (key, value) in uobject.attributes.items()]
+        text_list = [f'{key}={value}' for (key, value) in (uobject._attributes or empty_mapping).items()]
         return self.text_adjust_tab_and_line(text_list, depth)
 
     def get_values_text(self, uobject, depth=0):
         text_list = []
-        for (key, value) in uobject.values.items():
+        for (key, value) in (uobject._values or empty_mapping).items():
             if type(value) is list:
                 if value:
                     text_list.append(f'{key}({len(value)}):')
@@ -216,110 +847,1033 @@ class UnrealObject_to_Text:
         return self.text_adjust_tab_and_line(text_list, depth)
 
     def get_extras_text(self, uobject, depth=0):
-        text_list = [f'{value}' for value in uobject.extras]
+        text_list = [f'{value}' for value in uobject._extras or empty_sequence]
         return self.text_adjust_tab_and_line(text_list, depth)
 
 
+def detect_unreal_text_encoding(head_bytes):
+    """returns (encoding, bom_length) by byte order mark, or by the position of zero bytes of ascii characters"""
+    for (bom, encoding) in unreal_text_boms:
+        if head_bytes.startswith(bom):
+            return (encoding, len(bom))
+    if 2 <= len(head_bytes):
+        num_even_zeros = head_bytes[0::2].count(0)
+        num_odd_zeros = head_bytes[1::2].count(0)
+        num_chars = len(head_bytes) // 2
+        if num_chars // 2 < num_odd_zeros and num_even_zeros == 0:
+            return ('utf-16-le', 0)
+        if num_chars // 2 < num_even_zeros and num_odd_zeros == 0:
+            return ('utf-16-be', 0)
+    return ('utf-8', 0)
+
+
+def detect_unreal_text_compression(head_bytes):
+    """returns 'gzip', 'lzma' or '' by the magic number"""
+    for (compression, magic) in unreal_text_compressions.items():
+        if bytes(head_bytes[:len(magic)]) == magic:
+            return compression
+    return ''
+
+
+def make_unreal_text_decompressor(compression):
+    return zlib.decompressobj(wbits=31) if 'gzip' == compression else lzma.LZMADecompressor()
+
+
+def iter_unreal_text_bytes(buffer, chunk_size=1024 * 1024):
+    """yields the bytes of a buffer chunk by chunk, a compressed buffer is decompressed on the fly"""
+    compression = detect_unreal_text_compression(buffer[:8])
+    if not compression:
+        for offset in range(0, len(buffer), chunk_size):
+            yield buffer[offset:offset + chunk_size]
+        return
+
+    # text is compressed about 10-20 times, smaller input chunks keep the output chunks small
+    decompressor = make_unreal_text_decompressor(compression)
+    input_chunk_size = max(chunk_size // 16, 4096)
+    for offset in range(0, len(buffer), input_chunk_size):
+        data = buffer[offset:offset + input_chunk_size]
+        while data:
+            output = decompressor.decompress(data)
+            if output:
+                yield output
+            # concatenated streams
+            data = decompressor.unused_data if decompressor.eof else b''
+            if data:
+                decompressor = make_unreal_text_decompressor(compression)
+    if 'gzip' == compression:
+        output = decompressor.flush()
+        if output:
+            yield output
+
+
+@contextlib.contextmanager
+def open_unreal_text_buffer(intermediate_filepath):
+    """yields the mapped file, or the decompressed bytes of a compressed file, offsets of the block index refer to this buffer"""
+    with intermediate_pack.open_file_buffer(intermediate_filepath) as buffer:
+        if detect_unreal_text_compression(buffer[:8]):
+            yield b''.join(iter_unreal_text_bytes(buffer))
+        else:
+            yield buffer
+
+
 def load_unreal_text(intermediate_filepath):
     logging.info(f'load_unreal_text: {intermediate_filepath}')
     # read .t3d file
     unreal_text = ""
-    encodings = ['utf-8', 'utf-16']
-    for encoding in encodings:
-        try:
-             with open(intermediate_filepath, encoding=encoding) as f:
-                unreal_text = f.read()
-                break
-        except:
-            logging.info(f'failed to read: file:{intermediate_filepath}, encoding:{encoding}')
-    else:
-        logging.info(f'not found encoding: file:{intermediate_filepath}')
+    try:
+        unreal_text = ''.join(iter_unreal_text_chunks(intermediate_filepath))
+    except:
+        logging.info(f'failed to read: file:{intermediate_filepath}')
     return unreal_text
 
 
-def evaluate_string(value_string):
-    value = value_string
+def iter_unreal_text_chunks(intermediate_filepath, chunk_size=1024 * 1024):
+    """decodes a memory mapped file chunk by chunk, the whole file is never copied into a python string"""
+    with intermediate_pack.open_file_buffer(intermediate_filepath) as mapped_file:
+        decoder = None
+        head = b''
+        for data in iter_unreal_text_bytes(mapped_file, chunk_size):
+            if decoder is None:
+                # the encoding is detected from the head of the decompressed bytes
+                head += bytes(data)
+                if len(head) < 4096:
+                    continue
+                (encoding, bom_length) = detect_unreal_text_encoding(head[:4096])
+                decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+                yield decoder.decode(head[bom_length:])
+                continue
+            yield decoder.decode(data)
+        if decoder is None:
+            if not head:
+                return
+            (encoding, bom_length) = detect_unreal_text_encoding(head[:4096])
+            decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            yield decoder.decode(head[bom_length:])
+        yield decoder.decode(b'', final=True)
+
+
+def iter_unreal_text_lines(intermediate_filepath):
+    """usage) for line in iter_unreal_text_lines('World.T3D'): ... - reads line by line without loading the whole file"""
+    logging.info(f'iter_unreal_text_lines: {intermediate_filepath}')
+    remainder = ''
+    for text in iter_unreal_text_chunks(intermediate_filepath):
+        lines = (remainder + text).split('\n')
+        remainder = lines.pop()
+        yield from lines
+    if remainder:
+        yield remainder
+
+
+def convert_unreal_text_to_utf8(intermediate_filepath):
+    """rewrites an utf-16 or utf-8 with bom .T3D file as utf-8, returns True if the file was converted"""
+    with open(intermediate_filepath, 'rb') as f:
+        head_bytes = f.read(4096)
+    if detect_unreal_text_compression(head_bytes):
+        return False
+    (encoding, bom_length) = detect_unreal_text_encoding(head_bytes)
+    if 'utf-8' == encoding and 0 == bom_length:
+        return False
+
+    temp_filepath = intermediate_filepath + '.tmp'
     try:
-        value = eval(value)
+        with open(temp_filepath, 'w', encoding='utf-8', newline='') as f:
+            for text in iter_unreal_text_chunks(intermediate_filepath):
+                f.write(text)
+        os.replace(temp_filepath, intermediate_filepath)
     except:
-        pass
-    return value
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        raise
+    logging.info(f'convert_unreal_text_to_utf8: {intermediate_filepath} ({encoding})')
+    return True
 
 
-def parse_attribute(uobject, attribute_string, is_attribute) -> bool:
-    # element of array
-    m_attribute_array = re_attribute_array.match(attribute_string)
-    if m_attribute_array is not None:
-        (key, value) = m_attribute_array.groups()  
-        value = evaluate_string(value)        
-        attribute_array = uobject.get_attribute(key, []) if is_attribute else uobject.get_value(key, [])
-        attribute_array.append(value)
-        if is_attribute:
-            uobject.set_attribute(key, attribute_array)
+def compress_unreal_text_file(intermediate_filepath, compression, level=6):
+    """compresses a file in place by 'gzip' or 'lzma', returns True if the file was compressed"""
+    if compression not in unreal_text_compressions:
+        raise ValueError(f'unknown compression: {compression}')
+    with open(intermediate_filepath, 'rb') as f:
+        if detect_unreal_text_compression(f.read(8)):
+            return False
+
+    temp_filepath = intermediate_filepath + '.tmp'
+    try:
+        with open(intermediate_filepath, 'rb') as src_file, open(temp_filepath, 'wb') as dst_file:
+            if 'gzip' == compression:
+                # no file name and time in the header, the same text is compressed to the same bytes
+                compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            else:
+                compressor = lzma.LZMACompressor(preset=level)
+            for chunk in iter(lambda: src_file.read(1024 * 1024), b''):
+                dst_file.write(compressor.compress(chunk))
+            dst_file.write(compressor.flush())
+        os.replace(temp_filepath, intermediate_filepath)
+    except:
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        raise
+    logging.info(f'compress_unreal_text_file: {intermediate_filepath} ({compression})')
+    return True
+
+
+class UnrealVector(namedtuple('UnrealVector', ['x', 'y', 'z'])):
+    """usage) (X=1.000000,Y=2.000000,Z=3.000000) -> UnrealVector(x=1.0, y=2.0, z=3.0)"""
+    __slots__ = ()
+
+    def __str__(self):
+        return f'(X={self.x:f},Y={self.y:f},Z={self.z:f})'
+
+
+class UnrealRotator(namedtuple('UnrealRotator', ['pitch', 'yaw', 'roll'])):
+    """usage) (Pitch=0.000000,Yaw=90.000000,Roll=0.000000) -> UnrealRotator(pitch=0.0, yaw=90.0, roll=0.0)"""
+    __slots__ = ()
+
+    def __str__(self):
+        return f'(Pitch={self.pitch:f},Yaw={self.yaw:f},Roll={self.roll:f})'
+
+
+class UnrealColor(namedtuple('UnrealColor', ['r', 'g', 'b', 'a'])):
+    """usage) (B=255,G=128,R=0,A=255) -> UnrealColor(r=0, g=128, b=255, a=255)"""
+    __slots__ = ()
+
+    def __str__(self):
+        # integer components are FColor(BGRA), float components are FLinearColor(RGBA)
+        if all(type(component) is int for component in self):
+            return f'(B={self.b},G={self.g},R={self.r},A={self.a})'
+        return f'(R={self.r:f},G={self.g:f},B={self.b:f},A={self.a:f})'
+
+
+class UnrealObjectReference(str):
+    """usage) StaticMesh'"/Game/Meshes/SM_Box.SM_Box"' -> class_name: 'StaticMesh', object_path: '/Game/Meshes/SM_Box.SM_Box'"""
+    __slots__ = ()
+
+    @property
+    def class_name(self):
+        return self[:self.find("'")]
+
+    @property
+    def object_path(self):
+        return self[self.find("'") + 1:-1].strip('"')
+
+    @property
+    def asset_path(self):
+        return self.object_path.split('.')[0]
+
+
+# struct keys -> (record type, field order of the record)
+unreal_struct_types = {
+    frozenset(['X', 'Y', 'Z']): (UnrealVector, ('X', 'Y', 'Z')),
+    frozenset(['Pitch', 'Yaw', 'Roll']): (UnrealRotator, ('Pitch', 'Yaw', 'Roll')),
+    frozenset(['R', 'G', 'B', 'A']): (UnrealColor, ('R', 'G', 'B', 'A')),
+}
+
+
+def decode_unreal_number(value_string):
+    if re_int_literal.fullmatch(value_string) is not None:
+        return int(value_string)
+    if re_float_literal.fullmatch(value_string) is not None:
+        return float(value_string)
+    return None
+
+
+def decode_unreal_quoted_string(value_string):
+    content = value_string[1:-1]
+    if '\\' not in content:
+        return content if '"' not in content else value_string
+    # unescape \" and \\
+    chars = []
+    is_escaped = False
+    for c in content:
+        if is_escaped:
+            chars.append(c)
+            is_escaped = False
+        elif '\\' == c:
+            is_escaped = True
+        elif '"' == c:
+            return value_string
         else:
-            uobject.set_value(key, attribute_array)
+            chars.append(c)
+    return ''.join(chars)
+
+
+def decode_unreal_struct(value_string):
+    content = value_string[1:-1]
+    # nested structs and quoted names are kept as string
+    if not content or '(' in content or '"' in content:
+        return value_string
+    members = {}
+    for member in content.split(','):
+        (key, sep, member_value) = member.partition('=')
+        if not sep:
+            return value_string
+        number = decode_unreal_number(member_value)
+        if number is None:
+            return value_string
+        members[key] = number
+    struct_type = unreal_struct_types.get(frozenset(members.keys()))
+    if struct_type is None or len(members) != len(struct_type[1]):
+        return value_string
+    (record_type, keys) = struct_type
+    if record_type is UnrealColor:
+        return record_type(*[members[key] for key in keys])
+    return record_type(*[float(members[key]) for key in keys])
+
+
+@functools.lru_cache(maxsize=65536)
+def decode_unreal_literal(value_string):
+    """
+    Decodes a property literal of unreal text into a typed value, the original string is returned if unknown.
+        1 -> 1, 0.5 -> 0.5, True -> True, "Name" -> 'Name',
+        (X=1.0,Y=2.0,Z=3.0) -> UnrealVector, (Pitch=..,Yaw=..,Roll=..) -> UnrealRotator, (R=..,G=..,B=..,A=..) -> UnrealColor,
+        Class'"/Game/Path.Name"' -> UnrealObjectReference
+    """
+    if not value_string:
+        return value_string
+
+    head = value_string[0]
+    if '"' == head:
+        if 1 < len(value_string) and '"' == value_string[-1]:
+            return decode_unreal_quoted_string(value_string)
+        return value_string
+
+    if '(' == head:
+        if ')' == value_string[-1]:
+            return decode_unreal_struct(value_string)
+        return value_string
+
+    if head in '+-.0123456789':
+        number = decode_unreal_number(value_string)
+        return value_string if number is None else number
+
+    if 'True' == value_string:
         return True
-        
-    # single value
-    m_attribute = re_attribute.match(attribute_string)
-    if m_attribute is not None:        
-        (key, value) = m_attribute.groups()
-        value = evaluate_string(value)
-        if is_attribute:
-            uobject.set_attribute(key, value)
+    elif 'False' == value_string:
+        return False
+    elif 'None' == value_string:
+        return None
+
+    if "'" == value_string[-1] and re_object_reference.fullmatch(value_string) is not None:
+        return UnrealObjectReference(value_string)
+    return value_string
+
+
+def split_unreal_text_header(content):
+    """
+    splits a 'Begin' line at the spaces outside of quotes and parentheses,
+        Begin Object Name="Foo Bar" -> ['Begin', 'Object', 'Name="Foo Bar"']
+    """
+    if '"' not in content and '(' not in content:
+        return content.split()
+    tokens = []
+    pending = None
+    for piece in content.split(' '):
+        if pending is None:
+            if not piece:
+                continue
+            token = piece
         else:
-            uobject.set_value(key, value)
-        return True
+            token = pending + ' ' + piece
+        # a token is complete when its quotes and parentheses are closed
+        if 0 == (token.count('"') - token.count('\\"')) % 2 and token.count('(') <= token.count(')'):
+            tokens.append(token)
+            pending = None
+        else:
+            pending = token
+    if pending is not None:
+        tokens.append(pending)
+    return tokens
 
-    # extra - values
-    uobject.add_extra_value(attribute_string)
-    return False
-    
 
-def parser_unreal_text(unreal_text) -> UnrealObject:
-    contents = unreal_text.split('\n')
-    logging.info(f'parser_unreal_text: {len(contents)} lines')
-    uobject = None    
-    for content in contents:
+def split_unreal_text_property(content):
+    """
+    splits 'Key=Value' or 'Key(0)=Value' in a single scan, returns (key, value_string, is_array) or None.
+    The key is interned, a line without an identifier key is not a property, e.g. 'CustomProperties Pin (...)'
+    """
+    separator = content.find('=')
+    if separator < 1 or separator + 1 == len(content):
+        return None
+    key = content[:separator]
+    is_array = False
+    if ')' == key[-1]:
+        bracket = key.find('(')
+        if bracket < 1 or not key[bracket + 1:-1].isdigit():
+            return None
+        key = key[:bracket]
+        is_array = True
+    if not key.isidentifier():
+        return None
+    return (sys.intern(key), content[separator + 1:], is_array)
+
+
+def parse_attribute(uobject, attribute_string, is_attribute, on_attribute=None) -> bool:
+    token = split_unreal_text_property(attribute_string)
+    if token is None:
+        # extra - values
+        uobject.store_extra_value(attribute_string)
+        return False
+
+    (key, value, is_array) = token
+    value = decode_unreal_literal(value)
+    if type(value) is UnrealObjectReference or (is_attribute and 'Class' == key and type(value) is str):
+        value = intern_unreal_symbol(value)
+    if is_attribute:
+        if uobject._attributes is None:
+            uobject._attributes = {}
+        items = uobject._attributes
+    else:
+        if uobject._values is None:
+            uobject._values = {}
+        items = uobject._values
+
+    if is_array:
+        # element of array
+        attribute_array = items.get(key)
+        if type(attribute_array) is list:
+            attribute_array.append(value)
+        else:
+            items[key] = [value]
+    else:
+        items[key] = value
+    if on_attribute is not None:
+        on_attribute(uobject, key, value, is_attribute)
+    return True
+
+
+class UnrealTextParser:
+    """
+    Builds an UnrealObject tree incrementally, one line at a time.
+
+    Callbacks (all optional):
+        on_begin_object(uobject): called after the 'Begin' line, header attributes are already set.
+        on_attribute(uobject, key, value, is_attribute): called for every parsed attribute and value.
+        on_end_object(uobject): called on the 'End' line. If it returns True, the object is
+            treated as consumed and detached from its parent, so it does not stay in memory.
+
+    record_writer: optional, receives flat records of the finished objects (see flatten_unreal_object).
+    base_depth: depth of the first object, used to parse a block of a file as a subtree.
+    """
+    def __init__(self, on_begin_object=None, on_attribute=None, on_end_object=None, record_writer=None, base_depth=0):
+        self.on_begin_object = on_begin_object
+        self.on_attribute = on_attribute
+        self.on_end_object = on_end_object
+        self.record_writer = record_writer
+        self.base_depth = base_depth
+        self.root = None
+        self.uobject = None
+        self.num_lines = 0
+
+    def begin_object(self, type_name):
+        parent = self.uobject
+        if parent is None:
+            uobject = UnrealObject(None, self.base_depth)
+            self.root = uobject
+        else:
+            # add_child without walking up to the root, the parser knows the root
+            uobject = UnrealObject(parent, parent.depth + 1)
+            if parent._children is None:
+                parent._children = []
+            parent._children.append(uobject)
+            root = self.root
+            root._index = None
+            if root._id_map is not None:
+                root._id_map[id(uobject)] = uobject
+        if type_name:
+            uobject.type = type_name
+        self.uobject = uobject
+        return uobject
+
+    def end_object(self):
+        uobject = self.uobject
+        parent = uobject.get_parent()
+        if parent is not None and self.record_writer is not None:
+            self.record_writer.add_record(make_unreal_object_record(uobject))
+        is_consumed = self.on_end_object(uobject) if self.on_end_object is not None else False
+        if parent is not None:
+            if is_consumed and parent._children and parent._children[-1] is uobject:
+                # the detached object becomes the root of its own tree
+                parent._children.pop()
+                uobject._parent = None
+                self.root._index = None
+            self.uobject = parent
+
+    def finish(self):
+        # the root and unclosed objects are recorded last, so the records are always in post-order
+        if self.record_writer is not None:
+            uobject = self.uobject
+            while uobject is not None:
+                self.record_writer.add_record(make_unreal_object_record(uobject))
+                uobject = uobject.get_parent()
+
+    def parse_line(self, content):
+        self.num_lines += 1
         content = content.strip()
         if content == "":
-            continue
+            return
 
-        tokens = content.split(' ')
-        if tokens:
-            head = tokens[0]
-            if 'Begin' == head:
-                if uobject is None:
-                    uobject = UnrealObject()
+        # the first character classifies the line, most lines are properties
+        head = content[0]
+        if 'B' == head and (content.startswith('Begin ') or 'Begin' == content):
+            tokens = split_unreal_text_header(content)
+            uobject = self.begin_object(sys.intern(tokens[1]) if 1 < len(tokens) else '')
+            for attribute in tokens[2:]:
+                parse_attribute(uobject, attribute, is_attribute=True, on_attribute=self.on_attribute)
+            if self.on_begin_object is not None:
+                self.on_begin_object(uobject)
+        elif 'E' == head and (content.startswith('End ') or 'End' == content):
+            if self.uobject is not None:
+                self.end_object()
+        elif self.uobject is not None:
+            uobject = self.uobject
+            # inlined parse_attribute(uobject, content, is_attribute=False)
+            separator = content.find('=')
+            key = content[:separator] if 0 < separator < len(content) - 1 else ''
+            is_array = False
+            if key and ')' == key[-1]:
+                bracket = key.find('(')
+                if 0 < bracket and key[bracket + 1:-1].isdigit():
+                    key = key[:bracket]
+                    is_array = True
+                else:
+                    key = ''
+            if key and key.isidentifier():
+                key = sys.intern(key)
+                value = decode_unreal_literal(content[separator + 1:])
+                if type(value) is UnrealObjectReference:
+                    value = intern_unreal_symbol(value)
+                values = uobject._values
+                if values is None:
+                    values = uobject._values = {}
+                if is_array:
+                    attribute_array = values.get(key)
+                    if type(attribute_array) is list:
+                        attribute_array.append(value)
+                    else:
+                        values[key] = [value]
                 else:
-                    uobject = uobject.add_child()
-                    
-                if 1 < len(tokens):
-                    uobject.set_type(tokens[1])
-                    for attribute in tokens[2:]:
-                        parse_attribute(uobject, attribute, is_attribute=True)
-            elif 'End' == head:
-                if uobject.parent is not None:
-                    uobject = uobject.get_parent()
+                    values[key] = value
+                if self.on_attribute is not None:
+                    self.on_attribute(uobject, key, value, False)
             else:
-                parse_attribute(uobject, content, is_attribute=False)
-    return uobject
+                uobject.store_extra_value(content)
+            if self.root._index is not None:
+                self.root._index = None
 
+    def parse_lines(self, lines) -> UnrealObject:
+        # the tree has no reference cycles, so the cyclic garbage collector is paused while allocating nodes
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        start_time = time.perf_counter()
+        try:
+            for line in lines:
+                self.parse_line(line)
+            self.finish()
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        elapsed_time = time.perf_counter() - start_time
+        logging.info(f'parser_unreal_text: {self.num_lines} lines, {self.num_lines / max(elapsed_time, 1e-9):.0f} lines/sec')
+        return self.root
 
-def parser_unreal_text_file(filepath) -> UnrealObject:
-    ext = os.path.splitext(filepath)[1].lower()
-    if os.path.exists(filepath) and ext in ['.t3d', '.copy']:
-        unreal_text = load_unreal_text(filepath)        
+    def parse_records(self, records) -> UnrealObject:
+        """
+        Rebuilds a tree from post-order records with the same callbacks.
+        Children are finished before their parent, so an object is complete when on_begin_object is called.
+        """
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
         try:
-            uobject = parser_unreal_text(unreal_text)
+            pending_children = {}
+            num_records = 0
+            for (depth, type_name, attributes, values, extras) in records:
+                num_records += 1
+                uobject = UnrealObject(None, depth)
+                uobject.type = type_name
+                uobject._attributes = attributes
+                uobject._values = values
+                uobject._extras = extras
+                children = pending_children.pop(depth + 1, None)
+                if children:
+                    parent_ref = weakref.ref(uobject)
+                    for child in children:
+                        child._parent = parent_ref
+                    uobject._children = children
+
+                if self.on_begin_object is not None:
+                    self.on_begin_object(uobject)
+                if self.on_attribute is not None:
+                    for (items, is_attribute) in ((attributes, True), (values, False)):
+                        for (key, value) in (items.items() if items else ()):
+                            for element in (value if type(value) is list else (value,)):
+                                self.on_attribute(uobject, key, element, is_attribute)
+
+                self.root = uobject
+                if 0 < depth:
+                    is_consumed = self.on_end_object(uobject) if self.on_end_object is not None else False
+                    if not is_consumed:
+                        pending_children.setdefault(depth, []).append(uobject)
+                elif self.on_end_object is not None:
+                    self.on_end_object(uobject)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        logging.info(f'parser_unreal_text: {num_records} records')
+        return self.root
+
+
+def make_unreal_object_record(uobject):
+    return (uobject.depth, uobject.type, uobject._attributes, uobject._values, uobject._extras)
+
+
+def flatten_unreal_object(uobject):
+    """usage) records = flatten_unreal_object(uobject) -> [(depth, type, attributes, values, extras), ...] in post-order"""
+    records = []
+    stack = [(uobject, False)]
+    while stack:
+        (uobject, is_end) = stack.pop()
+        if is_end:
+            records.append(make_unreal_object_record(uobject))
+        else:
+            stack.append((uobject, True))
+            if uobject._children:
+                stack.extend([(child, False) for child in reversed(uobject._children)])
+    return records
+
+
+def unflatten_unreal_object(records) -> UnrealObject:
+    return UnrealTextParser().parse_records(records)
+
+
+def parser_unreal_text(unreal_text, on_begin_object=None, on_attribute=None, on_end_object=None) -> UnrealObject:
+    parser = UnrealTextParser(on_begin_object, on_attribute, on_end_object)
+    # iterate lines of the string without making a splitted copy of the whole text
+    return parser.parse_lines(io.StringIO(unreal_text))
+
+
+def get_unreal_text_extension(filepath):
+    """usage) 'World.T3D.gz' -> '.t3d', 'World.T3D' -> '.t3d', the extension of a compressed file is skipped"""
+    (base_filepath, ext) = os.path.splitext(filepath)
+    if ext.lower() in unreal_text_compression_extensions:
+        ext = os.path.splitext(base_filepath)[1]
+    return ext.lower()
+
+
+def parser_unreal_text_file(filepath, on_begin_object=None, on_attribute=None, on_end_object=None, cache=None) -> UnrealObject:
+    ext = get_unreal_text_extension(filepath)
+    if intermediate_pack.file_exists(filepath) and ext in ['.t3d', '.copy']:
+        # load from the cache
+        if cache is not None:
+            records = cache.load_records(filepath)
+            if records is not None:
+                try:
+                    parser = UnrealTextParser(on_begin_object, on_attribute, on_end_object)
+                    uobject = parser.parse_records(records)
+                    if uobject:
+                        uobject.set_unreal_text_filepath(filepath)
+                    return uobject
+                except:
+                    logging.info(f'failed to load unreal text cache: {filepath}')
+
+        record_writer = cache.create_writer(filepath) if cache is not None else None
+        try:
+            parser = UnrealTextParser(on_begin_object, on_attribute, on_end_object, record_writer)
+            uobject = parser.parse_lines(iter_unreal_text_lines(filepath))
             if uobject:
                 uobject.set_unreal_text_filepath(filepath)
-            return uobject
+            if record_writer is not None:
+                record_writer.commit()
         except:
+            if record_writer is not None:
+                record_writer.discard()
             logging.info(f'failed to parser_unreal_text: {filepath}')
+            return None
+
+        # out of the parse, a failed eviction does not fail the parsed file
+        if record_writer is not None:
+            try:
+                cache.evict(keep_filepath=filepath)
+            except:
+                logging.error(f'failed to evict unreal text cache: {cache.cache_directory}')
+        return uobject
     return None
 
 
+# increase when the block index format changes, old sidecar files are ignored
+unreal_text_block_index_version = 1
+
+UnrealTextBlock = namedtuple('UnrealTextBlock', ['type', 'class_name', 'name', 'depth', 'begin', 'end'])
+
+
+@functools.lru_cache(maxsize=None)
+def get_block_line_patterns(encoding):
+    """returns (first_line_pattern, line_pattern) matching 'Begin' and 'End' lines in the encoded bytes"""
+    def encode(text):
+        return re.escape(text.encode(encoding))
+    keyword = b'(?:' + encode('Begin') + b'|' + encode('End') + b')'
+    spaces = b'(?:' + encode(' ') + b'|' + encode('\t') + b')*'
+    first_line_pattern = re.compile(spaces + keyword)
+    line_pattern = re.compile(b'(?<=' + encode('\n') + b')' + spaces + keyword)
+    return (first_line_pattern, line_pattern)
+
+
+class UnrealTextBlockIndex:
+    """
+    Byte offsets of the blocks of an unreal text file, found without parsing the attributes.
+    Every 'Begin Actor' block and every 'Begin Object' block of the root object is recorded, unless it is inside a recorded block.
+    Other blocks (e.g. 'Begin Level') are containers and are not recorded.
+    """
+    def __init__(self, filepath, encoding='utf-8', bom_length=0, root_header='', blocks=None):
+        self.filepath = filepath
+        self.encoding = encoding
+        self.bom_length = bom_length
+        self.root_header = root_header
+        self.blocks = blocks if blocks is not None else []
+
+    def get_sidecar_filepath(self):
+        return self.filepath + '.blocks'
+
+    def get_header(self):
+        (size, mtime) = intermediate_pack.get_file_stat(self.filepath)
+        return {'version': unreal_text_block_index_version, 'size': size, 'mtime': mtime}
+
+    def save(self):
+        data = {
+            'header': self.get_header(),
+            'encoding': self.encoding,
+            'bom_length': self.bom_length,
+            'root_header': self.root_header,
+            'blocks': [list(block) for block in self.blocks]
+        }
+        with open(self.get_sidecar_filepath(), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def load(self):
+        sidecar_filepath = self.get_sidecar_filepath()
+        if os.path.exists(sidecar_filepath):
+            try:
+                with open(sidecar_filepath, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('header') == self.get_header():
+                    self.encoding = data['encoding']
+                    self.bom_length = data['bom_length']
+                    self.root_header = data['root_header']
+                    self.blocks = [UnrealTextBlock(*block) for block in data['blocks']]
+                    return True
+            except:
+                logging.info(f'failed to load block index: {sidecar_filepath}')
+        return False
+
+    def get_blocks(self, class_names=None, types=None):
+        blocks = self.blocks
+        if class_names is not None:
+            class_names = set(class_names)
+            blocks = [block for block in blocks if block.class_name in class_names]
+        if types is not None:
+            types = set(types)
+            blocks = [block for block in blocks if block.type in types]
+        return blocks
+
+    def get_class_counts(self):
+        class_counts = {}
+        for block in self.blocks:
+            class_counts[block.class_name] = class_counts.get(block.class_name, 0) + 1
+        return class_counts
+
+
+def parse_unreal_text_header(header):
+    parser = UnrealTextParser()
+    parser.parse_line(header)
+    return parser.root
+
+
+def scan_unreal_text_blocks(filepath) -> UnrealTextBlockIndex:
+    """pre-scan of a file, finds the 'Begin' and 'End' lines of the blocks in the encoded bytes"""
+    block_index = UnrealTextBlockIndex(filepath)
+    with open_unreal_text_buffer(filepath) as mapped_file:
+        file_size = len(mapped_file)
+        if 0 == file_size:
+            return block_index
+        if type(mapped_file) is memoryview:
+            # a packed file, memoryview has no find
+            mapped_file = mapped_file.tobytes()
+        (encoding, bom_length) = detect_unreal_text_encoding(mapped_file[:4096])
+        block_index.encoding = encoding
+        block_index.bom_length = bom_length
+        newline = '\n'.encode(encoding)
+        char_size = len(newline)
+        (first_line_pattern, line_pattern) = get_block_line_patterns(encoding)
+
+        first_match = first_line_pattern.match(mapped_file, bom_length)
+        matches = line_pattern.finditer(mapped_file, bom_length)
+        if first_match is not None:
+            matches = itertools.chain([first_match], matches)
+
+        stack = [] # (begin, header, is_recorded)
+        is_in_recorded_block = False
+        for match in matches:
+            begin = match.start()
+            if 0 != (begin - bom_length) % char_size:
+                continue
+            # find the aligned end of line
+            line_end = mapped_file.find(newline, match.end())
+            while -1 != line_end and 0 != (line_end - bom_length) % char_size:
+                line_end = mapped_file.find(newline, line_end + 1)
+            line_end = file_size if -1 == line_end else line_end
+            line = mapped_file[begin:line_end].decode(encoding, errors='replace').strip()
+            tokens = line.split(' ', 2)
+            if 'Begin' == tokens[0]:
+                depth = len(stack)
+                type_name = tokens[1] if 1 < len(tokens) else ''
+                is_recorded = not is_in_recorded_block and ('Actor' == type_name or ('Object' == type_name and 1 == depth))
+                if 0 == depth:
+                    block_index.root_header = line
+                if is_recorded:
+                    is_in_recorded_block = True
+                stack.append((begin, line, is_recorded))
+            elif 'End' == tokens[0] and stack:
+                (block_begin, header, is_recorded) = stack.pop()
+                if is_recorded:
+                    header_uobject = parse_unreal_text_header(header)
+                    block_end = min(line_end + char_size, file_size)
+                    block_index.blocks.append(UnrealTextBlock(header_uobject.type, header_uobject.get_attribute('Class', ''), header_uobject.get_attribute('Name', ''), len(stack), block_begin, block_end))
+                    is_in_recorded_block = False
+    logging.info(f'scan_unreal_text_blocks: {filepath} blocks({len(block_index.blocks)})')
+    return block_index
+
+
+def load_unreal_text_block_index(filepath, use_sidecar=True) -> UnrealTextBlockIndex:
+    """loads the block index from the sidecar file '<filepath>.blocks', or scans the file and writes the sidecar"""
+    if use_sidecar and intermediate_pack.find_packed_file(filepath)[0] is not None:
+        # there is no directory of a packed file for the sidecar
+        use_sidecar = False
+    block_index = UnrealTextBlockIndex(filepath)
+    if use_sidecar and block_index.load():
+        return block_index
+    block_index = scan_unreal_text_blocks(filepath)
+    if use_sidecar:
+        try:
+            block_index.save()
+        except:
+            logging.error(f'failed to save block index: {block_index.get_sidecar_filepath()}')
+    return block_index
+
+
+def parser_unreal_text_blocks(filepath, class_names=None, types=None, block_index=None) -> UnrealObject:
+    """
+    usage) parser_unreal_text_blocks('World.T3D', class_names=['/Script/Engine.StaticMeshActor'])
+    Materializes only the requested blocks, they are attached directly to the root object.
+    """
+    if block_index is None:
+        block_index = load_unreal_text_block_index(filepath)
+    if not block_index.root_header:
+        return None
+
+    root = parse_unreal_text_header(block_index.root_header)
+    root.set_unreal_text_filepath(filepath)
+    blocks = block_index.get_blocks(class_names, types)
+    with open_unreal_text_buffer(filepath) as mapped_file:
+        for block in blocks:
+            block_text = codecs.decode(mapped_file[block.begin:block.end], block_index.encoding, 'replace')
+            parser = UnrealTextParser(base_depth=1)
+            for line in io.StringIO(block_text):
+                parser.parse_line(line)
+            if parser.root is not None:
+                if root._children is None:
+                    root._children = []
+                root._children.append(parser.root)
+                parser.root._parent = weakref.ref(root)
+    logging.info(f'parser_unreal_text_blocks: {filepath} blocks({len(blocks)}/{len(block_index.blocks)})')
+    return root
+
+
+def parse_unreal_text_records(filepath, cache=None, actor_class_names=None):
+    """
+    Parses a file and returns its post-order records, runs in the worker processes of parse_many.
+    If actor_class_names is given, the actors of other classes are dropped while parsing.
+    Without a cache they are not parsed at all, using the block index,
+    with a cache a missing entry is written by one full streaming parse, so the next runs load it.
+    """
+    on_end_object = None
+    if actor_class_names is not None:
+        if cache is None:
+            uobject = parser_unreal_text_blocks(filepath, class_names=actor_class_names, types=['Actor'])
+            return flatten_unreal_object(uobject) if uobject else None
+        actor_class_names = set(actor_class_names)
+        on_end_object = lambda uobject: 'Actor' == uobject.type and uobject.get_attribute('Class', '') not in actor_class_names
+    uobject = parser_unreal_text_file(filepath, on_end_object=on_end_object, cache=cache)
+    return flatten_unreal_object(uobject) if uobject else None
+
+
+def get_python_executable():
+    """the unreal editor embeds python, worker processes have to be started with the python executable"""
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return sys.executable
+    for executable in [os.path.join(sys.prefix, 'python.exe'), os.path.join(sys.prefix, 'bin', 'python3'), os.path.join(sys.prefix, 'bin', 'python')]:
+        if os.path.exists(executable):
+            return executable
+    return None
+
+
+def create_parse_executor(workers=None):
+    """
+    usage)
+        executor = create_parse_executor(workers=4)
+        for filepaths in batches:
+            for (filepath, uobject) in parse_many(filepaths, workers=4, executor=executor): ...
+        if executor is not None:
+            executor.shutdown()
+
+    Returns a process pool which parse_many calls can share, the worker processes are started once.
+    Returns None if the process pool is not available, parse_many parses in this process then.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    python_executable = get_python_executable()
+    if workers <= 1 or python_executable is None:
+        return None
+    context = multiprocessing.get_context('spawn')
+    context.set_executable(python_executable)
+    # packs of the intermediate directory are mounted in the workers too
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=intermediate_pack.mount_packs, initargs=(intermediate_pack.get_mount_table(),))
+
+
+def parse_many(filepaths, workers=None, cache=None, max_pending=None, actor_class_names=None, executor=None):
+    """
+    usage) for (filepath, uobject) in parse_many(filepaths, workers=4): ...
+    Parses files in a process pool and yields (filepath, uobject) in the order of filepaths.
+    Workers send back flat records, the tree is rebuilt only when the result is consumed,
+    and at most max_pending files are parsed ahead of the consumer.
+    executor: a process pool of create_parse_executor shared by the calls, otherwise a pool is started for this call.
+    Falls back to parsing in this process if the process pool is not available.
+    """
+    filepaths = list(filepaths)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = max(1, workers) * 2
+    workers = min(workers, len(filepaths))
+
+    def parse_serial(filepaths):
+        for filepath in filepaths:
+            records = parse_unreal_text_records(filepath, cache, actor_class_names)
+            yield (filepath, records)
+
+    def parse_pool(executor):
+        pending = deque()
+        num_submitted = 0
+        try:
+            while num_submitted < len(filepaths) or pending:
+                while num_submitted < len(filepaths) and len(pending) < max_pending:
+                    filepath = filepaths[num_submitted]
+                    pending.append((filepath, executor.submit(parse_unreal_text_records, filepath, cache, actor_class_names)))
+                    num_submitted += 1
+                (filepath, future) = pending[0]
+                records = future.result()
+                pending.popleft()
+                yield (filepath, records)
+        except concurrent.futures.process.BrokenProcessPool:
+            logging.error(f'parse_many: broken process pool, parse in this process')
+            yield from parse_serial([filepath for (filepath, future) in pending] + filepaths[num_submitted:])
+
+    def parse_parallel(filepaths):
+        if executor is not None:
+            yield from parse_pool(executor)
+            return
+        own_executor = create_parse_executor(workers)
+        if own_executor is None:
+            yield from parse_serial(filepaths)
+            return
+        with own_executor:
+            yield from parse_pool(own_executor)
+
+    for (filepath, records) in parse_parallel(filepaths):
+        uobject = None
+        if records:
+            uobject = unflatten_unreal_object(records)
+            uobject.set_unreal_text_filepath(filepath)
+        yield (filepath, uobject)
+
+
+def encode_unreal_float(value):
+    text = f'{value:.6f}'
+    return text if float(text) == value else repr(value)
+
+
+def encode_unreal_literal(value):
+    """
+    Encodes a decoded value as a property literal of unreal text, the inverse of decode_unreal_literal.
+    Strings are quoted only if the bare text would not decode to the same string.
+    """
+    value_type = type(value)
+    if value_type is str:
+        if value and not value[0].isspace() and not value[-1].isspace() and decode_unreal_literal(value) == value and type(decode_unreal_literal(value)) is str:
+            # raw text of nested structs is written back as it is
+            if '(' == value[0] or (' ' not in value and '\t' not in value and '"' not in value):
+                return value
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    elif value is None:
+        return 'None'
+    elif value_type is bool:
+        return 'True' if value else 'False'
+    elif value_type is float:
+        return encode_unreal_float(value)
+    return str(value)
+
+
+class UnrealTextWriter:
+    """
+    usage) with open('Out.T3D', 'w', encoding='utf-8') as f: UnrealTextWriter(f).write(uobject)
+    Writes an UnrealObject tree as importable unreal text directly to a file, without building the text in memory.
+    The children of an object are written before its values, arrays are written as Key(0)=..., Key(1)=...
+    """
+    def __init__(self, f, indent='   '):
+        self.f = f
+        self.indent = indent
+
+    def write(self, uobject):
+        stack = [(uobject, 0, False)]
+        while stack:
+            (uobject, depth, is_end) = stack.pop()
+            if is_end:
+                self.write_end(uobject, depth)
+                continue
+            self.write_begin(uobject, depth)
+            stack.append((uobject, depth, True))
+            if uobject._children:
+                stack.extend([(child, depth + 1, False) for child in reversed(uobject._children)])
+
+    def write_begin(self, uobject, depth):
+        tokens = ['Begin', uobject.type]
+        for (key, value) in (uobject._attributes or empty_mapping).items():
+            tokens.append(f'{key}={encode_unreal_literal(value)}')
+        self.f.write(self.indent * depth + ' '.join(tokens) + '\n')
+
+    def write_end(self, uobject, depth):
+        indent = self.indent * (depth + 1)
+        lines = []
+        for (key, value) in (uobject._values or empty_mapping).items():
+            if type(value) is list:
+                for (i, element) in enumerate(value):
+                    lines.append(f'{indent}{key}({i})={encode_unreal_literal(element)}\n')
+            else:
+                lines.append(f'{indent}{key}={encode_unreal_literal(value)}\n')
+        for extra in uobject._extras or empty_sequence:
+            lines.append(f'{indent}{extra}\n')
+        lines.append(f'{self.indent * depth}End {uobject.type}\n')
+        self.f.write(''.join(lines))
+
+
+def write_unreal_text_file(uobject, filepath):
+    temp_filepath = filepath + '.tmp'
+    try:
+        with open(temp_filepath, 'w', encoding='utf-8') as f:
+            UnrealTextWriter(f).write(uobject)
+        os.replace(temp_filepath, filepath)
+    except:
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        raise
+
+
 def example():
     unreal_text = """
     Begin Object Class=/Script/UnrealEd.SceneThumbnailInfo Name="CustomBPStaticMeshPart_146"
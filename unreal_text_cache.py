@@ -0,0 +1,163 @@
+import hashlib
+import logging
+import os
+import pickle
+
+import intermediate_pack
+
+
+# increase when the parser output changes, old cache files are ignored
+unreal_text_cache_version = 2
+
+
+class UnrealTextCacheWriter:
+    def __init__(self, cache_filepath, header, num_chunk_records=4096):
+        self.cache_filepath = cache_filepath
+        self.temp_filepath = cache_filepath + '.tmp'
+        self.num_chunk_records = num_chunk_records
+        self.records = []
+        self.file = open(self.temp_filepath, 'wb')
+        pickle.dump(header, self.file, pickle.HIGHEST_PROTOCOL)
+
+    def add_record(self, record):
+        self.records.append(record)
+        if self.num_chunk_records <= len(self.records):
+            self.flush()
+
+    def flush(self):
+        if self.records:
+            pickle.dump(self.records, self.file, pickle.HIGHEST_PROTOCOL)
+            self.records = []
+
+    def commit(self):
+        self.flush()
+        self.file.close()
+        os.replace(self.temp_filepath, self.cache_filepath)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.temp_filepath):
+            os.remove(self.temp_filepath)
+
+
+class UnrealTextCache:
+    """
+    On-disk cache of parsed unreal text files.
+    Each entry is validated by version, file size, mtime and optionally a content hash,
+    the least recently used entries are removed when the cache grows over max_size bytes.
+    """
+    def __init__(self, cache_directory, max_size=0, use_content_hash=False):
+        self.cache_directory = cache_directory
+        self.max_size = max_size
+        self.use_content_hash = use_content_hash
+
+    def get_cache_filepath(self, filepath):
+        key = hashlib.sha1(os.path.normcase(os.path.abspath(filepath)).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_directory, key + '.cache')
+
+    def get_content_hash(self, filepath):
+        # a packed file is hashed when it is added to the pack
+        (pack, entry) = intermediate_pack.find_packed_file(filepath)
+        if pack is not None:
+            return entry.hash
+        content_hash = hashlib.blake2b(digest_size=16)
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    def get_header(self, filepath):
+        (size, mtime) = intermediate_pack.get_file_stat(filepath)
+        return {
+            'version': unreal_text_cache_version,
+            'filepath': os.path.abspath(filepath),
+            'size': size,
+            'mtime': mtime,
+            'hash': self.get_content_hash(filepath) if self.use_content_hash else ''
+        }
+
+    def is_valid(self, filepath):
+        cache_filepath = self.get_cache_filepath(filepath)
+        if os.path.exists(cache_filepath):
+            try:
+                with open(cache_filepath, 'rb') as f:
+                    return pickle.load(f) == self.get_header(filepath)
+            except:
+                logging.info(f'failed to load unreal text cache: {cache_filepath}')
+        return False
+
+    def load_records(self, filepath):
+        """returns an iterator of the cached records, or None if there is no valid cache"""
+        cache_filepath = self.get_cache_filepath(filepath)
+        if not os.path.exists(cache_filepath):
+            return None
+        try:
+            f = open(cache_filepath, 'rb')
+            header = pickle.load(f)
+            if header != self.get_header(filepath):
+                f.close()
+                logging.info(f'outdated unreal text cache: {filepath}')
+                return None
+        except:
+            logging.info(f'failed to load unreal text cache: {cache_filepath}')
+            return None
+
+        # mark as recently used
+        os.utime(cache_filepath)
+        logging.info(f'load unreal text cache: {filepath}')
+
+        def read_records():
+            with f:
+                while True:
+                    try:
+                        records = pickle.load(f)
+                    except EOFError:
+                        break
+                    yield from records
+        return read_records()
+
+    def create_writer(self, filepath):
+        try:
+            if not os.path.exists(self.cache_directory):
+                os.makedirs(self.cache_directory)
+            return UnrealTextCacheWriter(self.get_cache_filepath(filepath), self.get_header(filepath))
+        except:
+            logging.error(f'failed to create unreal text cache: {filepath}')
+        return None
+
+    def evict(self, keep_filepath=None):
+        """removes the least recently used entries over max_size, the entry of keep_filepath is never removed"""
+        if self.max_size <= 0 or not os.path.exists(self.cache_directory):
+            return
+        keep_cache_filepath = self.get_cache_filepath(keep_filepath) if keep_filepath else None
+        entries = []
+        for entry in os.scandir(self.cache_directory):
+            if not entry.name.endswith('.cache') or entry.path == keep_cache_filepath:
+                continue
+            # the worker processes of parse_many evict the same directory
+            try:
+                stat_result = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat_result.st_mtime, stat_result.st_size, entry.path))
+        total_size = sum([size for (mtime, size, path) in entries])
+        if keep_cache_filepath is not None:
+            try:
+                total_size += os.stat(keep_cache_filepath).st_size
+            except FileNotFoundError:
+                pass
+        if total_size <= self.max_size:
+            return
+        entries.sort()
+        for (mtime, size, path) in entries:
+            if total_size <= self.max_size:
+                break
+            total_size -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            except:
+                logging.error(f'failed to evict unreal text cache: {path}')
+                continue
+            logging.info(f'evict unreal text cache: {path}')
@@ -0,0 +1,243 @@
+import argparse
+import concurrent.futures
+import fnmatch
+import json
+import logging
+import multiprocessing
+import os
+import re
+
+import intermediate_pack
+from parsing_unreal_text import compress_unreal_text_file, decode_unreal_literal, detect_unreal_text_compression, encode_unreal_literal, get_python_executable, get_unreal_text_extension, iter_unreal_text_lines, split_unreal_text_header
+
+
+re_value_line = re.compile('([A-Za-z_][A-Za-z0-9_]*)(\(\d+\))?=(.*)')
+
+
+class UnrealTextRewriteRules:
+    """
+    Rules of rewrite_unreal_text_file, class names are fnmatch patterns.
+        drop_classes: ['/Script/CustomScene.*'] - the objects of the classes are removed with their subobjects
+        rename_classes: {'/Script/CustomScene.CustomMeshActor': '/Script/Engine.StaticMeshActor'} - the archetype of a renamed object is removed
+        drop_values: ['CustomSceneData'] - the properties are removed
+        rename_values: {'OldKey': 'NewKey'}
+        remap_values: {'Mobility': {'Static': 'Movable'}} - the values are compared after decoding
+    """
+    def __init__(self, drop_classes=None, rename_classes=None, drop_values=None, rename_values=None, remap_values=None):
+        self.drop_classes = list(drop_classes or [])
+        self.rename_classes = dict(rename_classes or {})
+        self.drop_values = set(drop_values or [])
+        self.rename_values = dict(rename_values or {})
+        self.remap_values = {}
+        for (key, value_map) in (remap_values or {}).items():
+            self.remap_values[key] = {decode_unreal_literal(old_value) if type(old_value) is str else old_value: new_value for (old_value, new_value) in value_map.items()}
+        self.re_drop_classes = re.compile('|'.join([fnmatch.translate(pattern) for pattern in self.drop_classes])) if self.drop_classes else None
+        self.rename_class_patterns = [(re.compile(fnmatch.translate(pattern)), new_class) for (pattern, new_class) in self.rename_classes.items()]
+        self.class_actions = {}
+
+    def get_class_action(self, class_name):
+        """returns (is_dropped, new_class_name or None)"""
+        action = self.class_actions.get(class_name)
+        if action is None:
+            action = (False, None)
+            if self.re_drop_classes is not None and self.re_drop_classes.match(class_name):
+                action = (True, None)
+            else:
+                for (re_pattern, new_class) in self.rename_class_patterns:
+                    if re_pattern.match(class_name):
+                        action = (False, new_class)
+                        break
+            self.class_actions[class_name] = action
+        return action
+
+    def rewrite_begin_line(self, content, stats):
+        """returns the rewritten line, the same content if nothing changed, or None if the object is dropped"""
+        tokens = split_unreal_text_header(content)
+        for (i, token) in enumerate(tokens):
+            if token.startswith('Class='):
+                (is_dropped, new_class) = self.get_class_action(decode_unreal_literal(token[6:]))
+                if is_dropped:
+                    stats['dropped_objects'] += 1
+                    return None
+                if new_class is not None:
+                    stats['renamed_classes'] += 1
+                    tokens[i] = f'Class={new_class}'
+                    return ' '.join([token for token in tokens if not token.startswith('Archetype=')])
+                break
+        return content
+
+    def rewrite_value_line(self, content, stats):
+        """returns the rewritten line, the same content if nothing changed, or None if the property is dropped"""
+        m_value = re_value_line.match(content)
+        if m_value is None:
+            return content
+        (key, array_index, value) = m_value.groups()
+        if key in self.drop_values:
+            stats['dropped_values'] += 1
+            return None
+        is_changed = False
+        new_key = self.rename_values.get(key)
+        if new_key is not None:
+            stats['renamed_values'] += 1
+            key = new_key
+            is_changed = True
+        value_map = self.remap_values.get(m_value.group(1))
+        if value_map is not None:
+            new_value = value_map.get(decode_unreal_literal(value), value_map)
+            if new_value is not value_map:
+                stats['remapped_values'] += 1
+                value = new_value if type(new_value) is str else encode_unreal_literal(new_value)
+                is_changed = True
+        if is_changed:
+            return f'{key}{array_index or ""}={value}'
+        return content
+
+
+def load_unreal_text_rewrite_rules(filepath) -> UnrealTextRewriteRules:
+    """loads rules from a json file, see UnrealTextRewriteRules"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return UnrealTextRewriteRules(**json.load(f))
+
+
+def make_unreal_text_rewrite_stats():
+    return {'files': 0, 'lines': 0, 'dropped_objects': 0, 'renamed_classes': 0, 'dropped_values': 0, 'renamed_values': 0, 'remapped_values': 0}
+
+
+def rewrite_unreal_text_lines(lines, rules, stats):
+    """
+    yields the rewritten lines, the text is filtered line by line and the unchanged lines are kept as they are.
+    A dropped object skips all lines until its End line.
+    """
+    depth = 0
+    drop_depth = 0
+    for line in lines:
+        stats['lines'] += 1
+        content = line.strip()
+        head = content[:content.find(' ')] if ' ' in content else content
+        if 'Begin' == head:
+            depth += 1
+            if drop_depth:
+                continue
+            new_content = rules.rewrite_begin_line(content, stats)
+            if new_content is None:
+                drop_depth = depth
+                continue
+        elif 'End' == head:
+            depth -= 1
+            if drop_depth:
+                if depth < drop_depth:
+                    drop_depth = 0
+                continue
+            new_content = content
+        else:
+            if drop_depth:
+                continue
+            new_content = rules.rewrite_value_line(content, stats) if content else content
+            if new_content is None:
+                continue
+        if new_content is content:
+            yield line
+        else:
+            # keep the indent and the line ending of the original line
+            yield line[:len(line) - len(line.lstrip())] + new_content + ('\r' if line.endswith('\r') else '')
+
+
+def rewrite_unreal_text_file(filepath, output_filepath, rules):
+    """rewrites a .T3D file by the rules and writes it as utf-8, the output can be the input file. returns the stats
+    a compressed file is written compressed by the same compression"""
+    stats = make_unreal_text_rewrite_stats()
+    stats['files'] = 1
+    with intermediate_pack.open_file_buffer(filepath) as buffer:
+        compression = detect_unreal_text_compression(buffer[:8])
+    temp_filepath = output_filepath + '.tmp'
+    try:
+        with open(temp_filepath, 'w', encoding='utf-8', newline='') as f:
+            lines = []
+            for line in rewrite_unreal_text_lines(iter_unreal_text_lines(filepath), rules, stats):
+                lines.append(line)
+                if 4096 <= len(lines):
+                    f.write('\n'.join(lines) + '\n')
+                    lines.clear()
+            if lines:
+                f.write('\n'.join(lines) + '\n')
+        if compression:
+            compress_unreal_text_file(temp_filepath, compression)
+        os.replace(temp_filepath, output_filepath)
+    except:
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        raise
+    return stats
+
+
+def rewrite_unreal_text_directory(directory, output_directory, rules, workers=None, extensions=('.t3d',)):
+    """
+    usage) rewrite_unreal_text_directory('Intermediate', 'Intermediate_Rewrite', load_unreal_text_rewrite_rules('rules.json'), workers=8)
+    Rewrites all .T3D files of a directory in a process pool, runs without the unreal editor. returns the total stats
+    compressed files (.T3D.gz, .T3D.xz) are matched by the extension before the compression extension
+    """
+    filepaths = []
+    for (dirpath, dirnames, filenames) in os.walk(directory):
+        for filename in filenames:
+            if get_unreal_text_extension(filename) in extensions:
+                filepaths.append(os.path.join(dirpath, filename))
+    filepaths.sort()
+
+    jobs = []
+    for filepath in filepaths:
+        output_filepath = os.path.join(output_directory, os.path.relpath(filepath, directory))
+        os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+        jobs.append((filepath, output_filepath))
+
+    total_stats = make_unreal_text_rewrite_stats()
+
+    def add_stats(stats):
+        for (key, value) in stats.items():
+            total_stats[key] += value
+
+    def rewrite_serial(jobs):
+        for (filepath, output_filepath) in jobs:
+            try:
+                add_stats(rewrite_unreal_text_file(filepath, output_filepath, rules))
+            except:
+                logging.error(f'failed to rewrite: {filepath}')
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+    python_executable = get_python_executable()
+    if workers <= 1 or python_executable is None:
+        rewrite_serial(jobs)
+    else:
+        context = multiprocessing.get_context('spawn')
+        context.set_executable(python_executable)
+        remaining_jobs = dict(enumerate(jobs))
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = {executor.submit(rewrite_unreal_text_file, filepath, output_filepath, rules): i for (i, (filepath, output_filepath)) in enumerate(jobs)}
+                for future in concurrent.futures.as_completed(futures):
+                    (filepath, output_filepath) = remaining_jobs.pop(futures[future])
+                    try:
+                        add_stats(future.result())
+                    except concurrent.futures.process.BrokenProcessPool:
+                        raise
+                    except:
+                        logging.error(f'failed to rewrite: {filepath}')
+        except concurrent.futures.process.BrokenProcessPool:
+            logging.error(f'rewrite_unreal_text_directory: broken process pool, rewrite in this process')
+            rewrite_serial(remaining_jobs.values())
+    logging.info(f'rewrite_unreal_text_directory: {total_stats}')
+    return total_stats
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='rewrite the .T3D files of an intermediate directory by rules, without the unreal editor')
+    parser.add_argument('rules_filepath', help='json file, see UnrealTextRewriteRules')
+    parser.add_argument('directory')
+    parser.add_argument('output_directory')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    rules = load_unreal_text_rewrite_rules(args.rules_filepath)
+    print(rewrite_unreal_text_directory(args.directory, args.output_directory, rules, workers=args.workers))
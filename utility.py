@@ -1,9 +1,18 @@
+import concurrent.futures
+import fnmatch
+import functools
+import locale
 import logging
-import pathlib
 import re
 import os
 import stat
 import shutil
+import sys
+import threading
+import time
+
+import intermediate_pack
+from parsing_unreal_text import UnrealVector, UnrealRotator, UnrealColor, convert_unreal_text_to_utf8, compress_unreal_text_file, detect_unreal_text_compression, iter_unreal_text_bytes
 
 import unreal
 
@@ -49,7 +58,11 @@ def asset_path_to_relative_filepath(asset_path, ext):
     """usage) '/Game/Characters/BP_Monster_Simple' -> 'Content/Characters/BP_Monster_Simple.uasset'"""
     return asset_path.replace("/Game/", "Content/", 1) + ext
 
-def copy_file(src_filepath, dst_filepath, use_source_control=False):
+def get_asset_ext(class_name):
+    """usage) 'World' -> '.umap', 'StaticMesh' -> '.uasset'"""
+    return '.umap' if 'World' == class_name else '.uasset'
+
+def copy_file(src_filepath, dst_filepath, use_source_control=False, transfer_mode='copy'):
     try:
         if not os.path.exists(src_filepath):
             logging.info(f'Failed to copy_file: not exists {src_filepath}')
@@ -60,31 +73,312 @@ def copy_file(src_filepath, dst_filepath, use_source_control=False):
         if not os.path.exists(dst_directory):
             os.makedirs(dst_directory)
 
-        # make writable
-        was_file_exists = os.path.exists(dst_filepath)
-        if was_file_exists:
-            os.chmod(dst_filepath, stat.S_IWRITE)   
-        shutil.copy(src_filepath, dst_filepath)
-        if not was_file_exists:
-            os.chmod(dst_filepath, stat.S_IWRITE)
+        (method, size) = transfer_file(src_filepath, dst_filepath, transfer_mode)
 
         if use_source_control:
             unreal.SourceControl.check_out_or_add_file(dst_filepath)
-        logging.info(f'copy_file: {src_filepath} to {dst_filepath}')
+        logging.info(f'copy_file({method}): {src_filepath} to {dst_filepath}')
         return True
     except:
         logging.error(f'Failed to copy_file: {src_filepath} to {dst_filepath}')
     return False
 
-def write_to_file(filepath, content, use_source_control=False):
+def copy_file_data(src_file, dst_file, size):
+    """copies the content in the kernel by copy_file_range or sendfile if available, otherwise by a large buffer"""
+    src_fd = src_file.fileno()
+    dst_fd = dst_file.fileno()
+    if hasattr(os, 'copy_file_range'):
+        try:
+            offset = 0
+            while offset < size:
+                copied = os.copy_file_range(src_fd, dst_fd, size - offset)
+                if 0 == copied:
+                    break
+                offset += copied
+            if offset == size:
+                return
+        except OSError:
+            # cross device or unsupported file system, restart by the next method
+            pass
+        src_file.seek(0)
+        dst_file.seek(0)
+        dst_file.truncate()
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        try:
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                if 0 == sent:
+                    break
+                offset += sent
+            if offset == size:
+                return
+        except OSError:
+            pass
+        src_file.seek(0)
+        dst_file.seek(0)
+        dst_file.truncate()
+    shutil.copyfileobj(src_file, dst_file, 1024 * 1024)
+
+
+# transfer_mode of config.ini
+#   copy: byte copy
+#   reflink: clone of the file system(FICLONE, btrfs, xfs), falls back to copy
+#   hardlink: hardlink of a read-only source, falls back to copy
+#   auto: reflink, hardlink, copy
+transfer_modes = ('copy', 'reflink', 'hardlink', 'auto')
+transfer_methods = ('reflink', 'hardlink', 'copy')
+FICLONE = 0x40049409
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def reflink_file(src_file, dst_file):
+    """returns True if the destination shares the blocks of the source, they are copied on write by the file system"""
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        return True
+    except OSError:
+        # different file systems or not supported
+        return False
+
+
+def is_read_only(stat_result):
+    return 0 == (stat_result.st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+# hardlinks which can not be removed on windows are moved here, out of the Content folder, see set_unlinked_dircetory
+unlinked_dircetory = ''
+
+
+def set_unlinked_dircetory(dirpath):
+    """dirpath: a directory on the volume of the project, e.g. <project>/Saved/UE_Migrate_Tool/Unlinked"""
+    global unlinked_dircetory
+    unlinked_dircetory = dirpath
+
+
+def unlink_shared_file(filepath):
+    """
+    removes a hardlinked file without changing the mode of its other links.
+    on windows the read-only attribute belongs to all links and a read-only file can not be removed,
+    the link is moved to unlinked_dircetory instead, remove_unlinked_files removes it once it is the last link
+    """
+    if 'nt' != os.name:
+        os.remove(filepath)
+        return
+    dirpath = unlinked_dircetory or os.path.dirname(filepath)
+    if not os.path.exists(dirpath):
+        os.makedirs(dirpath, exist_ok=True)
+    aside_filepath = os.path.join(dirpath, f'{os.path.basename(filepath)}.{os.getpid()}_{threading.get_ident()}_{time.time_ns()}.unlinked')
+    os.replace(filepath, aside_filepath)
+    logging.info(f'unlink_shared_file: {filepath} to {aside_filepath}')
+
+
+def remove_unlinked_files():
+    """removes the moved links of unlink_shared_file which are not shared anymore, called at the end of a run"""
+    if not unlinked_dircetory or not os.path.exists(unlinked_dircetory):
+        return
+    for entry in os.scandir(unlinked_dircetory):
+        try:
+            if not entry.name.endswith('.unlinked') or 1 < os.stat(entry.path).st_nlink:
+                continue
+            # the file is owned exclusively, clearing read-only changes no other file
+            os.chmod(entry.path, stat.S_IREAD | stat.S_IWRITE)
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+        except:
+            logging.error(f'failed to remove_unlinked_files: {entry.path}')
+
+
+def break_hardlink(filepath):
+    """
+    Copy on write of a hardlinked file, the file is replaced by a writable copy of its own before it is written in place,
+    so the other links, e.g. the source project, keep their content.
+    """
+    try:
+        if not os.path.exists(filepath) or os.stat(filepath).st_nlink <= 1:
+            return False
+        temp_filepath = filepath + '.cow'
+        shutil.copyfile(filepath, temp_filepath)
+        os.chmod(temp_filepath, stat.S_IREAD | stat.S_IWRITE)
+        if 'nt' == os.name:
+            # os.replace fails on a read-only file, and chmod would make the other links writable too
+            unlink_shared_file(filepath)
+        os.replace(temp_filepath, filepath)
+        logging.info(f'break_hardlink: {filepath}')
+        return True
+    except:
+        logging.error(f'failed to break_hardlink: {filepath}')
+    return False
+
+
+def transfer_file(src_filepath, dst_filepath, transfer_mode='copy'):
+    """
+    Transfers the file by the transfer_mode, returns (method, size), method is one of transfer_methods.
+    The destination is written to a temporary file and replaces the old file,
+    an old destination is never written in place, so a hardlinked source can not be modified through it.
+    Hardlinks are made only by the 'hardlink' mode and only to read-only sources, the mode of the shared file protects it
+    from writing in place. 'auto' is reflink, then copy. hardlinks are not made on windows, where a read-only link
+    can not be replaced or removed without clearing the read-only attribute of the source.
+    """
+    temp_filepath = dst_filepath + '.transfer'
+    with open(src_filepath, 'rb') as src_file:
+        src_stat = os.fstat(src_file.fileno())
+        size = src_stat.st_size
+        method = ''
+        if 'hardlink' == transfer_mode and 'nt' != os.name:
+            if is_read_only(src_stat):
+                try:
+                    if os.path.exists(temp_filepath):
+                        os.remove(temp_filepath)
+                    os.link(src_filepath, temp_filepath)
+                    method = 'hardlink'
+                except OSError:
+                    # different devices or not supported
+                    pass
+        if not method:
+            with open(temp_filepath, 'wb') as dst_file:
+                if ('reflink' == transfer_mode or 'auto' == transfer_mode) and reflink_file(src_file, dst_file):
+                    method = 'reflink'
+                else:
+                    copy_file_data(src_file, dst_file, size)
+                    method = 'copy'
+            shutil.copymode(src_filepath, temp_filepath)
+            os.chmod(temp_filepath, stat.S_IREAD | stat.S_IWRITE)
+
+    if 'nt' == os.name and os.path.exists(dst_filepath):
+        # os.replace fails on a read-only file, the read-only attribute of a hardlink belongs to the source too
+        if 1 < os.stat(dst_filepath).st_nlink:
+            unlink_shared_file(dst_filepath)
+        else:
+            os.chmod(dst_filepath, stat.S_IREAD | stat.S_IWRITE)
+    os.replace(temp_filepath, dst_filepath)
+    return (method, size)
+
+
+class FileCopyEngine:
+    """
+    usage)
+        with FileCopyEngine(workers=8) as copy_engine:
+            for (src_filepath, dst_filepath) in files:
+                copy_engine.submit(src_filepath, dst_filepath)
+            for (src_filepath, dst_filepath, success) in copy_engine.get_results():
+                ...
+
+    Copies files by a thread pool, the copies are bound by the latency of the file system rather than the bandwidth.
+    Created directories are cached, results are logged and the source control checkout runs on the calling thread.
+    transfer_mode: see transfer_modes, the number of files of each method is reported by get_stats_text
+    """
+    def __init__(self, workers=8, use_source_control=False, transfer_mode='copy'):
+        self.workers = max(1, workers)
+        self.use_source_control = use_source_control
+        if transfer_mode not in transfer_modes:
+            logging.error(f'unknown transfer_mode: {transfer_mode}, use copy')
+            transfer_mode = 'copy'
+        self.transfer_mode = transfer_mode
+        self.num_methods = dict.fromkeys(transfer_methods + ('unpack',), 0)
+        self.executor = None
+        self.futures = []
+        self.created_directories = set()
+        self.directory_lock = threading.Lock()
+        self.num_files = 0
+        self.num_failed = 0
+        self.num_bytes = 0
+        self.start_time = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        return False
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def make_directory(self, dirname):
+        if dirname in self.created_directories:
+            return
+        with self.directory_lock:
+            if dirname not in self.created_directories:
+                os.makedirs(dirname, exist_ok=True)
+                self.created_directories.add(dirname)
+
+    def copy(self, src_filepath, dst_filepath):
+        """returns (method, size, error), runs on the worker threads"""
+        try:
+            self.make_directory(os.path.split(dst_filepath)[0])
+            # a file of the mounted intermediate pack is written from the mapped pack
+            (pack, entry) = intermediate_pack.find_packed_file(src_filepath)
+            if pack is not None:
+                return ('unpack', pack.extract(entry.path, dst_filepath), None)
+            (method, size) = transfer_file(src_filepath, dst_filepath, self.transfer_mode)
+            return (method, size, None)
+        except FileNotFoundError as e:
+            if not os.path.exists(src_filepath):
+                return ('', 0, 'not exists')
+            return ('', 0, str(e))
+        except Exception as e:
+            return ('', 0, str(e))
+
+    def submit(self, src_filepath, dst_filepath):
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        future = self.executor.submit(self.copy, src_filepath, dst_filepath)
+        self.futures.append((src_filepath, dst_filepath, future))
+        return future
+
+    def get_results(self):
+        """waits for the submitted copies in order, yields (src_filepath, dst_filepath, success)"""
+        futures = self.futures
+        self.futures = []
+        for (src_filepath, dst_filepath, future) in futures:
+            (method, size, error) = future.result()
+            self.num_files += 1
+            if error is None:
+                self.num_bytes += size
+                self.num_methods[method] += 1
+                if self.use_source_control:
+                    unreal.SourceControl.check_out_or_add_file(dst_filepath)
+                logging.info(f'copy_file({method}): {src_filepath} to {dst_filepath}')
+            else:
+                self.num_failed += 1
+                logging.error(f'Failed to copy_file: {src_filepath} to {dst_filepath}: {error}')
+            yield (src_filepath, dst_filepath, error is None)
+
+    def wait(self):
+        return list(self.get_results())
+
+    def get_stats_text(self):
+        elapsed_time = max(time.perf_counter() - self.start_time, 1e-6)
+        mega_bytes = self.num_bytes / (1024 * 1024)
+        methods_text = ', '.join([f'{method}({num})' for (method, num) in self.num_methods.items()])
+        return f'files({self.num_files}), failed({self.num_failed}), {methods_text}, {mega_bytes:.1f} MB, {elapsed_time:.2f} sec, {mega_bytes / elapsed_time:.1f} MB/s, {self.num_files / elapsed_time:.1f} files/s, workers({self.workers}), transfer_mode({self.transfer_mode})'
+
+
+def write_to_file(filepath, content, use_source_control=False, compression=''):
     try:
         dirname = os.path.split(filepath)[0]
         if not os.path.exists(dirname):
             os.makedirs(dirname)
         if os.path.exists(filepath):
             os.chmod(filepath, stat.S_IWRITE)
-        with open(filepath, 'w') as f:
-            f.write(content)
+        if compression:
+            # utf-8, compressed after writing, read_from_file detects it by the magic number
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write(content)
+            compress_unreal_text_file(filepath, compression)
+        else:
+            with open(filepath, 'w') as f:
+                f.write(content)
         if use_source_control:
             unreal.SourceControl.check_out_or_add_file(filepath)
         logging.info(f'write_to_file: {filepath}')
@@ -93,7 +387,15 @@ def write_to_file(filepath, content, use_source_control=False):
         logging.error(f'failed to write_to_file: {filepath}')
     return False
 
-def export_to_unreal_text(filepath, asset, use_source_control=False):
+def read_from_file(filepath):
+    """reads a text file written by write_to_file, a compressed file is decompressed"""
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    if detect_unreal_text_compression(data[:8]):
+        return b''.join(iter_unreal_text_bytes(data)).decode('utf-8')
+    return data.decode(locale.getpreferredencoding(False))
+
+def export_to_unreal_text(filepath, asset, use_source_control=False, normalize_encoding=False, compression=''):
     try:
         dirname = os.path.split(filepath)[0]
         if not os.path.exists(dirname):
@@ -108,6 +410,14 @@ def export_to_unreal_text(filepath, asset, use_source_control=False):
         export_task.object = asset
         unreal.Exporter.run_asset_export_task(export_task)
 
+        # utf-16 -> utf-8, halves the size of the intermediate file
+        if normalize_encoding and os.path.exists(filepath):
+            convert_unreal_text_to_utf8(filepath)
+
+        # gzip or lzma, the parser decompresses it on the fly
+        if compression and os.path.exists(filepath):
+            compress_unreal_text_file(filepath, compression)
+
         if use_source_control:
             unreal.SourceControl.check_out_or_add_file(filepath)
         logging.info(f'export_to_unreal_text: {filepath}')
@@ -117,29 +427,85 @@ def export_to_unreal_text(filepath, asset, use_source_control=False):
     return False
 
 
-# TODO - unreal, python version wrapper
-def __try_relative_to__(path, ignore_folder):
-    try:
-        return bool(path.relative_to(ignore_folder))
-    except:
-        pass
-    return False
+def compile_path_patterns(patterns):
+    """
+    usage) ['Content/Developers', 'Content/*/Temp_*', 're:Content/.+_Backup/.*'] -> one regex matched at the start of a path
+    A pattern is a folder, a glob if it has one of *?[ or a regex if it starts with 're:', paths are case insensitive on windows.
+    """
+    expressions = []
+    for pattern in patterns:
+        if pattern.startswith('re:'):
+            expressions.append(f'(?:{pattern[3:]})')
+            continue
+        pattern = pattern.replace('\\', '/').strip('/')
+        if not pattern:
+            continue
+        # the folder itself and the files under it, 'Content/Dev' does not match 'Content/Developers'
+        if any(c in pattern for c in '*?['):
+            # fnmatch.translate matches the whole path: '(?s:...)\\Z', the folder suffix replaces its end anchor
+            expression = fnmatch.translate(pattern)
+            if expression.endswith('\\Z'):
+                expression = expression[:-2]
+            expressions.append(expression + '(?:/|\\Z)')
+        else:
+            expressions.append(re.escape(pattern) + '(?:/|\\Z)')
+    if not expressions:
+        return None
+    return re.compile('|'.join(expressions), re.IGNORECASE if 'nt' == os.name else 0)
+
+
+class IgnoreMatcher:
+    """
+    usage)
+        matcher = IgnoreMatcher(['Content/Developers', 'Content/*/Temp_*'], include_folders=['Content/Developers/Shared'])
+        matcher.is_ignored('Content/Developers/Test.uasset') -> True
+        matcher.is_ignored('Content/Developers/Shared/Rock.uasset') -> False
+        (filepaths, ignored_filepaths) = matcher.partition(filepaths)
+
+    The ignore and include rules are compiled into one regex each, an included path is never ignored.
+    """
+    def __init__(self, ignore_folders=(), include_folders=()):
+        self.ignore_regex = compile_path_patterns(ignore_folders or ())
+        self.include_regex = compile_path_patterns(include_folders or ())
+
+    def is_ignored(self, filepath):
+        if self.ignore_regex is None:
+            return False
+        filepath = filepath.replace('\\', '/').lstrip('/')
+        if self.ignore_regex.match(filepath) is None:
+            return False
+        return self.include_regex is None or self.include_regex.match(filepath) is None
 
-def __path_is_relative_to__(path, ignore_folder):
-    return path.is_relative_to(ignore_folder)
+    def partition(self, filepaths):
+        """returns (filepaths, ignored_filepaths) in the order of filepaths"""
+        if self.ignore_regex is None:
+            return (list(filepaths), [])
+        kept_filepaths = []
+        ignored_filepaths = []
+        for filepath in filepaths:
+            (ignored_filepaths if self.is_ignored(filepath) else kept_filepaths).append(filepath)
+        return (kept_filepaths, ignored_filepaths)
 
-__func_is_relative_to__ = __path_is_relative_to__ if hasattr(pathlib.Path, 'is_relative_to') else __try_relative_to__
-    
-def check_ignore_folders(filepath, ignore_folders):
+    def filter(self, filepaths):
+        """returns the filepaths which are not ignored"""
+        return self.partition(filepaths)[0]
+
+
+@functools.lru_cache(maxsize=16)
+def get_ignore_matcher(ignore_folders=(), include_folders=()):
+    """returns IgnoreMatcher compiled once for the rules, the rules are tuples"""
+    return IgnoreMatcher(ignore_folders, include_folders)
+
+
+def check_ignore_folders(filepath, ignore_folders, include_folders=()):
     if ignore_folders:
-        path = pathlib.Path(filepath)        
-        for ignore_folder in ignore_folders:            
-            if __try_relative_to__(path, ignore_folder):
-                return True
+        return get_ignore_matcher(tuple(ignore_folders), tuple(include_folders)).is_ignored(filepath)
     return False
 
 
 def convert_string_to_linear_color(string_value):
+    if isinstance(string_value, UnrealColor):
+        return (unreal.LinearColor(string_value.r, string_value.g, string_value.b, string_value.a), True)
     return unreal.StringLibrary.conv_string_to_color(string_value)
 
 def convert_string_to_color(string_value, use_srgb = True):
@@ -219,8 +585,19 @@ def convert_string_to_light_intensit_unit(string_value):
     return (unreal.LightUnits.UNITLESS, False)
 
 
+default_scale = UnrealVector(1.0, 1.0, 1.0)
+
+def convert_string_to_vector(vector_string):
+    if isinstance(vector_string, UnrealVector):
+        return (unreal.Vector(vector_string.x, vector_string.y, vector_string.z), True)
+    return unreal.StringLibrary.conv_string_to_vector(str(vector_string))
+
+
 # (Pitch=0.000000,Yaw=0.000000,Roll=0.000000) -> (P=0.000000,Y=0.000000,R=0.000000)
 def convert_string_to_rotation(rotation_string):
+    if isinstance(rotation_string, UnrealRotator):
+        return (unreal.Rotator(roll=rotation_string.roll, pitch=rotation_string.pitch, yaw=rotation_string.yaw), True)
+    rotation_string = str(rotation_string)
     rotation_string = rotation_string.replace('Pitch', 'P')
     rotation_string = rotation_string.replace('Yaw', 'Y')
     rotation_string = rotation_string.replace('Roll', 'R')